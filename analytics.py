@@ -0,0 +1,140 @@
+# atomize/analytics.py
+
+import os
+import sys
+import heapq
+import statistics
+from datetime import date, datetime, timedelta
+
+from history import HistoryStore, period_key
+
+# 报告中列出的分组数
+TOP_GROUPS = 5
+REPORT_PERIODS = ('day', 'week', 'month')
+
+
+def recent_keys(period: str, count: int, today: date = None) -> list:
+    """最近 count 个周期的键，从早到晚排列，最后一个是今天所在的周期。"""
+    today = today or datetime.now().date()
+    keys = []
+    if period == 'month':
+        year, month = today.year, today.month
+        for _ in range(count):
+            keys.append(f"{year:04d}-{month:02d}")
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    else:
+        step = timedelta(days=7 if period == 'week' else 1)
+        for i in range(count):
+            keys.append(period_key((today - step * i).isoformat(), period))
+    return keys[::-1]
+
+
+def summarize(bucket: dict, top: int = TOP_GROUPS) -> dict:
+    """
+    把索引中的汇总转换为报告中的一行：
+    - postpone_rate: 已结束的任务中被推迟过的比例
+    - skipped_ratio: 已结束的任务中被取消的比例
+    - top_groups:    完成数最多的分组（parent_chain），按标签筛选时为空
+    """
+    finished = bucket['rows']
+    groups = heapq.nsmallest(top, bucket.get('groups', {}).items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+    return {
+        'completed_count': bucket['done'],
+        'total_points': bucket['points'],
+        'finished_count': finished,
+        'postpone_rate': bucket['postponed_rows'] / finished if finished else 0.0,
+        'skipped_ratio': bucket['skipped'] / finished if finished else 0.0,
+        'top_groups': [{'group': chain, 'completed_count': done, 'total_points': points}
+                       for chain, (done, points) in groups],
+    }
+
+
+def build_report(history, period: str = 'week', count: int = 4, today: date = None, tag: str = None) -> list:
+    """最近 count 个日 / 周 / 月的统计，全部来自历史索引中预先汇总好的数据。指定 tag 时只统计该标签。"""
+    if period not in REPORT_PERIODS:
+        raise ValueError(f"未知的统计周期: {period}")
+    if count < 1:
+        raise ValueError("统计的周期数必须大于 0")
+    return [{'period': key, **summarize(history.period_summary(period, key, tag))}
+            for key in recent_keys(period, count, today)]
+
+
+def _median(values):
+    return statistics.median(values) if values else None
+
+
+def throughput(day: dict) -> dict:
+    """
+    由索引中某一天的计时汇总（history._new_timing）计算效率指标：
+    - timed_count:   记下了用时的完成数；active_hours 为当天最早的推送到最晚的操作之间的小时数
+    - tasks_per_hour: timed_count / active_hours
+    - median_seconds_to_done: 从推送到完成的用时中位数；groups 为各分组（parent_chain）的完成数和用时中位数
+    - postpone_latency: 推迟次数，以及从推送到推迟的停留时间中位数
+    没有计时数据的日期各项为 0 或 None。
+    """
+    timing = day.get('timing') or {}
+    groups = {chain: values for chain, values in (timing.get('done') or {}).items() if values}
+    durations = [seconds for values in groups.values() for seconds in values]
+    postpones = timing.get('postpone') or []
+    active_hours = None
+    if timing.get('first') is not None and timing['last'] > timing['first']:
+        active_hours = (timing['last'] - timing['first']) / 3600
+    return {
+        'timed_count': len(durations),
+        'active_hours': active_hours,
+        'tasks_per_hour': len(durations) / active_hours if active_hours else None,
+        'median_seconds_to_done': _median(durations),
+        'groups': {chain: {'count': len(values), 'median_seconds': _median(values)}
+                   for chain, values in sorted(groups.items())},
+        'postpone_latency': {'count': len(postpones), 'median_seconds': _median(postpones)},
+    }
+
+
+def export_throughput(history, count: int = 7, today: date = None) -> list:
+    """最近 count 天的效率指标（见 throughput），每天一项，只读取历史索引。"""
+    if count < 1:
+        raise ValueError("统计的天数必须大于 0")
+    return [{'date': key, **throughput(history.day_summary(key))} for key in recent_keys('day', count, today)]
+
+
+# CSV 导出的列（不含分组，分组只在 JSON 中给出）
+EXPORT_FIELDS = ['date', 'timed_count', 'active_hours', 'tasks_per_hour', 'median_seconds_to_done',
+                 'postpone_count', 'postpone_median_seconds']
+
+
+def main(argv=None):
+    import csv
+    import json
+    import argparse
+    import core
+
+    arg_parser = argparse.ArgumentParser(description="导出最近若干天的效率指标（每小时完成数、完成用时、推迟前的停留时间）")
+    arg_parser.add_argument('--days', type=int, default=7, help="导出的天数（默认 7，截止到今天）")
+    arg_parser.add_argument('--format', choices=('json', 'csv'), default='json',
+                            help="json 每行一天（含各分组的用时），csv 为每天一行的汇总")
+    arg_parser.add_argument('--data-dir', default=core.DATA_DIR, help="数据目录（默认为 data/）")
+    args = arg_parser.parse_args(argv)
+
+    history = HistoryStore(os.path.join(args.data_dir, os.path.basename(core.HISTORY_FILE)))
+    try:
+        rows = export_throughput(history, args.days)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        history.close()
+    if args.format == 'json':
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+    else:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(EXPORT_FIELDS)
+        for row in rows:
+            writer.writerow([row['date'], row['timed_count'], row['active_hours'], row['tasks_per_hour'],
+                             row['median_seconds_to_done'], row['postpone_latency']['count'],
+                             row['postpone_latency']['median_seconds']])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
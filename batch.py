@@ -0,0 +1,167 @@
+# atomize/batch.py
+
+import sys
+import json
+
+import core
+
+# 批处理命令的别名，与交互模式的按键保持一致
+ACTION_ALIASES = {
+    'd': 'done', 'done': 'done',
+    'p': 'postpone', 'postpone': 'postpone',
+    'c': 'cancel', 'cancel': 'cancel',
+    's': 'split', 'split': 'split',
+    'a': 'add', 'add': 'add',
+    'e': 'edit', 'edit': 'edit',
+    'n': 'next', 'next': 'next',
+    'plan': 'plan',
+    'template': 'template',
+    'summary': 'summary',
+    'report': 'report',
+    'f': 'filter', 'filter': 'filter',
+    'u': 'undo', 'undo': 'undo',
+    'r': 'redo', 'redo': 'redo',
+    'q': 'quit', 'quit': 'quit',
+}
+
+
+def _task_payload(task_info: dict) -> dict:
+    return {
+        'task': task_info['task'].to_dict(),
+        'current_num': task_info['current_num'],
+        'total_num': task_info['total_num'],
+    }
+
+
+class BatchRunner:
+    """
+    非交互模式：逐行读取命令并执行，不清屏、不等待，每条命令输出一行 JSON 结果。
+
+    命令格式（每行一条，空行和 # 开头的行会被忽略）：
+        plan <任务规划>            开始新的一天（丢弃隔夜任务）
+        plan --merge <任务规划>    开始新的一天并合并隔夜任务
+        plan [--merge] !<模板名> [参数=值 ...]  用模板开始新的一天
+        template <模板名> <规划>   保存模板（可以包含 {参数} 或 {参数=默认值}）
+        next | n                   显示当前任务
+        d | p | c                  完成 / 推迟 / 取消当前任务（取消无需确认）
+        s <子任务规划>             拆分当前任务
+        a <任务名>                 在当前任务后添加任务
+        e <新任务名>               修改当前任务名
+        f [#标签]                  之后只推送带有该标签的任务，省略标签时取消筛选
+        u | r                      撤销上一步修改 / 重做被撤销的修改
+        summary [#标签]            输出今日总结（可只统计某个标签）
+        report [day|week|month] [N] [#标签]  输出最近 N 个周期的统计（默认 week 4）
+        q                          结束
+    与交互模式一样，“当前任务”在每次操作后重新随机选择。
+    """
+    def __init__(self, task_manager: core.TaskManager, out=sys.stdout):
+        self.task_manager = task_manager
+        self.out = out
+        self._current = None
+        self._tag_filter = None
+
+    def _emit(self, payload: dict):
+        self.out.write(json.dumps(payload, ensure_ascii=False) + '\n')
+
+    def _current_task_info(self):
+        if self._current is None:
+            self._current = self.task_manager.get_next_task_info(self._tag_filter)
+        return self._current
+
+    def run(self, lines) -> int:
+        """执行命令流，返回失败的命令数。"""
+        failures = 0
+        for line_no, raw_line in enumerate(lines, 1):
+            line = raw_line.strip()
+            if not line or line.startswith('#'):
+                continue
+            command, _, argument = line.partition(' ')
+            command = ACTION_ALIASES.get(command.lower())
+            if command == 'quit':
+                break
+            try:
+                result = self.execute(command, argument.strip())
+            except ValueError as e:
+                result = {'success': False, 'message': str(e)}
+            result = {'line': line_no, 'command': command or line.split()[0], **result}
+            if not result['success']:
+                failures += 1
+            self._emit(result)
+        self.out.flush()
+        return failures
+
+    def execute(self, command: str, argument: str) -> dict:
+        tm = self.task_manager
+        if command is None:
+            return {'success': False, 'message': "无效操作。"}
+
+        if command == 'plan':
+            merge = argument.startswith('--merge')
+            if merge:
+                argument = argument[len('--merge'):].strip()
+            overdue_tasks = tm.get_overdue_tasks() if merge else []
+            if argument.startswith('!'):
+                import templates
+                name, params = templates.parse_invocation(argument[1:])
+                tm.start_from_template(name, params, overdue_tasks)
+            else:
+                tm.start_new_day(argument, overdue_tasks)
+            self._current = None
+            return {'success': True, 'message': "任务解析成功。", 'total_num': len(tm.tasks)}
+
+        if command == 'template':
+            name, _, plan = argument.partition(' ')
+            return tm.save_template(name, plan)
+
+        if command == 'filter':
+            self._tag_filter = argument.lstrip('#') or None
+            self._current = None
+            return {'success': True, 'tag': self._tag_filter, 'tags': tm.get_tags()}
+
+        if command in ('undo', 'redo'):
+            self._current = None
+            return tm.undo() if command == 'undo' else tm.redo()
+
+        # 以 # 开头的参数为标签，其余为位置参数
+        options = [option for option in argument.split() if not option.startswith('#')]
+        tag = next((option for option in argument.split() if option.startswith('#')), None)
+        if command == 'summary':
+            return {'success': True, 'summary': tm.get_summary(tag)}
+
+        if command == 'report':
+            period = options[0] if options else 'week'
+            count = int(options[1]) if len(options) > 1 else 4
+            return {'success': True, 'period': period, 'report': tm.get_report(period, count, tag)}
+
+        task_info = self._current_task_info()
+        if task_info is None and self._tag_filter:
+            return {'success': False, 'message': f"没有可执行的 #{self._tag_filter} 任务。"}
+        if task_info is None:
+            return {'success': False, 'message': "没有可执行的任务。"}
+        if command == 'next':
+            return {'success': True, **_task_payload(task_info)}
+
+        task_id = task_info['task'].id
+        if command == 'done':
+            result = tm.complete_task(task_id)
+        elif command == 'postpone':
+            result = tm.postpone_task(task_id)
+        elif command == 'cancel':
+            result = tm.cancel_task(task_id)
+        elif command == 'split':
+            result = tm.split_task(task_id, argument)
+        elif command == 'add':
+            result = tm.add_task_after(task_id, argument)
+        else:
+            result = tm.edit_task(task_id, argument)
+        self._current = None
+        return {**result, 'task_id': task_id}
+
+
+def run_batch(lines, out=sys.stdout) -> int:
+    """以批处理模式运行，返回进程退出码。"""
+    task_manager = core.TaskManager()
+    runner = BatchRunner(task_manager, out)
+    failures = runner.run(lines)
+    task_manager.flush()
+    return 1 if failures else 0
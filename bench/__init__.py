@@ -0,0 +1,10 @@
+# atomize/bench/__init__.py
+"""
+Atomize 的性能基准测试。
+
+    python -m bench                          # 在 1k / 10k / 100k 个任务上运行全部基准
+    python -m bench --sizes 1000 --output before.json
+    python -m bench --compare before.json    # 与之前保存的结果对比
+    python -m bench.generate plan --tasks 5000 --depth 4 > plan.txt
+    python -m bench.generate history --years 3 --output history.csv
+"""
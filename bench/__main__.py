@@ -0,0 +1,5 @@
+# atomize/bench/__main__.py
+
+from bench.runner import main
+
+main()
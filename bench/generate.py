@@ -0,0 +1,116 @@
+# atomize/bench/generate.py
+
+import os
+import sys
+import csv
+import random
+import argparse
+import itertools
+from datetime import date, datetime, time, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from history import HISTORY_FIELDS
+
+
+def generate_plan(num_tasks: int, depth: int = 3, chain_length: int = 3, late_ratio: float = 0.1,
+                  fanout: int = 4, seed: int = 0) -> str:
+    """
+    生成一个恰好包含 num_tasks 个原子任务的规划字符串。
+    - depth: 分组最多嵌套的层数
+    - chain_length: 每条串行链 (A-B-C) 的最大长度，也是分组前置任务的最大个数
+    - late_ratio: 串行链被标记为末尾任务 (-) 的概率，约等于末尾任务所占的比例
+    - fanout: 每个分组的子片段数
+    """
+    rng = random.Random(seed)
+    counter = itertools.count(1)
+
+    def chain(length):
+        return '-'.join(f"任务{next(counter)}" for _ in range(length))
+
+    def block(budget, level):
+        """生成一个最多包含 budget 个任务的片段，返回 (文本, 实际任务数)。"""
+        if level >= depth or budget <= chain_length:
+            # 只在最内层的串行链上标记末尾任务，避免标记沿分组向下扩散
+            length = min(budget, chain_length)
+            marker = '-' if rng.random() < late_ratio else ''
+            return marker + chain(length), length
+        precursors = min(rng.randint(0, chain_length - 1), budget - 1)
+        head = chain(precursors) + '-' if precursors else ''
+        remaining = budget - precursors
+        children = []
+        while remaining > 0 and len(children) < fanout:
+            share = max(1, remaining // (fanout - len(children)))
+            text, used = block(share, level + 1)
+            children.append(text)
+            remaining -= used
+        used = budget - remaining
+        return f"{head}分组{next(counter)}({', '.join(children)})", used
+
+    segment_budget = chain_length * fanout ** depth
+    segments = []
+    remaining = num_tasks
+    while remaining > 0:
+        text, used = block(min(remaining, segment_budget), 0)
+        segments.append(text)
+        remaining -= used
+    return ', '.join(segments)
+
+
+def generate_history(path: str, years: float = 3, rows_per_day: int = 30, seed: int = 0,
+                     end: date = None) -> int:
+    """生成一个跨越若干年的 history.csv，截止到 end（默认今天）。返回写入的行数。"""
+    rng = random.Random(seed)
+    end = end or date.today()
+    days = int(years * 365)
+    groups = [f"项目{i} > 子项目{j}" for i in range(8) for j in range(4)] + ['']
+    rows = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=HISTORY_FIELDS)
+        writer.writeheader()
+        for offset in range(days, 0, -1):
+            day = end - timedelta(days=offset)
+            start = datetime.combine(day, time(8, 0))
+            for i in range(rows_per_day):
+                postponed = rng.random() < 0.15
+                status = 'skipped' if rng.random() < 0.05 else 'done'
+                writer.writerow({
+                    'timestamp': (start + timedelta(minutes=20 * i)).isoformat(timespec='seconds'),
+                    'task_name': f"任务{i}",
+                    'parent_chain': rng.choice(groups),
+                    'status': status,
+                    'was_postponed': 'yes' if postponed else 'no',
+                    'focus_points': 0 if status == 'skipped' else (15 if postponed else 10),
+                })
+                rows += 1
+    return rows
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="生成基准测试用的规划字符串和历史记录")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+
+    plan = commands.add_parser('plan', help="输出一个合成的规划字符串")
+    plan.add_argument('--tasks', type=int, default=1000)
+    plan.add_argument('--depth', type=int, default=3)
+    plan.add_argument('--chain-length', type=int, default=3)
+    plan.add_argument('--late-ratio', type=float, default=0.1)
+    plan.add_argument('--fanout', type=int, default=4)
+    plan.add_argument('--seed', type=int, default=0)
+
+    history = commands.add_parser('history', help="生成一个合成的 history.csv")
+    history.add_argument('--output', required=True)
+    history.add_argument('--years', type=float, default=3)
+    history.add_argument('--rows-per-day', type=int, default=30)
+    history.add_argument('--seed', type=int, default=0)
+
+    args = arg_parser.parse_args(argv)
+    if args.command == 'plan':
+        print(generate_plan(args.tasks, args.depth, args.chain_length, args.late_ratio, args.fanout, args.seed))
+    else:
+        rows = generate_history(args.output, args.years, args.rows_per_day, args.seed)
+        print(f"已写入 {rows} 行到 {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
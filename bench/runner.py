@@ -0,0 +1,180 @@
+# atomize/bench/runner.py
+
+import os
+import gc
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import core
+import parser
+import history
+from bench.generate import generate_plan, generate_history
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+# get_next_task_info / complete_task 这类单步操作的采样次数
+STEP_CALLS = 1000
+
+
+@contextlib.contextmanager
+def isolated_data_dir():
+    """把 core 的数据目录临时指向一个空目录，避免影响真实的 data/。"""
+    data_dir = tempfile.mkdtemp(prefix='atomize-bench-')
+    saved = core.DATA_DIR, core.SESSION_FILE, core.HISTORY_FILE
+    core.DATA_DIR = data_dir
+    core.SESSION_FILE = os.path.join(data_dir, 'session.json')
+    core.HISTORY_FILE = os.path.join(data_dir, 'history.csv')
+    try:
+        yield data_dir
+    finally:
+        core.DATA_DIR, core.SESSION_FILE, core.HISTORY_FILE = saved
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def measure(func, calls: int = 1, setup=None) -> dict:
+    """
+    分别测量耗时和峰值内存：先在不开启 tracemalloc 的情况下计时，
+    再开启 tracemalloc 重新执行一次以取得峰值内存，避免追踪开销影响计时。
+    setup 的耗时和内存不计入结果。
+    """
+    def run(traced):
+        state = setup() if setup else None
+        gc.collect()
+        if traced:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            for _ in range(calls):
+                func(state)
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] if traced else None
+        finally:
+            if traced:
+                tracemalloc.stop()
+        return elapsed, peak
+
+    elapsed, _ = run(traced=False)
+    _, peak = run(traced=True)
+    return {'calls': calls, 'seconds': elapsed, 'per_call_seconds': elapsed / calls, 'peak_bytes': peak}
+
+
+def bench_size(size: int, plan_options: dict, history_options: dict, seed: int) -> list:
+    plan = generate_plan(size, seed=seed, **plan_options)
+    results = []
+
+    def record(operation, stats):
+        results.append({'size': size, 'operation': operation, **stats})
+
+    record('parse_task_string', measure(lambda _: parser.parse_task_string(plan)))
+
+    with isolated_data_dir():
+        record('start_new_day', measure(lambda _: core.TaskManager().start_new_day(plan)))
+
+        task_manager = core.TaskManager()
+        task_manager.start_new_day(plan)
+        random.seed(seed)
+        record('get_next_task_info', measure(lambda _: task_manager.get_next_task_info(), STEP_CALLS))
+        record('_save_session', measure(lambda _: task_manager._save_session()))
+        record('load_session', measure(lambda _: core.TaskManager()))
+
+        def complete_next(tm):
+            info = tm.get_next_task_info()
+            if info:
+                tm.complete_task(info['task'].id)
+
+        calls = min(STEP_CALLS, size)
+        record('complete_task', measure(complete_next, calls, setup=lambda: _fresh_manager(plan)))
+
+    with isolated_data_dir():
+        rows = generate_history(core.HISTORY_FILE, seed=seed, **history_options)
+        record('split_history', {**measure(lambda _: history.split_history(core.HISTORY_FILE), calls=1,
+                                           setup=_restore_history), 'history_rows': rows})
+        # 首次查询会从各分区建立索引，之后的查询只读索引
+        record('get_summary_cold', {**measure(lambda _: core.TaskManager().get_summary(),
+                                              setup=_drop_history_index), 'history_rows': rows})
+        record('get_summary', {**measure(lambda _: core.TaskManager().get_summary()), 'history_rows': rows})
+    return results
+
+
+def _fresh_manager(plan: str) -> core.TaskManager:
+    task_manager = core.TaskManager()
+    task_manager.start_new_day(plan)
+    return task_manager
+
+
+def _restore_history():
+    """把拆分过的历史还原为单个 history.csv，使每次测量的拆分都从同样的状态开始。"""
+    backup = core.HISTORY_FILE + '.bak'
+    if os.path.exists(backup):
+        os.replace(backup, core.HISTORY_FILE)
+    shutil.rmtree(os.path.splitext(core.HISTORY_FILE)[0], ignore_errors=True)
+    _drop_history_index()
+
+
+def _drop_history_index():
+    shutil.rmtree(os.path.splitext(core.HISTORY_FILE)[0] + '.idx', ignore_errors=True)
+
+
+def compare(current: dict, baseline: dict):
+    """打印与基线结果的耗时和内存对比。"""
+    previous = {(r['size'], r['operation']): r for r in baseline['results']}
+    print(f"{'size':>8} {'operation':<22} {'time':>12} {'vs base':>9} {'peak MB':>9} {'vs base':>9}")
+    for r in current['results']:
+        base = previous.get((r['size'], r['operation']))
+        time_ratio = f"{r['seconds'] / base['seconds']:.2f}x" if base and base['seconds'] else '-'
+        mem_ratio = f"{r['peak_bytes'] / base['peak_bytes']:.2f}x" if base and base['peak_bytes'] else '-'
+        print(f"{r['size']:>8} {r['operation']:<22} {r['per_call_seconds'] * 1000:>10.3f}ms {time_ratio:>9} "
+              f"{r['peak_bytes'] / 1e6:>9.2f} {mem_ratio:>9}")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Atomize 性能基准测试")
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="规划中的原子任务数")
+    arg_parser.add_argument('--depth', type=int, default=3)
+    arg_parser.add_argument('--chain-length', type=int, default=3)
+    arg_parser.add_argument('--late-ratio', type=float, default=0.1)
+    arg_parser.add_argument('--fanout', type=int, default=4)
+    arg_parser.add_argument('--history-years', type=float, default=3)
+    arg_parser.add_argument('--history-rows-per-day', type=int, default=30)
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--output', help="把 JSON 结果写入文件（默认输出到标准输出）")
+    arg_parser.add_argument('--compare', help="与之前保存的 JSON 结果对比")
+    args = arg_parser.parse_args(argv)
+
+    plan_options = {'depth': args.depth, 'chain_length': args.chain_length,
+                    'late_ratio': args.late_ratio, 'fanout': args.fanout}
+    history_options = {'years': args.history_years, 'rows_per_day': args.history_rows_per_day}
+    report = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'plan_options': plan_options,
+            'history_options': history_options,
+            'seed': args.seed,
+        },
+        'results': [],
+    }
+    for size in args.sizes:
+        print(f"正在测试 {size} 个任务...", file=sys.stderr)
+        report['results'].extend(bench_size(size, plan_options, history_options, args.seed))
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+    elif not args.compare:
+        print(payload)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(report, json.load(f))
@@ -1,106 +1,303 @@
 # atomize/core.py
 
 import os
-import json
-import csv
+import time
 import random # 引入 random 模块
 from datetime import datetime
 
+import graph
 import parser
+from scheduler import ReadyQueue, WEIGHTINGS
+from store import TaskStore
+from journal import SessionJournal, apply_record, apply_to_queue, can_apply, invert_record
+from events import EventLog
 
-# --- 常量定义 (无变化) ---
+# --- 常量定义 ---
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 SESSION_FILE = os.path.join(DATA_DIR, 'session.json')
 HISTORY_FILE = os.path.join(DATA_DIR, 'history.csv')
 POINTS_BASE = 10
 POINTS_POSTPONED_BONUS = 5
+# 默认的调度方式：None 为均匀随机，或 scheduler.WEIGHTINGS 中的某个加权模式
+SCHEDULE_WEIGHTING = None
+# 是否把会话日志和历史记录交给后台线程写盘（见 writer.py）
+WRITE_BEHIND = False
+# 目标任务已被其他进程修改时返回的提示
+CONFLICT_MESSAGE = "此任务已在其他终端中被完成、取消或拆分，请继续下一个任务。"
+# 每个实例最多保留的可撤销步数
+UNDO_LIMIT = 100
+# 可以撤销的操作 -> 提示中的名称
+UNDO_NAMES = {'done': '完成', 'skip': '取消', 'postpone': '推迟', 'edit': '修改', 'add': '添加', 'split': '拆分'}
+# 写入历史记录的操作 -> 历史中的状态
+HISTORY_STATUS = {'done': 'done', 'skip': 'skipped', 'postpone': 'postponed'}
+# 撤销完成 / 取消 / 推迟时，历史记录中追加的抵消行的状态
+RETRACTED_STATUS = {'done': 'undone', 'skipped': 'unskipped', 'postponed': 'unpostponed'}
+
+def _tag_name(tag: str):
+    """接受 “deep” 或 “#deep” 形式的标签，空字符串视为不筛选。"""
+    return tag.strip().lstrip('#') or None if tag else None
 
 class TaskManager:
     """
     负责所有核心业务逻辑，包括任务状态管理、数据持久化和统计。
     """
-    def __init__(self):
-        self.tasks = []
+    def __init__(self, weighting: str = None, write_behind: bool = None, data_dir: str = None):
+        """data_dir 为该实例独占的数据目录；不指定时使用全局的 DATA_DIR / SESSION_FILE / HISTORY_FILE。"""
+        self.tasks = TaskStore()
         self.total_points = 0
         self.postponed_today_count = 0
         self.session_date = datetime.now().strftime('%Y-%m-%d')
-        
-        os.makedirs(DATA_DIR, exist_ok=True)
+        weighting = weighting or SCHEDULE_WEIGHTING
+        self._weighting = weighting
+        self._ready_queue = ReadyQueue(weight_fn=WEIGHTINGS[weighting] if weighting else None)
+        writer = None
+        if WRITE_BEHIND if write_behind is None else write_behind:
+            import writer as writer_module
+            writer = writer_module.get_writer()
+        if data_dir is None:
+            data_dir, session_file, history_file = DATA_DIR, SESSION_FILE, HISTORY_FILE
+        else:
+            session_file = os.path.join(data_dir, os.path.basename(SESSION_FILE))
+            history_file = os.path.join(data_dir, os.path.basename(HISTORY_FILE))
+        self.data_dir = data_dir
+        self._writer = writer
+        self._journal = SessionJournal(session_file, writer)
+        self._events = EventLog(os.path.join(data_dir, 'events'), writer)
+        # 撤销栈：(记录, 逆操作)；重做栈：被撤销的记录
+        self._undo_stack = []
+        self._redo_stack = []
+        # 最近一次推送：(任务 id, 随机种子, 标签)，随针对该任务的下一次修改写入事件流
+        self._last_pick = None
+        # 任务 id -> 最近一次被推送的时间；(任务 id, 历史状态) -> 写入历史的用时，撤销 / 重做时沿用
+        self._presented_at = {}
+        self._elapsed = {}
+        # 历史记录在第一次完成任务或查看统计时才打开（连同 history 模块一起按需加载）
+        self._history_file = history_file
+        self._history_store = None
+        self._template_store = None
+        # 会话文件中非今天的会话里尚未完成的任务，随会话一起加载，供 get_overdue_tasks 复用
+        self._overdue_tasks = []
+
+        os.makedirs(data_dir, exist_ok=True)
         self._load_session()
 
-    # --- 以下方法到 get_next_task_info 之前均无变化 ---
+    @property
+    def _templates(self):
+        """规划模板和编译缓存，第一次开始新的一天时才加载 templates 模块。"""
+        if self._template_store is None:
+            from templates import TemplateStore, PlanCache
+            cache = PlanCache(os.path.join(self.data_dir, 'plan_cache'))
+            self._template_store = TemplateStore(os.path.join(self.data_dir, 'templates'), cache)
+        return self._template_store
+
+    @property
+    def _history(self):
+        if self._history_store is None:
+            from history import HistoryStore
+            self._history_store = HistoryStore(self._history_file, self._writer)
+        return self._history_store
+
     def _load_session(self):
-        if os.path.exists(SESSION_FILE):
-            try:
-                with open(SESSION_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if data.get('date') == self.session_date:
-                        self.tasks = data.get('tasks', [])
-                        self.total_points = data.get('total_points', 0)
-                        self.postponed_today_count = data.get('postponed_today_count', 0)
-            except (json.JSONDecodeError, IOError):
-                self._clear_session_file()
+        state = self._journal.load()
+        if state is not None and state.session_date == self.session_date:
+            self.tasks = state.tasks
+            self.total_points = state.total_points
+            self.postponed_today_count = state.postponed_today_count
+            self._overdue_tasks = []
+            self._rebuild_queue()
+            # 其他终端可能同时加载同一会话，检查并补写 start 事件时加锁
+            with self._journal.lock:
+                self._events.resume(self, self._weighting)
+        else:
+            self._overdue_tasks = [t for t in state.tasks if t.status == 'pending'] if state is not None else []
+            self._reset_state()
+
+    def revalidate(self):
+        """
+        长期复用同一个实例时（例如从主菜单再次进入），在使用前调用：
+        日期变了就按新的日期重新加载；否则只在会话文件的 mtime / 大小变化时合并修改，没有变化时不读文件。
+        """
+        today = datetime.now().strftime('%Y-%m-%d')
+        if today != self.session_date:
+            self.session_date = today
+            self._load_session()
+        else:
+            self._refresh()
 
     def _save_session(self):
-        session_data = {
-            'date': self.session_date,
-            'tasks': self.tasks,
-            'total_points': self.total_points,
-            'postponed_today_count': self.postponed_today_count,
-        }
-        with open(SESSION_FILE, 'w', encoding='utf-8') as f:
-            json.dump(session_data, f, ensure_ascii=False, indent=4)
+        """写入完整快照（同时清空日志）。日常的单步修改走 _commit。"""
+        self._journal.write_snapshot(self)
+
+    def _commit(self, record: dict, kind: str = 'do') -> bool:
+        """
+        应用一条修改记录并同步就绪队列，只把这条记录追加到会话日志和当天的事件流中。
+        写入前先合并其他进程的修改；如果目标任务已在别处被完成、取消或拆分，放弃本次修改并返回 False。
+        kind 为 'do'（新的修改）、'undo' 或 'redo'：新的修改和重做连同逆操作压入撤销栈，新的修改还会清空重做栈。
+        """
+        with self._journal.lock:
+            self._refresh()
+            if not can_apply(self, record):
+                return False
+            self._note_pick(record)
+            if record['op'] == 'split':
+                # 依赖被拆分任务的待办任务，改为依赖拆分片段的出口
+                record['dependents'] = self._ready_queue.dependents_of(record['id'])
+            inverse = invert_record(self, record) if kind != 'undo' and record['op'] in UNDO_NAMES else None
+            apply_record(self, record)
+            apply_to_queue(self._ready_queue, record, self.tasks)
+            self._journal.append(record, self)
+            self._events.append(self.session_date, record)
+        if inverse is not None:
+            self._undo_stack.append((record, inverse))
+            del self._undo_stack[:-UNDO_LIMIT]
+            if kind == 'do':
+                self._redo_stack.clear()
+        return True
+
+    def _note_pick(self, record: dict):
+        """修改的正是最近一次推送的任务时，把那次推送的随机种子（和筛选的标签）记入这条记录。"""
+        if self._last_pick is None or self._last_pick[0] != record.get('id', record.get('after')):
+            return
+        _, record['seed'], tag = self._last_pick
+        if tag is not None:
+            record['tag'] = tag
+        self._last_pick = None
 
-    def _save_to_history(self, task, points_earned, status='done'):
-        file_exists = os.path.isfile(HISTORY_FILE)
-        parent_chain_str = " > ".join(task['parent_chain'])
+    def _rebuild_queue(self):
+        self._ready_queue.rebuild(self.tasks)
+        self._events.mark_rebuild()
+
+    def _refresh(self):
+        """合并其他进程（例如另一个终端）对同一会话的修改。没有改动时不加锁。"""
+        if not self._journal.changed():
+            return
+        with self._journal.lock:
+            if self._journal.refresh(self):
+                self._rebuild_queue()
+
+    def _take_elapsed(self, task_id: str, status: str):
+        """本次操作距该任务最近一次被推送的秒数（本进程没有推送过它时为 None），并记下供撤销 / 重做使用。"""
+        presented = self._presented_at.pop(task_id, None)
+        elapsed = None if presented is None else max(0, round(time.time() - presented))
+        self._elapsed[(task_id, status)] = elapsed
+        return elapsed
+
+    def _save_to_history(self, task, points_earned, status='done', elapsed=None):
+        parent_chain_str = task.path()
         row = {
             'timestamp': datetime.now().isoformat(timespec='seconds'),
-            'task_name': task['name'],
+            'task_name': task.name,
             'parent_chain': parent_chain_str,
             'status': status,
-            'was_postponed': 'yes' if task['postponed_count'] > 0 else 'no',
-            'focus_points': points_earned
+            'was_postponed': 'yes' if task.postponed_count > 0 else 'no',
+            'focus_points': points_earned,
+            'tags': ' '.join(sorted(task.tags)),
+            'elapsed': '' if elapsed is None else elapsed,
         }
-        with open(HISTORY_FILE, 'a', newline='', encoding='utf-8') as f:
-            fieldnames = row.keys()
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(row)
+        self._history.append(row)
+
+    def flush(self):
+        """等待所有已提交的修改写入磁盘。启用后台写入时，退出或切换界面前调用。"""
+        self._journal.flush()
+        if self._history_store is not None:
+            self._history_store.flush()
+
+    def close(self):
+        """写完所有修改并释放文件句柄。之后不应再使用该实例。"""
+        self._journal.flush()
+        self._journal.close()
+        self._events.close()
+        if self._history_store is not None:
+            self._history_store.close()
 
     def _clear_session_file(self):
-        if os.path.exists(SESSION_FILE):
-            os.remove(SESSION_FILE)
+        self._journal.clear()
 
     def _reset_state(self):
-        self.tasks = []
+        self.tasks = TaskStore()
         self.total_points = 0
         self.postponed_today_count = 0
         self.session_date = datetime.now().strftime('%Y-%m-%d')
+        self._undo_stack.clear()
+        self._redo_stack.clear()
+        self._last_pick = None
+        self._presented_at.clear()
+        self._elapsed.clear()
+        self._rebuild_queue()
     
     def get_overdue_tasks(self) -> list:
-        if os.path.exists(SESSION_FILE):
-            try:
-                with open(SESSION_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                if data.get('date') != self.session_date:
-                    return [t for t in data.get('tasks', []) if t['status'] == 'pending']
-            except (json.JSONDecodeError, IOError):
-                return []
-        return []
+        """会话文件中非今天的会话里尚未完成的任务。使用加载会话时保存的结果，会话文件变化时才重新读取。"""
+        if self._journal.changed():
+            self._load_session()
+        return list(self._overdue_tasks)
 
     def has_active_session(self):
-        return bool(self.tasks and any(t['status'] == 'pending' for t in self.tasks))
+        return bool(self._ready_queue.pending_count)
 
     def start_new_day(self, task_string: str, overdue_tasks_to_merge: list = None):
-        self._clear_session_file()
-        self._reset_state()
-        new_tasks = parser.parse_task_string(task_string)
-        
+        # 较长的规划字符串只解析一次，之后从编译缓存中复制结构并分配新的 id（见 templates.py）
+        new_tasks = self._templates.cache.parse(task_string) if task_string.strip() else []
+        # 先等后台线程写完：清空会话时还会等待一次，那时已持有锁，后台线程不能再被锁挡住
+        self._journal.flush()
+        with self._journal.lock:
+            self._start_new_day(new_tasks, overdue_tasks_to_merge)
+
+    def start_from_template(self, name: str, params: dict = None, overdue_tasks_to_merge: list = None):
+        """用具名模板开始新的一天，params 替换模板中的 {参数}。模板不存在或缺少参数时抛出 ValueError。"""
+        new_tasks = self._templates.instantiate(name, params)
+        # 与 start_new_day 相同，先等后台线程写完再加锁
+        self._journal.flush()
+        with self._journal.lock:
+            self._start_new_day(new_tasks, overdue_tasks_to_merge)
+
+    def get_templates(self) -> dict:
+        """所有模板：名称 -> {参数: 默认值}。"""
+        return {name: self._templates.params(name) for name in self._templates.names()}
+
+    def save_template(self, name: str, task_string: str) -> dict:
+        try:
+            self._templates.save(name, task_string)
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}
+        return {'success': True, 'message': f"模板 {name} 已保存。"}
+
+    def import_plan(self, path: str, overdue_tasks_to_merge: list = None, progress=None) -> dict:
+        """
+        从规划文件开始新的一天。文件按片段流式解析（见 planfile.py），
+        出错的片段被跳过并在 errors 中列出，其余任务一次性写入会话（只保存一次快照）。
+        """
+        import planfile
+        try:
+            new_tasks, errors = planfile.parse_plan_file(path, progress)
+        except OSError as e:
+            return {'success': False, 'message': f"无法读取规划文件: {e}", 'errors': []}
+        if not new_tasks and not overdue_tasks_to_merge:
+            return {'success': False, 'message': "规划文件中没有可导入的任务。", 'errors': errors}
+        try:
+            self._journal.flush()
+            with self._journal.lock:
+                self._start_new_day(new_tasks, overdue_tasks_to_merge)
+        except ValueError as e:
+            return {'success': False, 'message': str(e), 'errors': errors}
+        message = f"已导入 {len(new_tasks)} 个任务。"
+        if errors:
+            message += f" {len(errors)} 个片段有错误，已跳过。"
+        return {'success': True, 'message': message, 'total_num': len(self.tasks), 'errors': errors}
+
+    def _start_new_day(self, new_tasks: list, overdue_tasks_to_merge: list = None):
         # 健壮性：合并隔夜任务时，也要确保它们是有效的任务对象
         merged_tasks = (overdue_tasks_to_merge or []) + new_tasks
-        self.tasks = merged_tasks
+        # 隔夜任务的前置任务可能已在昨天完成，不在今天的列表中，这些依赖视为已满足；
+        # 合并后的依赖图必须无环，校验失败时保留原有会话
+        graph.prune_dangling(merged_tasks)
+        graph.analyze(merged_tasks)
+
+        self._clear_session_file()
+        self._reset_state()
+        self._overdue_tasks = []
+        self.tasks = TaskStore(merged_tasks)
+        self._ready_queue.rebuild(self.tasks)
+        self._events.start(self.session_date, self.tasks, self._weighting)
         
         if not self.tasks:
             # 允许用户不输入任何任务（例如只想处理隔夜任务）
@@ -110,7 +307,7 @@ class TaskManager:
         self._save_session()
 
     # --- 核心修改：实现结构化随机调度 ---
-    def get_next_task_info(self):
+    def get_next_task_info(self, tag: str = None):
         """
         获取下一个可执行的任务。
         该方法实现了“结构化随机”逻辑：
@@ -118,152 +315,162 @@ class TaskManager:
         2. 仅当所有“常规任务”完成后，才开始从“末尾任务”中选择。
         3. 在每个阶段，只选择那些“前置依赖已完成”的任务。
         4. 从所有可执行的任务中随机选择一个进行推送。
+        指定 tag 时只在带有该标签的可执行任务中选择（通过标签倒排索引，不扫描任务列表），
+        没有这样的任务时返回 None。
         """
-        pending_tasks = [t for t in self.tasks if t['status'] == 'pending']
-        if not pending_tasks:
+        # 就绪队列在每次修改时增量维护，这里无需再扫描整个任务列表
+        self._refresh()
+        if not self._ready_queue.pending_count:
             self._clear_session_file()
             return None
 
-        # 1. 创建已完成任务ID的集合，用于高效查询依赖关系
-        done_task_ids = {t['id'] for t in self.tasks if t['status'] != 'pending'}
-
-        # 2. 将待办任务分为“常规”和“末尾”两类
-        normal_pending = [t for t in pending_tasks if not t.get('is_late_task', False)]
-        late_pending = [t for t in pending_tasks if t.get('is_late_task', False)]
-        
-        # 3. 确定当前阶段要处理的任务池 (常规任务优先)
-        target_pool = normal_pending
-        # 如果常规任务已经全部完成，则切换到末尾任务池
-        if not target_pool:
-            target_pool = late_pending
-
-        # 4. 从目标池中筛选出所有可执行的任务（依赖已解除）
-        available_tasks = [
-            task for task in target_pool 
-            if not task.get('depends_on') or task.get('depends_on') in done_task_ids
-        ]
-
-        # 5. 从可用任务池中随机选择一个任务
-        if not available_tasks:
-            # 健壮性：如果没有可执行的任务，有两种可能：
-            # a) 所有任务都已完成（最开始的 pending_tasks 检查会处理）。
-            # b) 任务之间存在循环依赖或死锁。我们的解析器设计上避免了这种情况，
-            #    但保留此检查可以防止未来可能出现的bug。
-            #    此时返回 None，主循环会显示“所有任务已完成”。
+        tag = _tag_name(tag)
+        # 每次推送使用独立的种子，它随后续修改写入事件流，重放时可以得到同样的选择
+        seed = random.getrandbits(32)
+        current_task = self._ready_queue.pick(random.Random(seed), tag)
+        if current_task is None:
+            if tag is None:
+                # 有待办任务却没有可执行的任务，只可能是任务之间存在循环依赖。
+                # 解析和合并时都已校验过依赖图，这里由 analyze 抛出包含相关任务名的 DependencyError。
+                graph.analyze(self.tasks, strict=False)
             return None
         
-        current_task = random.choice(available_tasks)
-        
-        done_count = len(done_task_ids)
+        self._last_pick = (current_task.id, seed, tag)
+        self._presented_at[current_task.id] = time.time()
+        done_count = self._ready_queue.finished_count
         return {'task': current_task, 'current_num': done_count + 1, 'total_num': len(self.tasks)}
 
-    # --- 以下方法均无变化 ---
     def complete_task(self, task_id: str):
-        for task in self.tasks:
-            if task['id'] == task_id:
-                points_earned = POINTS_BASE + (POINTS_POSTPONED_BONUS if task['postponed_count'] > 0 else 0)
-                self.total_points += points_earned
-                task['status'] = 'done'
-                self._save_to_history(task, points_earned, status='done')
-                self._save_session()
-                return {'success': True, 'message': f"+{points_earned} 专注点！任务 “{task['name']}” 已完成。"}
-        return {'success': False, 'message': "错误：找不到指定任务。"}
+        task = self.tasks.get(task_id)
+        if task is None: return {'success': False, 'message': "错误：找不到指定任务。"}
+        points_earned = POINTS_BASE + (POINTS_POSTPONED_BONUS if task.postponed_count > 0 else 0)
+        if not self._commit({'op': 'done', 'id': task_id, 'points': points_earned}):
+            return {'success': False, 'message': CONFLICT_MESSAGE}
+        task = self.tasks.get(task_id)  # 合并其他进程的修改时可能整体重新加载过
+        self._save_to_history(task, points_earned, status='done', elapsed=self._take_elapsed(task_id, 'done'))
+        return {'success': True, 'message': f"+{points_earned} 专注点！任务 “{task.name}” 已完成。"}
 
     def postpone_task(self, task_id: str):
-        task_index = next((i for i, t in enumerate(self.tasks) if t['id'] == task_id), -1)
-        if task_index == -1: return {'success': False, 'message': "错误：找不到指定任务。"}
+        task_to_move = self.tasks.get(task_id)
+        if task_to_move is None: return {'success': False, 'message': "错误：找不到指定任务。"}
         
-        task_to_move = self.tasks[task_index]
-        
-        # 健壮性：推迟任务时，将其插入到列表末尾，但要确保它在所有已完成任务之后，待办任务之中
-        pending_tasks_start_index = next((i for i, t in enumerate(self.tasks) if t['status'] == 'pending'), len(self.tasks))
-        
-        if task_to_move['postponed_count'] > 0:
+        if task_to_move.postponed_count > 0:
             return {'success': False, 'message': "[!] 此任务已被推迟过一次，请立即完成！"}
         
-        task_to_move['postponed_count'] += 1
-        self.postponed_today_count += 1
-        
-        self.tasks.pop(task_index)
-        self.tasks.append(task_to_move) # 简单地移动到列表最后即可，调度逻辑会自动处理
-        self._save_session()
+        # 计数加一并简单地移动到列表最后即可，调度逻辑会自动处理
+        if not self._commit({'op': 'postpone', 'id': task_id}):
+            return {'success': False, 'message': CONFLICT_MESSAGE}
+        # 推迟只为计时写入历史，不计入完成 / 取消的统计
+        self._save_to_history(self.tasks.get(task_id), 0, status='postponed',
+                              elapsed=self._take_elapsed(task_id, 'postponed'))
         return {'success': True, 'message': "任务已推迟。它将在稍后再次出现。"}
 
     def cancel_task(self, task_id: str):
-        for task in self.tasks:
-            if task['id'] == task_id:
-                task['status'] = 'skipped'
-                self._save_to_history(task, 0, status='skipped')
-                self._save_session()
-                return {'success': True, 'message': f"任务 “{task['name']}” 已取消。"}
-        return {'success': False, 'message': "错误：找不到指定任务。"}
+        task = self.tasks.get(task_id)
+        if task is None: return {'success': False, 'message': "错误：找不到指定任务。"}
+        if not self._commit({'op': 'skip', 'id': task_id}):
+            return {'success': False, 'message': CONFLICT_MESSAGE}
+        task = self.tasks.get(task_id)  # 合并其他进程的修改时可能整体重新加载过
+        self._save_to_history(task, 0, status='skipped', elapsed=self._take_elapsed(task_id, 'skipped'))
+        return {'success': True, 'message': f"任务 “{task.name}” 已取消。"}
 
     def edit_task(self, task_id: str, new_name: str):
         if not new_name.strip(): return {'success': False, 'message': "任务名不能为空。"}
-        for task in self.tasks:
-            if task['id'] == task_id:
-                task['name'] = new_name.strip()
-                self._save_session()
-                return {'success': True, 'message': "任务已更新。"}
-        return {'success': False, 'message': "错误：找不到指定任务。"}
+        task = self.tasks.get(task_id)
+        if task is None: return {'success': False, 'message': "错误：找不到指定任务。"}
+        if not self._commit({'op': 'edit', 'id': task_id, 'name': new_name.strip()}):
+            return {'success': False, 'message': CONFLICT_MESSAGE}
+        return {'success': True, 'message': "任务已更新。"}
 
     def add_task_after(self, current_task_id: str, new_task_name: str):
         if not new_task_name.strip(): return {'success': False, 'message': "任务名不能为空。"}
-        current_task_index = next((i for i, t in enumerate(self.tasks) if t['id'] == current_task_id), -1)
-        if current_task_index == -1: return {'success': False, 'message': "错误：找不到当前任务。"}
-        current_task = self.tasks[current_task_index]
+        current_task = self.tasks.get(current_task_id)
+        if current_task is None: return {'success': False, 'message': "错误：找不到当前任务。"}
         
-        # 新增的任务是常规任务，无依赖
-        new_task = parser._create_atomic_task(new_task_name, current_task['parent_chain'])
+        # 新增的任务是常规任务，无依赖，沿用当前任务的标签
+        new_task = parser._create_atomic_task(new_task_name, current_task.group, tags=current_task.tags)
         
-        self.tasks.insert(current_task_index + 1, new_task)
-        self._save_session()
+        if not self._commit({'op': 'add', 'after': current_task_id, 'task': new_task}):
+            return {'success': False, 'message': CONFLICT_MESSAGE}
         return {'success': True, 'message': f"新任务 “{new_task_name}” 已添加。"}
 
     def split_task(self, task_id: str, sub_task_string: str):
         if not sub_task_string.strip(): return {'success': False, 'message': "子任务描述不能为空。"}
-        task_index = next((i for i, t in enumerate(self.tasks) if t['id'] == task_id), -1)
-        if task_index == -1: return {'success': False, 'message': "错误：找不到要拆分的任务。"}
+        original_task = self.tasks.get(task_id)
+        if original_task is None: return {'success': False, 'message': "错误：找不到要拆分的任务。"}
         
-        original_task = self.tasks[task_index]
-        new_parent_chain = original_task['parent_chain'] + [original_task['name']]
+        # 被拆分的任务成为新的分组节点，子任务共享这个节点
+        new_group = original_task.group.child(original_task.name)
         
         try:
-            # 拆分出的子任务，其 late 状态继承自父任务
-            sub_tasks = parser._parse_children(sub_task_string, new_parent_chain, parent_is_late=original_task.get('is_late_task', False))
+            # 拆分出的子任务，其 late 状态和标签继承自父任务；片段的入口继承父任务的前置任务
+            sub_tasks, exits = parser.parse_fragment(sub_task_string, new_group, parent_is_late=original_task.is_late_task,
+                                                     parent_tags=original_task.tags,
+                                                     entry_deps=original_task.depends_on)
             if not sub_tasks: raise ValueError("未解析出任何子任务。")
         except ValueError as e:
             return {'success': False, 'message': f"子任务格式错误: {e}"}
             
-        self.tasks.pop(task_index)
-        self.tasks[task_index:task_index] = sub_tasks
-        self._save_session()
+        if not self._commit({'op': 'split', 'id': task_id, 'tasks': sub_tasks, 'exits': list(exits)}):
+            return {'success': False, 'message': CONFLICT_MESSAGE}
         return {'success': True, 'message': f"任务已成功拆分为 {len(sub_tasks)} 个子任务。"}
 
-    def get_summary(self):
+    def undo(self) -> dict:
+        """撤销本实例最近一次完成、取消、推迟、修改、添加或拆分。只应用一条逆操作记录，与原操作的代价相同。"""
+        if not self._undo_stack:
+            return {'success': False, 'message': "没有可以撤销的操作。"}
+        record, inverse = self._undo_stack.pop()
+        if not self._commit(inverse, 'undo'):
+            return {'success': False, 'message': CONFLICT_MESSAGE}
+        self._redo_stack.append(record)
+        status = HISTORY_STATUS.get(record['op'])
+        if status is not None:
+            # 历史记录只追加：写入一行抵消原来的完成 / 取消 / 推迟（连同原来的用时）
+            self._save_to_history(self.tasks.get(record['id']), record.get('points', 0),
+                                  status=RETRACTED_STATUS[status], elapsed=self._elapsed.get((record['id'], status)))
+        return {'success': True, 'message': f"已撤销{UNDO_NAMES[record['op']]}。"}
+
+    def redo(self) -> dict:
+        """重新应用最近一次被撤销的操作。"""
+        if not self._redo_stack:
+            return {'success': False, 'message': "没有可以重做的操作。"}
+        # 序号在写入时重新分配；重做不是由推送引起的，不带原来的种子
+        record = {key: value for key, value in self._redo_stack.pop().items() if key not in ('seq', 'seed', 'tag')}
+        if not self._commit(record, 'redo'):
+            return {'success': False, 'message': CONFLICT_MESSAGE}
+        status = HISTORY_STATUS.get(record['op'])
+        if status is not None:
+            self._save_to_history(self.tasks.get(record['id']), record.get('points', 0), status=status,
+                                  elapsed=self._elapsed.get((record['id'], status)))
+        return {'success': True, 'message': f"已重做{UNDO_NAMES[record['op']]}。"}
+
+    def get_report(self, period: str = 'week', count: int = 4, tag: str = None) -> list:
+        """最近 count 个日 / 周 / 月的统计报告，见 analytics.build_report。"""
+        import analytics
+        return analytics.build_report(self._history, period, count, tag=_tag_name(tag))
+
+    def get_tags(self) -> dict:
+        """当前会话中各标签下尚未完成的任务数。"""
+        return self._ready_queue.tag_counts()
+
+    def get_summary(self, tag: str = None):
+        """
+        今日总结：完成数、专注点和推迟次数。不按标签筛选时还包括 throughput，
+        即由历史索引中当天的计时汇总算出的效率指标（见 analytics.throughput）。
+        """
+        self._refresh()
+        tag = _tag_name(tag)
+        if tag is not None:
+            # 按标签的总结总是来自历史索引中当天该标签的汇总
+            day = self._history.period_summary('day', self.session_date, tag)
+            return {'date': self.session_date, 'tag': tag, 'completed_count': day['done'],
+                    'total_points': day['points'], 'postponed_count': day['postponed_rows']}
+        import analytics
+        day = self._history.day_summary(self.session_date)
         if self.has_active_session():
-            completed_count = len([t for t in self.tasks if t['status'] == 'done'])
-            return {'date': self.session_date, 'completed_count': completed_count, 'total_points': self.total_points, 'postponed_count': self.postponed_today_count}
-        completed_count, points, postponed = 0, 0, 0
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, 'r', newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['timestamp'].startswith(self.session_date):
-                        if row['status'] == 'done':
-                            completed_count += 1
-                            points += int(row['focus_points'])
-                        # 修复：总结报告中的 postponed 计数应基于历史记录中的 was_postponed 字段
-                        if row['was_postponed'] == 'yes':
-                            # 这可能会重复计算，更好的方式是计算推迟过的任务数
-                            pass # 暂时维持原逻辑，但需要注意
-        # 更好的 postponed 计数
-        postponed_tasks_today = set()
-        if os.path.exists(HISTORY_FILE):
-             with open(HISTORY_FILE, 'r', newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['timestamp'].startswith(self.session_date) and row['was_postponed'] == 'yes':
-                         postponed_tasks_today.add(row['task_name'] + row['parent_chain'])
-        
-        return {'date': self.session_date, 'completed_count': completed_count, 'total_points': points, 'postponed_count': len(postponed_tasks_today)}
\ No newline at end of file
+            completed_count = len([t for t in self.tasks if t.status == 'done'])
+            return {'date': self.session_date, 'completed_count': completed_count, 'total_points': self.total_points, 'postponed_count': self.postponed_today_count,
+                    'throughput': analytics.throughput(day)}
+        # 非活跃会话时从历史索引中读取当天的汇总，不再扫描整个 history.csv
+        return {'date': self.session_date, 'completed_count': day['done'], 'total_points': day['points'], 'postponed_count': len(day['postponed']),
+                'throughput': analytics.throughput(day)}
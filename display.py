@@ -1,7 +1,9 @@
 # atomize/display.py
 
-import os
+import re
 import sys
+import shutil
+import unicodedata
 
 class Colors:
     RESET = '\033[0m'
@@ -13,12 +15,86 @@ class Colors:
     MAGENTA = '\033[95m'
     DIM = '\033[2m'
 
+_ANSI_RE = re.compile(r'\033\[[0-9;]*[A-Za-z]')
+
+def _visible_width(line: str) -> int:
+    """去掉颜色代码后，一行文字在终端中占用的列数（全角字符占两列）。"""
+    plain = _ANSI_RE.sub('', line)
+    return sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in plain)
+
+class _Renderer:
+    """
+    基于 ANSI 转义序列的终端渲染器，不再为清屏启动子进程。
+    - clear_screen() 只是开始新的一帧。每帧第一次输出的内容按行与上一帧比较，
+      只重写变化的行，再清掉下方的残留，整帧一次写出。
+    - 之后同一帧内的输出（输入提示及回显、提示消息等）直接追加，不做定位，但会记下追加的行数。
+      这些行可能已经让终端滚屏，屏幕上的内容不再与上一帧对应，因此下一帧整屏重绘。
+    - 内容超出一屏或有行折行时，同样退回整屏重绘。
+    - 标准输出不是终端时（管道、重定向）不输出任何控制字符，也不加颜色。
+    """
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        try:
+            self.interactive = self.stream.isatty()
+        except (AttributeError, ValueError):
+            self.interactive = False
+        self._previous = []
+        self._positioned = False
+        # 上一帧之后追加输出的行数
+        self._trailing = 0
+
+    def new_frame(self):
+        self._positioned = True
+
+    def note_lines(self, count: int):
+        """记录当前帧之后出现在终端上的行数：write 追加的输出，以及 input 的提示和回显、进度行。"""
+        if self.interactive:
+            self._trailing += count
+
+    def write(self, text: str):
+        lines = text.split('\n')
+        if not (self.interactive and self._positioned):
+            self.stream.write(text + '\n')
+            self.stream.flush()
+            self.note_lines(len(lines))
+            return
+        self._positioned = False
+
+        size = shutil.get_terminal_size()
+        overflow = len(lines) >= size.lines or any(_visible_width(line) >= size.columns for line in lines)
+        if overflow or self._trailing:
+            # 会滚屏或折行，或者上一帧之后的输出可能已经滚屏：无法按行定位，整屏重绘
+            self.stream.write('\033[H\033[2J' + text + '\n')
+            self.stream.flush()
+            self._previous = [] if overflow else lines
+            self._trailing = 0
+            return
+
+        parts = []
+        for row, line in enumerate(lines):
+            if row < len(self._previous) and self._previous[row] == line:
+                continue
+            parts.append(f'\033[{row + 1};1H\033[2K{line}')
+        # 光标移到帧末尾，并清除下方的所有旧内容
+        parts.append(f'\033[{len(lines) + 1};1H\033[J')
+        self.stream.write(''.join(parts))
+        self.stream.flush()
+        self._previous = lines
+
+_renderer = _Renderer()
+
 def clear_screen():
-    """根据操作系统类型清空终端屏幕。"""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    """开始新的一帧。实际的重绘在下一次输出时完成。"""
+    _renderer.new_frame()
+
+def _output(*lines: str):
+    """把多行内容作为一个整体交给渲染器，一次写出。"""
+    _renderer.write('\n'.join(lines))
 
 def _colorize(text: str, color_code: str) -> str:
     """给文本添加颜色。"""
+    if not _renderer.interactive:
+        return str(text)
     return f"{color_code}{text}{Colors.RESET}"
 
 ASCII_LOGO = r"""   ___  __             _        
@@ -28,26 +104,29 @@ ASCII_LOGO = r"""   ___  __             _
 
 def show_main_menu():
     """显示主菜单界面。"""
-    print(_colorize(ASCII_LOGO, Colors.BOLD))
-    print("\n请选择操作：")
-    print(f"[{_colorize('1', Colors.CYAN)}] 规划")
-    print(f"[{_colorize('2', Colors.CYAN)}] 继续")
-    print(f"[{_colorize('3', Colors.CYAN)}] 查看")
-    print(f"[{_colorize('4', Colors.CYAN)}] 退出")
-
-def show_current_task(task: dict, current_num: int, total_num: int):
-    """格式化并显示当前正在执行的任务。"""
+    _output(
+        # 逐行着色，保证每一行都能独立比较和重绘
+        *[_colorize(line, Colors.BOLD) for line in ASCII_LOGO.split('\n')],
+        "\n请选择操作：",
+        f"[{_colorize('1', Colors.CYAN)}] 规划",
+        f"[{_colorize('2', Colors.CYAN)}] 继续",
+        f"[{_colorize('3', Colors.CYAN)}] 查看",
+        f"[{_colorize('4', Colors.CYAN)}] 退出",
+    )
+
+def show_current_task(task, current_num: int, total_num: int, tag_filter: str = None):
+    """格式化并显示当前正在执行的任务。tag_filter 为当前的标签筛选。"""
     context_path = ""
-    if task.get('parent_chain'):
-        context_path = " > ".join(task['parent_chain']) + " > "
+    if task.parent_chain:
+        context_path = task.path() + " > "
+    tags = " ".join('#' + tag for tag in sorted(task.tags))
     
     progress_bar = f"[{current_num}/{total_num}]"
-    task_header = f"{progress_bar} {context_path}{_colorize(task['name'], Colors.BOLD)}"
+    task_header = f"{progress_bar} {context_path}{_colorize(task.name, Colors.BOLD)}"
+    if tags:
+        task_header += "  " + _colorize(tags, Colors.DIM)
     
-    header_len = len(progress_bar) + len(context_path) + len(task['name']) + 2
-    print("-" * header_len)
-    print(task_header)
-    print("-" * header_len)
+    header_len = len(progress_bar) + len(context_path) + len(task.name) + 2 + (len(tags) + 2 if tags else 0)
     
     # --- 【UI更新】将操作指令整合到一行 ---
     core_actions = [
@@ -59,11 +138,17 @@ def show_current_task(task: dict, current_num: int, total_num: int):
         f"[{_colorize('s', Colors.CYAN)}]plit",
         f"[{_colorize('a', Colors.CYAN)}]dd",
         f"[{_colorize('e', Colors.CYAN)}]dit",
-        f"[{_colorize('c', Colors.MAGENTA)}]ancel"
+        f"[{_colorize('c', Colors.MAGENTA)}]ancel",
+        f"[{_colorize('f', Colors.CYAN)}]ilter",
+        f"[{_colorize('u', Colors.DIM)}]ndo",
+        f"[{_colorize('r', Colors.DIM)}]edo"
     ]
     
     actions_line = " | ".join(core_actions) + "  " + _colorize("::", Colors.DIM) + "  " + " | ".join(edit_actions)
-    print(f"\n操作: {actions_line}")
+    lines = ["-" * header_len, task_header, "-" * header_len, f"\n操作: {actions_line}"]
+    if tag_filter:
+        lines.append(_colorize(f"筛选: 只推送 #{tag_filter.lstrip('#')} 任务", Colors.DIM))
+    _output(*lines)
 
 
 def show_summary(summary_data: dict):
@@ -74,34 +159,111 @@ def show_summary(summary_data: dict):
     postponed = summary_data.get('postponed_count', 0)
     
     header = f"今日总结 ({date})"
-    print(_colorize(header, Colors.BOLD))
-    print("-" * len(header))
-    print(f"已完成任务数: {_colorize(completed, Colors.CYAN)}")
-    print(f"总获得专注点: {_colorize(str(points) + ' FP', Colors.GREEN)}")
-    print(f"推迟任务次数: {_colorize(postponed, Colors.YELLOW)}")
+    lines = [
+        _colorize(header, Colors.BOLD),
+        "-" * len(header),
+        f"已完成任务数: {_colorize(completed, Colors.CYAN)}",
+        f"总获得专注点: {_colorize(str(points) + ' FP', Colors.GREEN)}",
+        f"推迟任务次数: {_colorize(postponed, Colors.YELLOW)}",
+    ]
+    throughput = summary_data.get('throughput') or {}
+    if throughput.get('tasks_per_hour') is not None:
+        rate = f"{throughput['tasks_per_hour']:.1f}"
+        lines.append(f"每小时完成数: {_colorize(rate, Colors.CYAN)}（{throughput['active_hours']:.1f} 小时内）")
+    if throughput.get('median_seconds_to_done') is not None:
+        lines.append(f"完成用时中位数: {_format_duration(throughput['median_seconds_to_done'])}")
+    latency = throughput.get('postpone_latency') or {}
+    if latency.get('median_seconds') is not None:
+        lines.append(f"推迟前停留中位数: {_format_duration(latency['median_seconds'])}")
     
     if completed > 0:
-        print("\n干得漂亮！明天继续保持专注。")
+        lines.append("\n干得漂亮！明天继续保持专注。")
     else:
-        print("\n今天还没有完成任务，明天开始吧！")
+        lines.append("\n今天还没有完成任务，明天开始吧！")
+    _output(*lines)
         
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes} 分 {seconds} 秒" if minutes else f"{seconds} 秒"
+
+_PERIOD_NAMES = {'day': '日', 'week': '周', 'month': '月'}
+
+def show_report(period: str, report: list):
+    """显示最近若干周期的统计表，以及最近一个周期完成最多的分组。"""
+    name = _PERIOD_NAMES.get(period, period)
+    header = f"{name}度统计"
+    lines = [
+        _colorize(header, Colors.BOLD),
+        "-" * 54,
+        f"{'周期':<10}{'完成':>6}{'专注点':>8}{'推迟率':>8}{'取消率':>8}",
+    ]
+    for row in report:
+        lines.append(f"{row['period']:<12}{row['completed_count']:>8}{row['total_points']:>11}"
+                     f"{row['postpone_rate']:>11.0%}{row['skipped_ratio']:>11.0%}")
+
+    latest = report[-1] if report else None
+    if latest and latest['top_groups']:
+        lines.append(f"\n本{name}完成最多的分组:")
+        for group in latest['top_groups']:
+            label = group['group'] or '(未分组)'
+            lines.append(f"  {label}  {_colorize(group['completed_count'], Colors.CYAN)} 个 / "
+                         f"{_colorize(str(group['total_points']) + ' FP', Colors.GREEN)}")
+    _output(*lines)
+
+def show_import_progress(bytes_read: int, total_bytes: int, task_count: int):
+    """导入规划文件时在同一行刷新进度，读完时换行。非终端时只输出最终结果。"""
+    percent = bytes_read * 100 // total_bytes if total_bytes else 100
+    finished = bytes_read >= total_bytes
+    line = f"导入中 {percent:3d}%  已解析 {task_count} 个任务"
+    if _renderer.interactive:
+        _renderer.stream.write('\r' + line + ('\n' if finished else ''))
+        _renderer.stream.flush()
+        if finished:
+            _renderer.note_lines(1)
+    elif finished:
+        _output(line)
+
+def show_import_errors(errors: list, limit: int = 10):
+    """列出导入时出错的片段（最多 limit 条）。"""
+    lines = [_colorize(f"第 {error['line']} 行: {error['message']}", Colors.YELLOW) for error in errors[:limit]]
+    if len(errors) > limit:
+        lines.append(_colorize(f"……另有 {len(errors) - limit} 个片段出错", Colors.DIM))
+    _output(*lines)
+
+def prompt(text: str) -> str:
+    """读取一行输入。提示和回显出现在当前帧之后，交给渲染器计数。"""
+    answer = input(text)
+    _renderer.note_lines(text.count('\n') + 1)
+    return answer
+
 def show_message(message: str, is_warning: bool = False):
     """显示一条普通消息或警告消息。"""
     color = Colors.YELLOW if is_warning else Colors.GREEN
-    print(_colorize(message, color))
+    _output(_colorize(message, color))
+
+def show_templates(templates: dict):
+    """列出可用的模板及其参数（有默认值的显示为 参数=默认值）。"""
+    lines = [_colorize("可用的模板：", Colors.DIM)]
+    for name, params in sorted(templates.items()):
+        signature = " ".join(param if default is None else f"{param}={default}" for param, default in params.items())
+        lines.append(f"  !{name} {_colorize(signature, Colors.DIM)}" if signature else f"  !{name}")
+    _output(*lines)
 
 def show_overdue_prompt(overdue_tasks: list):
     """显示处理隔夜任务的提示。"""
     clear_screen()
     count = len(overdue_tasks)
-    print(_colorize(f"检测到您昨天有 {count} 个任务未完成：", Colors.YELLOW))
+    lines = [_colorize(f"检测到您昨天有 {count} 个任务未完成：", Colors.YELLOW)]
     for task in overdue_tasks[:5]: # 最多显示5个
-        parent_chain = " > ".join(task['parent_chain'])
-        print(f"  - {parent_chain} > {task['name']}" if parent_chain else f"  - {task['name']}")
+        parent_chain = task.path()
+        lines.append(f"  - {parent_chain} > {task.name}" if parent_chain else f"  - {task.name}")
     if count > 5:
-        print(f"  ...等 {count - 5} 个任务")
+        lines.append(f"  ...等 {count - 5} 个任务")
 
-    print("\n请选择如何处理：")
-    print(f"[{_colorize('1', Colors.CYAN)}] 合并")
-    print(f"[{_colorize('2', Colors.CYAN)}] 抛弃")
-    print(f"[{_colorize('3', Colors.CYAN)}] 取消")
\ No newline at end of file
+    lines += [
+        "\n请选择如何处理：",
+        f"[{_colorize('1', Colors.CYAN)}] 合并",
+        f"[{_colorize('2', Colors.CYAN)}] 抛弃",
+        f"[{_colorize('3', Colors.CYAN)}] 取消",
+    ]
+    _output(*lines)
\ No newline at end of file
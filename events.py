@@ -0,0 +1,194 @@
+# atomize/events.py
+
+import os
+import sys
+import json
+import time
+import random
+
+from journal import SessionState, SessionJournal, apply_record, apply_to_queue, _encode_record, _decode_record
+from model import encode_tasks, decode_tasks
+from scheduler import ReadyQueue, WEIGHTINGS
+
+
+class EventLog:
+    """
+    按天保存的事件流：events/<日期>.jsonl，一行一个事件。
+    - 第一行是 start 事件：当天开始时的完整任务列表和调度方式。
+      当天的会话来自没有事件流的旧版本时，加载会话时补写一条 start 事件，内容为加载时的任务列表和专注点、推迟数。
+    - 之后是 TaskManager 的每一次修改（与会话日志中的记录相同，带序号），包括撤销和重做写入的记录。
+      由某次推送引起的修改还带有推送时使用的随机种子 seed（以及筛选的标签 tag）。
+    - 调度器重建就绪队列（加载会话、合并其他终端的修改）后，下一个事件之前会先写一行 rebuild。
+    会话日志压缩时会被清空，事件流则保留一整天，用 replay() 可以从它精确重现当天的会话和每一次推送。
+    传入 writer（BackgroundWriter）时，事件和会话日志一样交给后台线程写盘。
+    每一项写入都带着自己的日期排队，后台线程不读取 self.date，跨天时也不会写错文件。
+    """
+    def __init__(self, directory: str, writer=None):
+        self.directory = directory
+        self.writer = writer
+        # 本实例最近写入（或确认已有 start 事件）的日期，只在调用方线程中读写
+        self.date = None
+        self._fp = None
+        self._fp_path = None
+        self._rebuilt = False
+
+    def path(self, date: str) -> str:
+        return os.path.join(self.directory, f"{date}.jsonl")
+
+    def start(self, date: str, tasks, weighting: str = None, total_points: int = 0, postponed_today_count: int = 0):
+        """开始新的一天：覆盖当天的事件流，写入初始任务列表。"""
+        self.date = date
+        self._rebuilt = False
+        data = {'op': 'start', 'date': date, 'weighting': weighting}
+        if total_points or postponed_today_count:
+            data.update(total_points=total_points, postponed_today_count=postponed_today_count)
+        data.update(encode_tasks(tasks))
+        self._submit([(date, 'w', json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n')])
+
+    def resume(self, session, weighting: str = None):
+        """加载当天已有的会话后调用：当天还没有事件流时，以加载的状态补写 start 事件。"""
+        date = session.session_date
+        if self.date == date:
+            return
+        try:
+            if os.path.getsize(self.path(date)) > 0:
+                self.date = date
+                return
+        except OSError:
+            pass
+        self.start(date, session.tasks, weighting, session.total_points, session.postponed_today_count)
+
+    def mark_rebuild(self):
+        """就绪队列被整体重建过。推送顺序取决于队列内部的排列，重放时需要在同一位置重建。"""
+        self._rebuilt = True
+
+    def append(self, date: str, record: dict):
+        items = []
+        if self._rebuilt:
+            items.append((date, 'a', '{"op":"rebuild"}\n'))
+            self._rebuilt = False
+        items.append((date, 'a', json.dumps(_encode_record(record), ensure_ascii=False, separators=(',', ':')) + '\n'))
+        self.date = date
+        self._submit(items)
+
+    def _submit(self, items: list):
+        # start 事件也作为普通的一行排队：后台线程按提交顺序写入，不会像会话快照那样丢弃排在前面的行
+        if self.writer is not None:
+            for item in items:
+                self.writer.submit('journal', self, item)
+        else:
+            self._store_lines(items)
+
+    def _open(self, date: str, mode: str):
+        path = self.path(date)
+        if self._fp is None or self._fp_path != path or mode == 'w':
+            self.close()
+            os.makedirs(self.directory, exist_ok=True)
+            self._fp = open(path, mode, encoding='utf-8')
+            self._fp_path = path
+        return self._fp
+
+    def _store_lines(self, items: list):
+        """依次写入 (日期, 打开方式, 内容)：'w' 覆盖当天的事件流，'a' 追加。"""
+        fp = None
+        for date, mode, text in items:
+            fp = self._open(date, mode)
+            fp.write(text)
+        if fp is not None:
+            fp.flush()
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+            self._fp_path = None
+
+
+def read_events(path: str) -> list:
+    """读取事件流；末尾写了一半的行被忽略。"""
+    events = []
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                break
+    return events
+
+
+def _target(record: dict):
+    """记录所针对的任务，也就是引起这次修改的那次推送选中的任务。"""
+    return record.get('id', record.get('after'))
+
+
+def replay(events: list, check_picks: bool = True) -> dict:
+    """
+    从事件流重现一天的会话。返回：
+    - state: 重现出的 SessionState
+    - events: 应用的修改数；picks / mismatches: 带种子的修改数，以及用同一种子重新推送却选出不同任务的次数
+    - seconds: 重放（含就绪队列维护和重新推送）耗时
+    check_picks 为 True 时，每个带种子的修改之前，都用记录的种子在当前就绪队列上重新推送一次。
+    调度器的实现改动后，mismatches 为 0 说明推送顺序与当时完全一致。
+    """
+    if not events or events[0].get('op') != 'start':
+        raise ValueError("事件流缺少 start 事件")
+    start = events[0]
+    weighting = start.get('weighting')
+    state = SessionState(start['date'], decode_tasks(start), start.get('total_points', 0),
+                         start.get('postponed_today_count', 0))
+    started = time.perf_counter()
+    queue = ReadyQueue(state.tasks, weight_fn=WEIGHTINGS[weighting] if weighting else None)
+    applied = picks = mismatches = 0
+    for event in events[1:]:
+        if event['op'] == 'rebuild':
+            queue.rebuild(state.tasks)
+            continue
+        record = _decode_record(event)
+        if check_picks and 'seed' in record:
+            picks += 1
+            picked = queue.pick(random.Random(record['seed']), record.get('tag'))
+            if picked is None or picked.id != _target(record):
+                mismatches += 1
+        apply_record(state, record)
+        apply_to_queue(queue, record, state.tasks)
+        applied += 1
+    return {'state': state, 'events': applied, 'picks': picks, 'mismatches': mismatches,
+            'seconds': time.perf_counter() - started}
+
+
+def main(argv=None):
+    import argparse
+    import core
+
+    arg_parser = argparse.ArgumentParser(description="从事件流重放某一天的会话，检查推送和最终状态是否与当时一致")
+    arg_parser.add_argument('date', nargs='?', help="要重放的日期 (YYYY-MM-DD)，默认为最近的一天")
+    arg_parser.add_argument('--data-dir', default=core.DATA_DIR, help="数据目录（默认为 data/）")
+    args = arg_parser.parse_args(argv)
+
+    directory = os.path.join(args.data_dir, 'events')
+    dates = sorted(name[:-len('.jsonl')] for name in os.listdir(directory) if name.endswith('.jsonl')) \
+        if os.path.isdir(directory) else []
+    date = args.date or (dates[-1] if dates else None)
+    if date not in dates:
+        print(f"没有找到 {date or '任何'} 的事件流", file=sys.stderr)
+        return 1
+    result = replay(read_events(os.path.join(directory, f"{date}.jsonl")))
+    state = result['state']
+    done = sum(1 for task in state.tasks if task.status == 'done')
+    print(f"{date}: 重放 {result['events']} 个事件，用时 {result['seconds'] * 1000:.1f} ms")
+    print(f"  推送: {result['picks']} 次，与记录不一致 {result['mismatches']} 次")
+    print(f"  结果: {len(state.tasks)} 个任务，完成 {done} 个，专注点 {state.total_points}")
+
+    # 当天的会话还在时，与之逐个任务比较
+    session = SessionJournal(os.path.join(args.data_dir, os.path.basename(core.SESSION_FILE))).load()
+    if session is not None and session.session_date == date:
+        same = ([task.to_record() for task in session.tasks] == [task.to_record() for task in state.tasks]
+                and session.total_points == state.total_points)
+        print(f"  与当前会话{'一致' if same else '不一致'}")
+        if not same:
+            return 1
+    return 1 if result['mismatches'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# atomize/graph.py
+
+from collections import deque
+
+
+class DependencyError(ValueError):
+    """任务依赖关系无效：存在环，或者依赖了不存在的任务。"""
+
+
+def analyze(tasks, strict: bool = True):
+    """
+    校验任务依赖图：用 Kahn 算法做一次拓扑排序，O(任务数 + 依赖数)。
+    存在环时抛出 DependencyError；strict 为 True 时，依赖了列表中不存在的任务也会抛出，
+    否则这些依赖视为已满足（与调度器的处理一致）。
+    调度时的前置任务计数由 ReadyQueue 自行增量维护，这里只负责校验。
+    """
+    tasks = list(tasks)
+    by_id = {task.id: task for task in tasks}
+    remaining = {}
+    dependents = {}
+    for task in tasks:
+        remaining[task.id] = len(task.depends_on)
+        for dep in task.depends_on:
+            if dep in by_id:
+                dependents.setdefault(dep, []).append(task.id)
+            elif not strict:
+                remaining[task.id] -= 1
+            else:
+                raise DependencyError(f"任务 “{task.name}” 依赖的任务 {dep} 不存在")
+
+    # 从没有前置任务的任务开始逐个剥离，剥离不掉的任务在环上或依赖环
+    queue = deque(task.id for task in tasks if remaining[task.id] == 0)
+    visited = 0
+    while queue:
+        task_id = queue.popleft()
+        visited += 1
+        for dependent in dependents.get(task_id, ()):
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                queue.append(dependent)
+    if visited < len(tasks):
+        cycle = [by_id[task_id].name for task_id, count in remaining.items() if count]
+        raise DependencyError(f"任务之间存在循环依赖: {', '.join(cycle[:5])}{' 等' if len(cycle) > 5 else ''}")
+
+
+def prune_dangling(tasks, known_ids=()) -> int:
+    """
+    去掉指向列表外任务的依赖（视为已满足），返回被修改的任务数。
+    用于合并隔夜任务：它们的前置任务可能已在昨天完成，不会出现在今天的列表中。
+    """
+    tasks = list(tasks)
+    ids = {task.id for task in tasks}
+    ids.update(known_ids)
+    changed = 0
+    for task in tasks:
+        if any(dep not in ids for dep in task.depends_on):
+            task.depends_on = tuple(dep for dep in task.depends_on if dep in ids)
+            changed += 1
+    return changed
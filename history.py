@@ -0,0 +1,717 @@
+# atomize/history.py
+
+import os
+import io
+import csv
+import sys
+import gzip
+import json
+import shutil
+from datetime import date as _date, datetime, timedelta
+
+from journal import atomic_write_json
+from locking import FileLock
+
+# tags 为空格分隔的标签名（不含 #）；elapsed 为从任务被推送到这次操作的秒数，未知时为空
+# （推送时间即 timestamp - elapsed）
+HISTORY_FIELDS = ['timestamp', 'task_name', 'parent_chain', 'status', 'was_postponed', 'focus_points', 'tags',
+                  'elapsed']
+INDEX_VERSION = 6
+MANIFEST_VERSION = 1
+# 索引中按这些周期维护汇总，键的格式分别为 2024-05-17 / 2024-W20 / 2024-05
+PERIODS = ('day', 'week', 'month')
+
+
+def _new_counts() -> dict:
+    return {'rows': 0, 'done': 0, 'skipped': 0, 'points': 0, 'postponed_rows': 0}
+
+
+def _new_bucket() -> dict:
+    bucket = _new_counts()
+    # groups: {parent_chain: [完成数, 专注点]}；tags: {标签: 与 _new_counts 相同的计数}
+    bucket.update({'groups': {}, 'tags': {}})
+    return bucket
+
+
+def _new_day(offset: int) -> dict:
+    day = _new_bucket()
+    day.update({'offset': offset, 'end': offset, 'postponed': [], 'timing': _new_timing()})
+    return day
+
+
+def _new_timing() -> dict:
+    # first / last: 当天最早的推送、最晚的操作（从零点起的秒数）
+    # done: {parent_chain: [各次完成的用时（秒）]}；postpone: [各次推迟前的停留时间（秒）]
+    return {'first': None, 'last': None, 'done': {}, 'postpone': []}
+
+
+def _new_index(inode=None) -> dict:
+    # 一个月份（分区）的索引。partition: {'size': 已索引的（解压后）字节数, 'inode': 未压缩分区的 inode, 'fieldnames': 表头}
+    # weeks 只含本月的行；跨月的周由相邻两个月的部分合并而成（见 HistoryStore.period_summary）
+    return {'version': INDEX_VERSION, 'partition': {'size': 0, 'inode': inode, 'fieldnames': None},
+            'days': {}, 'weeks': {}, 'month': _new_bucket()}
+
+
+def _new_manifest() -> dict:
+    # partitions: {月份: {'file', 'first', 'last', 'rows', 'bytes', 'compressed'}}
+    return {'version': MANIFEST_VERSION, 'partitions': {}}
+
+
+def _new_partition(month: str, compressed: bool) -> dict:
+    return {'file': f"{month}.csv.gz" if compressed else f"{month}.csv",
+            'first': None, 'last': None, 'rows': 0, 'bytes': 0, 'compressed': compressed}
+
+
+def _month_of(row: dict) -> str:
+    """行所属的分区（月份）。没有时间戳的行归入当前月份。"""
+    timestamp = row.get('timestamp') or ''
+    return timestamp[:7] if len(timestamp) >= 7 else datetime.now().strftime('%Y-%m')
+
+
+def _group_by_month(rows: list) -> list:
+    """按月份把行分组，保持各月内的原有顺序。"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(_month_of(row), []).append(row)
+    return sorted(groups.items())
+
+
+def _note_dates(entry: dict, dates) -> bool:
+    """用新写入行的日期扩展分区的日期范围，范围有变化时返回 True。"""
+    changed = False
+    for date in dates:
+        if not date:
+            continue
+        if entry['first'] is None or date < entry['first']:
+            entry['first'] = date
+            changed = True
+        if entry['last'] is None or date > entry['last']:
+            entry['last'] = date
+            changed = True
+    return changed
+
+
+def _encode_row(values) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue().encode('utf-8')
+
+
+def _open_partition(path: str, compressed: bool, mode: str = 'rb'):
+    return gzip.open(path, mode) if compressed else open(path, mode)
+
+
+def period_key(date: str, period: str) -> str:
+    """把 YYYY-MM-DD 转换为对应周期的键。"""
+    if period == 'day':
+        return date
+    if period == 'month':
+        return date[:7]
+    if period == 'week':
+        year, week, _ = _date(int(date[:4]), int(date[5:7]), int(date[8:10])).isocalendar()
+        return f"{year}-W{week:02d}"
+    raise ValueError(f"未知的统计周期: {period}")
+
+
+# 撤销完成 / 取消 / 推迟时追加的抵消行：状态 -> 被抵消的状态。历史记录只追加，撤销以这样的行表示
+RETRACTIONS = {'undone': 'done', 'unskipped': 'skipped', 'unpostponed': 'postponed'}
+# 只用于计时的状态：推迟不结束任务，不计入完成 / 取消的统计
+TIMING_ONLY_STATUSES = ('postponed',)
+
+
+def _week_months(key: str) -> list:
+    """某一周（2024-W20）的日期所在的月份，跨月的周有两个。"""
+    monday = _date.fromisocalendar(int(key[:4]), int(key[6:]), 1)
+    return sorted({monday.strftime('%Y-%m'), (monday + timedelta(days=6)).strftime('%Y-%m')})
+
+
+def _add_counts(total: dict, counts: dict):
+    for name in _new_counts():
+        total[name] += counts[name]
+
+
+def _merge_bucket(total: dict, bucket: dict):
+    """把 bucket 的计数加到 total 上（分组和标签逐项相加）。"""
+    _add_counts(total, bucket)
+    for chain, (done, points) in bucket['groups'].items():
+        group = total['groups'].setdefault(chain, [0, 0])
+        group[0] += done
+        group[1] += points
+    for tag, counts in bucket['tags'].items():
+        _add_counts(total['tags'].setdefault(tag, _new_counts()), counts)
+
+
+def _count(counts: dict, status: str, points: int, postponed: bool):
+    sign = 1
+    if status in RETRACTIONS:
+        sign, status = -1, RETRACTIONS[status]
+    counts['rows'] += sign
+    if status == 'done':
+        counts['done'] += sign
+        counts['points'] += sign * points
+    elif status == 'skipped':
+        counts['skipped'] += sign
+    if postponed:
+        counts['postponed_rows'] += sign
+
+
+def _count_row(bucket: dict, row: dict, tags: list):
+    status = row.get('status')
+    counted = RETRACTIONS.get(status, status)
+    points = int(row.get('focus_points') or 0) if counted == 'done' else 0
+    postponed = row.get('was_postponed') == 'yes'
+    _count(bucket, status, points, postponed)
+    if counted == 'done':
+        sign = -1 if status in RETRACTIONS else 1
+        chain = row.get('parent_chain') or ''
+        group = bucket['groups'].get(chain)
+        if group is None:
+            group = bucket['groups'][chain] = [0, 0]
+        group[0] += sign
+        group[1] += sign * points
+    for tag in tags:
+        counts = bucket['tags'].get(tag)
+        if counts is None:
+            counts = bucket['tags'][tag] = _new_counts()
+        _count(counts, status, points, postponed)
+
+
+def _seconds_of_day(timestamp: str) -> int:
+    return int(timestamp[11:13]) * 3600 + int(timestamp[14:16]) * 60 + int(timestamp[17:19])
+
+
+def _time_row(timing: dict, row: dict):
+    """把一行的用时计入当天的计时汇总；抵消行移除原来记下的用时。没有 elapsed 的行被忽略。"""
+    elapsed = row.get('elapsed')
+    # 刚写入的行中为整数，从文件读回时为字符串，0 秒也是有效的用时
+    if elapsed is None or elapsed == '':
+        return
+    seconds = int(elapsed)
+    status = row.get('status')
+    counted = RETRACTIONS.get(status, status)
+    if counted == 'done':
+        values = timing['done'].setdefault(row.get('parent_chain') or '', [])
+    elif counted == 'postponed':
+        values = timing['postpone']
+    else:
+        values = None
+    if status in RETRACTIONS:
+        if values and seconds in values:
+            values.remove(seconds)
+        return
+    if values is not None:
+        values.append(seconds)
+    acted = _seconds_of_day(row['timestamp'])
+    if timing['first'] is None or acted - seconds < timing['first']:
+        timing['first'] = acted - seconds
+    if timing['last'] is None or acted > timing['last']:
+        timing['last'] = acted
+
+
+def _index_row(month_index: dict, row: dict, start: int, end: int):
+    """把分区中 [start, end) 处的一行计入该月的索引。"""
+    date = row.get('timestamp', '')[:10]
+    if not date:
+        return
+    day = month_index['days'].get(date)
+    if day is None:
+        day = month_index['days'][date] = _new_day(start)
+        # 新的一天才需要计算周的键
+        day['week'] = period_key(date, 'week')
+        month_index['weeks'].setdefault(day['week'], _new_bucket())
+    day['offset'] = min(day['offset'], start)
+    day['end'] = max(day['end'], end)
+    status = row.get('status')
+    if RETRACTIONS.get(status, status) not in TIMING_ONLY_STATUSES:
+        tags = (row.get('tags') or '').split()
+        _count_row(day, row, tags)
+        _count_row(month_index['weeks'][day['week']], row, tags)
+        _count_row(month_index['month'], row, tags)
+    _time_row(day['timing'], row)
+    key = row.get('task_name', '') + row.get('parent_chain', '')
+    if status == 'unpostponed':
+        if key in day['postponed']:
+            day['postponed'].remove(key)
+    elif row.get('was_postponed') == 'yes' and key not in day['postponed']:
+        day['postponed'].append(key)
+
+
+class HistoryStore:
+    """
+    历史记录的读写入口。历史按月分区存放在 history/ 目录中（history.csv 所在目录下，与其同名）：
+    - 当月的分区为普通的 2024-05.csv，新行追加到这里；进入新的月份后，之前的分区压缩为 2024-04.csv.gz。
+      少数迟到的旧月份的行以新的 gzip 成员追加到对应的压缩分区。
+    - 清单 manifest.json 记录每个分区的文件名、日期范围、行数和（解压后的）字节数。
+      未压缩分区的行数和字节数只在压缩时校正，日期范围在出现新的日期时更新。
+    - 旧版的单个 history.csv 在首次使用时自动拆分为分区（见 split_history），原文件保留为 history.csv.bak。
+    - 索引按月份存放在 history.idx/ 目录中（2024-05.json），与分区一一对应。每个月的索引记录每天的数据在分区中的
+      （解压后的）字节范围，以及每天、每周（只含本月的行）和本月的汇总（完成数、专注点、推迟与取消次数、
+      各分组和各标签的统计），以及每天的计时汇总（见 _time_row），新行追加时增量更新。
+      保存时只重写有变化的月份，通常只有当月，写入量不随历史增长。旧版的单个 history.idx.json 不再使用。
+    - 推迟也写入一行（状态为 postponed），只用于计时和推迟统计，不计入完成 / 取消。
+      索引只是缓存：它记录了自己覆盖到的各分区长度，打开时只需补扫新增的部分，
+      已压缩且没有变化的分区不会被打开；索引缺失时从所有分区一次性建立。
+    - 追加时复用同一个文件句柄。多个进程同时追加时，写入在锁文件 (history.lock) 的保护下进行，
+      表头只会写一次，行也不会交错。
+    - 当月分区缺少新增的列时，首次写入前会重写一次表头，旧行的新列视为空。
+    - 传入 writer（BackgroundWriter）时，追加的行交给后台线程批量写入；查询前会先等待写完。
+    """
+    def __init__(self, history_file: str, writer=None):
+        self.history_file = history_file
+        self.writer = writer
+        self.partition_dir = os.path.splitext(history_file)[0]
+        self.manifest_file = os.path.join(self.partition_dir, 'manifest.json')
+        self.lock = FileLock(os.path.splitext(history_file)[0] + '.lock')
+        self.index_dir = os.path.splitext(history_file)[0] + '.idx'
+        # {月份: 该月的索引（见 _new_index）}；_dirty_months 为需要保存（或删除）的月份
+        self._index = None
+        self._dirty_months = set()
+        self._manifest = None
+        self._manifest_key = None
+        self._manifest_dirty = False
+        self._fieldnames = None
+        self._fp = None
+        self._fp_path = None
+
+    # --- 分区清单 ---
+    def _load_manifest(self) -> dict:
+        """返回最新的分区清单，只有清单文件变化时才重新读取。旧版的单个 history.csv 在这里迁移。"""
+        key = _stat_key(self.manifest_file)
+        if self._manifest is not None and key == self._manifest_key:
+            return self._manifest
+        if key is None:
+            if os.path.isfile(self.history_file):
+                with self.lock:
+                    if not os.path.exists(self.manifest_file) and os.path.isfile(self.history_file):
+                        split_history(self.history_file, lock=self.lock)
+                self._index = None
+                return self._load_manifest()
+            self._manifest = _new_manifest()
+        else:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                self._manifest = json.load(f)
+        self._manifest_key = key
+        return self._manifest
+
+    def _save_manifest(self):
+        os.makedirs(self.partition_dir, exist_ok=True)
+        atomic_write_json(self.manifest_file, self._manifest)
+        self._manifest_key = _stat_key(self.manifest_file)
+        self._manifest_dirty = False
+
+    def _partition_path(self, entry: dict) -> str:
+        return os.path.join(self.partition_dir, entry['file'])
+
+    # --- 写入 ---
+    def append(self, row: dict):
+        if self.writer is not None:
+            self.writer.submit('history', self, dict(row))
+        else:
+            self._store_rows([row])
+
+    def _store_rows(self, rows: list):
+        with self.lock:
+            self._store_rows_locked(rows)
+
+    def _store_rows_locked(self, rows: list):
+        manifest = self._load_manifest()
+        for month, month_rows in _group_by_month(rows):
+            partitions = manifest['partitions']
+            if not partitions or month >= max(partitions):
+                # 新的月份开始后，之前的分区不会再有新的行，压缩归档
+                for other in sorted(partitions):
+                    if other < month and not partitions[other]['compressed']:
+                        self._compress(other)
+                self._append_current(month, month_rows)
+            else:
+                self._append_archived(month, month_rows)
+        if self._manifest_dirty:
+            self._save_manifest()
+
+    def _append_current(self, month: str, rows: list):
+        """追加到当月（未压缩）的分区。"""
+        entry = self._manifest['partitions'].get(month)
+        if entry is None:
+            entry = self._manifest['partitions'][month] = _new_partition(month, compressed=False)
+            os.makedirs(self.partition_dir, exist_ok=True)
+            self._manifest_dirty = True
+        path = self._partition_path(entry)
+        if self._fp is not None and (self._fp_path != path or self._file_replaced()):
+            # 换到了新的分区，或文件被其他进程替换过（例如升级表头），重新打开并重新读取表头
+            self._fp.close()
+            self._fp = None
+            self._fieldnames = None
+        if self._fieldnames is None:
+            self._fieldnames = self._read_fieldnames(path)
+            if self._fieldnames is not None and any(name not in self._fieldnames for name in HISTORY_FIELDS):
+                self._upgrade_header(month, path)
+        if self._fp is None:
+            self._fp = open(path, 'ab')
+            self._fp_path = path
+        header = b''
+        if self._fieldnames is None:
+            self._fieldnames = HISTORY_FIELDS
+            header = _encode_row(self._fieldnames)
+        lines = [_encode_row([row.get(name, '') for name in self._fieldnames]) for row in rows]
+        # 其他进程可能已追加过内容，定位到当前的文件末尾
+        start = self._fp.seek(0, os.SEEK_END)
+        self._fp.write(header + b''.join(lines))
+        self._fp.flush()
+
+        entry['rows'] += len(rows)
+        entry['bytes'] = start + len(header) + sum(map(len, lines))
+        if _note_dates(entry, (row.get('timestamp', '')[:10] for row in rows)):
+            self._manifest_dirty = True
+        self._index_appended(month, rows, lines, start, header, self._fieldnames,
+                             os.fstat(self._fp.fileno()).st_ino)
+
+    def _append_archived(self, month: str, rows: list):
+        """迟到的旧月份的行：以新的 gzip 成员追加到该月的压缩分区（没有时新建）。"""
+        entry = self._manifest['partitions'].get(month)
+        if entry is None:
+            entry = self._manifest['partitions'][month] = _new_partition(month, compressed=True)
+            os.makedirs(self.partition_dir, exist_ok=True)
+        path = self._partition_path(entry)
+        header = b''
+        if entry['bytes']:
+            with _open_partition(path, entry['compressed']) as f:
+                fieldnames = next(csv.reader([f.readline().decode('utf-8')]), HISTORY_FIELDS)
+        else:
+            fieldnames = HISTORY_FIELDS
+            header = _encode_row(fieldnames)
+        lines = [_encode_row([row.get(name, '') for name in fieldnames]) for row in rows]
+        with _open_partition(path, entry['compressed'], 'ab') as f:
+            f.write(header + b''.join(lines))
+        start = entry['bytes']
+        entry['rows'] += len(rows)
+        entry['bytes'] += len(header) + sum(map(len, lines))
+        _note_dates(entry, (row.get('timestamp', '')[:10] for row in rows))
+        self._manifest_dirty = True
+        self._index_appended(month, rows, lines, start, header, fieldnames, None)
+
+    def _index_appended(self, month, rows, lines, start, header, fieldnames, inode):
+        """索引已在内存中且正好覆盖到写入位置时直接更新；否则留给下次加载时补扫。"""
+        if self._index is None:
+            return
+        month_index = self._index.get(month)
+        if month_index is None and start == 0:
+            month_index = self._index[month] = _new_index(inode)
+        if month_index is None or month_index['partition']['size'] != start:
+            return
+        state = month_index['partition']
+        if header:
+            state['fieldnames'] = list(fieldnames)
+        offset = start + len(header)
+        for row, line in zip(rows, lines):
+            _index_row(month_index, row, offset, offset + len(line))
+            offset += len(line)
+        state['size'] = offset
+        self._dirty_months.add(month)
+
+    def _compress(self, month: str):
+        """把已结束月份的分区压缩为 .csv.gz，并在清单中记录其行数、字节数和日期范围。"""
+        entry = self._manifest['partitions'][month]
+        src = self._partition_path(entry)
+        if self._fp_path == src and self._fp is not None:
+            self._fp.close()
+            self._fp = None
+            self._fieldnames = None
+        compressed = _new_partition(month, compressed=True)
+        dst = self._partition_path(compressed)
+        _compress_file(src, dst + '.tmp', compressed)
+        os.replace(dst + '.tmp', dst)
+        self._manifest['partitions'][month] = compressed
+        self._save_manifest()
+        os.remove(src)
+
+    def _file_replaced(self) -> bool:
+        try:
+            return os.stat(self._fp_path).st_ino != os.fstat(self._fp.fileno()).st_ino
+        except OSError:
+            return True
+
+    def _upgrade_header(self, month: str, path: str):
+        """在表头末尾补上缺少的列：写入新表头后原样复制其余内容，再原子替换。该月的索引随之重建。"""
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        fieldnames = self._fieldnames + [name for name in HISTORY_FIELDS if name not in self._fieldnames]
+        tmp_path = path + '.tmp'
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            src.readline()
+            dst.write(_encode_row(fieldnames))
+            shutil.copyfileobj(src, dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp_path, path)
+        self._fieldnames = fieldnames
+        if self._index is not None:
+            self._index.pop(month, None)
+        if os.path.exists(self._index_path(month)):
+            os.remove(self._index_path(month))
+
+    @staticmethod
+    def _read_fieldnames(path: str):
+        if not os.path.isfile(path) or os.path.getsize(path) == 0:
+            return None
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            return next(csv.reader(f), None)
+
+    def flush(self):
+        """等待后台线程写完已提交的行（未启用后台写入时什么也不做）。"""
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        self.flush()
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+        self.save_index()
+        self.lock.close()
+
+    # --- 索引 ---
+    def _index_path(self, month: str) -> str:
+        return os.path.join(self.index_dir, month + '.json')
+
+    def _read_index(self, month: str) -> dict:
+        try:
+            with open(self._index_path(month), 'r', encoding='utf-8') as f:
+                month_index = json.load(f)
+            if month_index.get('version') != INDEX_VERSION:
+                raise ValueError("index version mismatch")
+        except (IOError, ValueError):
+            return None
+        return month_index
+
+    def _load_index(self):
+        self.flush()
+        manifest = self._load_manifest()
+        if self._index is None:
+            self._index = {}
+            legacy_file = os.path.splitext(self.history_file)[0] + '.idx.json'
+            if os.path.exists(legacy_file):
+                os.remove(legacy_file)
+
+        for month in list(self._index):
+            if month not in manifest['partitions']:
+                # 分区已被删除
+                del self._index[month]
+                self._dirty_months.add(month)
+        for month, entry in sorted(manifest['partitions'].items()):
+            if entry['compressed']:
+                size, inode = entry['bytes'], None
+            else:
+                try:
+                    st = os.stat(self._partition_path(entry))
+                    size, inode = st.st_size, st.st_ino
+                except OSError:
+                    size, inode = 0, None
+            month_index = self._index.get(month)
+            if month_index is None:
+                month_index = self._index[month] = self._read_index(month) or _new_index(inode)
+            state = month_index['partition']
+            # 压缩后 inode 为 None，解压后的内容与原文件相同，不算替换
+            if size < state['size'] or (state['inode'] and inode and inode != state['inode']):
+                # 分区被替换或截断过，该月的索引失效，重新建立
+                month_index = self._index[month] = _new_index(inode)
+                state = month_index['partition']
+                self._dirty_months.add(month)
+            if state['inode'] != inode:
+                state['inode'] = inode
+                self._dirty_months.add(month)
+            if size > state['size']:
+                self._catch_up(month, entry, month_index, size)
+        return self._index
+
+    def _catch_up(self, month: str, entry: dict, month_index: dict, size: int):
+        """从索引已覆盖的位置扫描到 size，只处理该分区新增的行。"""
+        state = month_index['partition']
+        offset = state['size']
+        with _open_partition(self._partition_path(entry), entry['compressed']) as f:
+            f.seek(offset)
+            while offset < size:
+                try:
+                    line = f.readline()
+                except EOFError:
+                    # 压缩分区的最后一个成员还没写完
+                    break
+                if not line.endswith(b'\n'):
+                    # 另一个写入者还没写完这一行，下次再处理
+                    break
+                start, offset = offset, offset + len(line)
+                values = next(csv.reader([line.decode('utf-8')]), [])
+                if state['fieldnames'] is None:
+                    state['fieldnames'] = values
+                    continue
+                _index_row(month_index, dict(zip(state['fieldnames'], values)), start, offset)
+        state['size'] = offset
+        self._dirty_months.add(month)
+
+    def save_index(self):
+        """只保存有变化的月份的索引。"""
+        if self._index is None or not self._dirty_months:
+            return
+        # 临时文件名是固定的，多个进程（以及后台写入线程）同时保存时须互斥
+        with self.lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            for month in sorted(self._dirty_months):
+                if month in self._index:
+                    atomic_write_json(self._index_path(month), self._index[month])
+                elif os.path.exists(self._index_path(month)):
+                    os.remove(self._index_path(month))
+            self._dirty_months.clear()
+
+    # --- 查询 ---
+    def partitions(self) -> dict:
+        """当前的分区清单：{月份: {'file', 'first', 'last', 'rows', 'bytes', 'compressed'}}。"""
+        return {month: dict(entry) for month, entry in self._load_manifest()['partitions'].items()}
+
+    def day_summary(self, date: str) -> dict:
+        """返回某一天的汇总，只读索引，不扫描历史文件。"""
+        month_index = self._load_index().get(date[:7])
+        self.save_index()
+        day = month_index and month_index['days'].get(date)
+        return dict(day) if day else _new_day(0)
+
+    def period_summary(self, period: str, key: str, tag: str = None) -> dict:
+        """
+        返回某一天 / 周 / 月的汇总（见 period_key），只读索引。
+        指定 tag 时只统计带有该标签的行（不含 groups 分组统计）。
+        """
+        index = self._load_index()
+        self.save_index()
+        if period == 'week':
+            bucket = _new_bucket()
+            for month in _week_months(key):
+                if key in index.get(month, {}).get('weeks', {}):
+                    _merge_bucket(bucket, index[month]['weeks'][key])
+        elif period == 'month':
+            bucket = index[key]['month'] if key in index else _new_bucket()
+        else:
+            bucket = index.get(key[:7], {}).get('days', {}).get(key) or _new_bucket()
+        if tag is not None:
+            return dict(bucket['tags'].get(tag) or _new_counts())
+        return dict(bucket)
+
+    def read_day(self, date: str) -> list:
+        """读取某一天的全部历史行，只打开该日期所在的分区，并只读取对应的字节范围。"""
+        month_index = self._load_index().get(date[:7])
+        day = month_index and month_index['days'].get(date)
+        entry = self._manifest['partitions'].get(date[:7])
+        if not day or entry is None:
+            return []
+        with _open_partition(self._partition_path(entry), entry['compressed']) as f:
+            f.seek(day['offset'])
+            text = f.read(day['end'] - day['offset']).decode('utf-8')
+        reader = csv.DictReader(io.StringIO(text, newline=''), fieldnames=month_index['partition']['fieldnames'])
+        return [row for row in reader if row['timestamp'].startswith(date)]
+
+
+def _stat_key(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _compress_file(src: str, dst: str, entry: dict):
+    """把未压缩的分区写成 gzip 文件，同时统计行数、字节数和日期范围（写入 entry）。不完整的末行被丢弃。"""
+    with open(src, 'rb') as f, open(dst, 'wb') as raw:
+        with gzip.GzipFile(filename='', mode='wb', fileobj=raw) as gz:
+            header = f.readline()
+            if header.endswith(b'\n'):
+                gz.write(header)
+                entry['bytes'] = len(header)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                gz.write(line)
+                entry['rows'] += 1
+                entry['bytes'] += len(line)
+                _note_dates(entry, (line[:10].decode('utf-8', 'replace'),))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def split_history(history_file: str, keep: bool = True, lock: FileLock = None) -> dict:
+    """
+    把旧版的单个 history.csv 按月拆分为分区（一次性迁移）。
+    流式读取，每行只写入它所属月份的分区；当前月份之前的分区写完后压缩。
+    已有分区时，行会追加到对应的分区中。keep 为 True 时原文件保留为 .bak，否则删除。
+    返回 {月份: 行数}。
+    """
+    if lock is None:
+        lock = FileLock(os.path.splitext(history_file)[0] + '.lock')
+    store = HistoryStore(history_file)
+    store.lock = lock
+    counts = {}
+    with lock:
+        manifest = store._load_manifest() if os.path.exists(store.manifest_file) else _new_manifest()
+        store._manifest = manifest
+        os.makedirs(store.partition_dir, exist_ok=True)
+        current_month = datetime.now().strftime('%Y-%m')
+        with open(history_file, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            fieldnames = next(reader, None) or HISTORY_FIELDS
+            fieldnames = fieldnames + [name for name in HISTORY_FIELDS if name not in fieldnames]
+            batch = []
+            for values in reader:
+                if not values:
+                    continue
+                row = dict(zip(fieldnames, values))
+                if batch and _month_of(row) != _month_of(batch[-1]):
+                    _split_batch(store, batch, counts)
+                    batch = []
+                batch.append(row)
+            if batch:
+                _split_batch(store, batch, counts)
+        for month, entry in sorted(manifest['partitions'].items()):
+            if month < current_month and not entry['compressed']:
+                store._compress(month)
+        store._save_manifest()
+        if store._fp is not None:
+            store._fp.close()
+        if keep:
+            os.replace(history_file, history_file + '.bak')
+        else:
+            os.remove(history_file)
+        shutil.rmtree(store.index_dir, ignore_errors=True)
+    return counts
+
+
+def _split_batch(store: HistoryStore, rows: list, counts: dict):
+    """拆分时写入同一个月份的连续若干行：先写成未压缩的分区，全部写完后再统一压缩。"""
+    month = _month_of(rows[0])
+    entry = store._manifest['partitions'].get(month)
+    if entry is not None and entry['compressed']:
+        store._append_archived(month, rows)
+    else:
+        store._append_current(month, rows)
+    counts[month] = counts.get(month, 0) + len(rows)
+
+
+def main(argv=None):
+    import argparse
+    arg_parser = argparse.ArgumentParser(description="把旧版的单个 history.csv 按月拆分为分区")
+    arg_parser.add_argument('history_file', nargs='?',
+                            help="要拆分的历史文件（默认为 data/history.csv）")
+    arg_parser.add_argument('--delete', action='store_true', help="拆分后删除原文件，而不是保留为 .bak")
+    args = arg_parser.parse_args(argv)
+    history_file = args.history_file
+    if history_file is None:
+        import core
+        history_file = core.HISTORY_FILE
+    if not os.path.isfile(history_file):
+        print(f"找不到历史文件: {history_file}", file=sys.stderr)
+        return 1
+    counts = split_history(history_file, keep=not args.delete)
+    for month, rows in sorted(counts.items()):
+        print(f"{month}: {rows} 行")
+    print(f"共 {sum(counts.values())} 行，已拆分到 {os.path.splitext(history_file)[0]}{os.sep}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
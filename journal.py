@@ -0,0 +1,401 @@
+# atomize/journal.py
+
+import os
+import json
+
+from store import TaskStore
+from locking import FileLock
+from model import Task, encode_tasks, decode_tasks
+
+# 日志超过该字节数且大于快照本身时，触发一次压缩（重写快照、清空日志）
+COMPACT_MIN_BYTES = 64 * 1024
+
+
+def atomic_write_json(path: str, data) -> int:
+    """先写临时文件再原子替换，写入中途崩溃也不会破坏原文件。返回写入的字节数。"""
+    tmp_path = path + '.tmp'
+    payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(payload)
+
+
+class SessionState:
+    """从快照和日志恢复出的会话状态，字段与 TaskManager 同名。"""
+    def __init__(self, date=None, tasks=(), total_points=0, postponed_today_count=0):
+        # tasks 为 Task 对象序列
+        self.session_date = date
+        self.tasks = TaskStore(tasks)
+        self.total_points = total_points
+        self.postponed_today_count = postponed_today_count
+
+
+def apply_record(session, record: dict):
+    """
+    把一条日志记录应用到会话上（TaskManager 或 SessionState）。
+    TaskManager 的修改操作和启动时的日志回放都走这里，保证两者结果一致。
+    reopen / unpostpone / remove / unsplit 是撤销时写入的逆操作（见 invert_record）。
+    """
+    op = record['op']
+    tasks = session.tasks
+    if op == 'add':
+        tasks.insert_after(record['after'], [record['task']])
+        return
+    if op == 'unsplit':
+        ids = [task_id for task_id in record['ids'] if task_id in tasks]
+        if not ids:
+            return
+        tasks.replace(ids[0], [record['task']])
+        for task_id in ids[1:]:
+            tasks.remove(task_id)
+        for task_id, depends_on in record.get('dependents', ()):
+            dependent = tasks.get(task_id)
+            if dependent is not None:
+                dependent.depends_on = tuple(depends_on)
+        return
+    task = tasks.get(record['id'])
+    if task is None:
+        return
+    if op == 'done':
+        task.status = 'done'
+        session.total_points += record['points']
+    elif op == 'skip':
+        task.status = 'skipped'
+    elif op == 'postpone':
+        task.postponed_count += 1
+        session.postponed_today_count += 1
+        tasks.move_to_end(task.id)
+    elif op == 'edit':
+        task.name = record['name']
+    elif op == 'split':
+        tasks.replace(task.id, record['tasks'])
+        _repoint(tasks, record.get('dependents', ()), task.id, record.get('exits', ()))
+    elif op == 'reopen':
+        task.status = 'pending'
+        session.total_points -= record['points']
+    elif op == 'unpostpone':
+        task.postponed_count -= 1
+        session.postponed_today_count -= 1
+        if record['after'] is None or record['after'] in tasks:
+            tasks.move_after(task.id, record['after'])
+    elif op == 'remove':
+        tasks.remove(task.id)
+
+
+def apply_to_queue(queue, record: dict, tasks):
+    """apply_record 之后调用，把同一条记录同步到就绪队列（scheduler.ReadyQueue）上。"""
+    op = record['op']
+    if op == 'add':
+        queue.add(record['task'])
+    elif op in ('done', 'skip'):
+        queue.finish(record['id'])
+    elif op in ('postpone', 'unpostpone'):
+        task = tasks.get(record['id'])
+        if task is not None:
+            queue.reweight(task)
+    elif op == 'reopen':
+        task = tasks.get(record['id'])
+        if task is not None:
+            queue.reopen(task)
+    elif op == 'remove':
+        queue.remove(record['id'])
+    elif op == 'split':
+        queue.remove(record['id'])
+        for task in record['tasks']:
+            queue.add(task)
+        if 'dependents' in record:
+            queue.repoint(record['dependents'], (record['id'],), record.get('exits', ()))
+    elif op == 'unsplit':
+        for task_id in record['ids']:
+            queue.remove(task_id)
+        queue.add(record['task'])
+        if 'dependents' in record:
+            queue.repoint([task_id for task_id, _ in record['dependents']], record.get('exits', ()),
+                          (record['task'].id,))
+
+
+def _repoint(tasks, dependent_ids, old_id: str, new_ids):
+    """把依赖被拆分任务的各个任务改为依赖拆分片段的出口任务（去重），只涉及这些后继任务。"""
+    for dependent_id in dependent_ids:
+        dependent = tasks.get(dependent_id)
+        if dependent is None or old_id not in dependent.depends_on:
+            continue
+        depends_on = []
+        for dep in dependent.depends_on:
+            for new_dep in (new_ids if dep == old_id else (dep,)):
+                if new_dep not in depends_on:
+                    depends_on.append(new_dep)
+        dependent.depends_on = tuple(depends_on)
+
+
+def invert_record(session, record: dict) -> dict:
+    """
+    在应用 record 之前调用，返回能撤销它的逆操作记录。
+    逆操作只携带撤销所需的最少信息（原名称、原位置、被拆分的任务等），应用它的代价与原操作相同。
+    """
+    op = record['op']
+    if op == 'add':
+        return {'op': 'remove', 'id': record['task'].id}
+    if op == 'split':
+        # 同时记下后继任务原来的依赖，撤销时原样恢复
+        dependents = [[task_id, list(session.tasks.get(task_id).depends_on)]
+                      for task_id in record.get('dependents', ()) if task_id in session.tasks]
+        return {'op': 'unsplit', 'ids': [t.id for t in record['tasks']], 'task': session.tasks.get(record['id']),
+                'exits': list(record.get('exits', ())), 'dependents': dependents}
+    if op == 'done':
+        return {'op': 'reopen', 'id': record['id'], 'points': record['points'], 'status': 'done'}
+    if op == 'skip':
+        return {'op': 'reopen', 'id': record['id'], 'points': 0, 'status': 'skipped'}
+    if op == 'postpone':
+        return {'op': 'unpostpone', 'id': record['id'], 'after': session.tasks.previous(record['id'])}
+    if op == 'edit':
+        return {'op': 'edit', 'id': record['id'], 'name': session.tasks.get(record['id']).name}
+    raise ValueError(f"无法撤销的操作: {op}")
+
+
+def can_apply(session, record: dict) -> bool:
+    """合并其他进程的修改后，检查这条记录是否仍然有效（目标任务仍存在，且尚未被完成或取消）。"""
+    op = record['op']
+    if op == 'add':
+        return session.tasks.get(record['after']) is not None and record['task'].id not in session.tasks
+    if op == 'unsplit':
+        return all(_is_pending(session.tasks.get(task_id)) for task_id in record['ids'])
+    task = session.tasks.get(record['id'])
+    if task is None:
+        return False
+    if op == 'edit':
+        return True
+    if op == 'postpone' and task.postponed_count > 0:
+        return False
+    if op == 'reopen':
+        return task.status != 'pending'
+    if op == 'unpostpone':
+        return task.status == 'pending' and task.postponed_count > 0
+    return task.status == 'pending'
+
+
+def _is_pending(task) -> bool:
+    return task is not None and task.status == 'pending'
+
+
+def _encode_record(record: dict) -> dict:
+    """把记录中的 Task 对象转换为紧凑的行格式，便于写入日志。"""
+    encoded = dict(record)
+    if 'task' in record:
+        encoded['task'] = record['task'].to_record()
+    if 'tasks' in record:
+        encoded['tasks'] = [t.to_record() for t in record['tasks']]
+    return encoded
+
+
+def _decode_record(record: dict) -> dict:
+    if 'task' in record:
+        record['task'] = Task.from_record(record['task'])
+    if 'tasks' in record:
+        record['tasks'] = [Task.from_record(row) for row in record['tasks']]
+    return record
+
+
+class SessionJournal:
+    """
+    会话持久化：快照文件 + 追加式日志。
+    - 每次修改只向日志追加一行 JSON 记录。
+    - 日志超过阈值时压缩：原子地重写快照，再清空日志。
+    - 启动时读取快照并回放日志。记录带有递增序号，快照记录已包含的序号，
+      因此在“快照已替换、日志未清空”时崩溃也不会重复回放。
+    - 多个进程共用同一目录时，读写都在锁文件 (session.lock) 的保护下进行，且只持有一次读写的时间。
+      序号同时充当版本号：写入前先用 refresh() 合并其他进程追加的记录（快照被替换时整体重新加载），
+      再以最新序号追加，因此不会互相覆盖。
+    - 传入 writer（BackgroundWriter）时，记录和快照在调用线程中序列化后交给后台线程写盘。
+      这种模式假定只有当前进程使用该目录，不做上述合并。
+    """
+    def __init__(self, session_file: str, writer=None):
+        self.session_file = session_file
+        self.writer = writer
+        self.journal_file = os.path.splitext(session_file)[0] + '.journal'
+        self.lock = FileLock(os.path.splitext(session_file)[0] + '.lock')
+        self._snapshot_stat = None
+        self._seq = 0
+        self._journal_bytes = 0
+        self._snapshot_bytes = 0
+        self._fp = None
+
+    @staticmethod
+    def _stat(path: str):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def load(self):
+        """读取快照并回放日志，返回 SessionState；没有可用快照时返回 None。"""
+        self.flush()
+        with self.lock:
+            return self._load()
+
+    def _load(self):
+        self.close()
+        self._seq = 0
+        self._journal_bytes = 0
+        self._snapshot_stat = self._stat(self.session_file)
+        if self._snapshot_stat is None:
+            return None
+        try:
+            with open(self.session_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._snapshot_bytes = self._snapshot_stat[2]
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            # 快照损坏时保留原文件以便手工恢复，而不是直接删除
+            os.replace(self.session_file, self.session_file + '.corrupt')
+            self._snapshot_stat = None
+            return None
+        except IOError:
+            return None
+
+        state = SessionState(
+            data.get('date'),
+            decode_tasks(data),
+            data.get('total_points', 0),
+            data.get('postponed_today_count', 0),
+        )
+        self._seq = data.get('seq', 0)
+        self._replay(state)
+        return state
+
+    def _replay(self, session) -> int:
+        """应用日志中 self._journal_bytes 之后、序号比当前新的记录，返回应用的条数。"""
+        applied = 0
+        for record in self._read_journal(self._journal_bytes):
+            if record['seq'] <= self._seq:
+                continue
+            apply_record(session, _decode_record(record))
+            self._seq = record['seq']
+            applied += 1
+        return applied
+
+    def changed(self) -> bool:
+        """不加锁地检查快照和日志是否被其他进程改动过（只做两次 stat）。"""
+        if self.writer is not None:
+            return False
+        journal = self._stat(self.journal_file)
+        return (self._stat(self.session_file) != self._snapshot_stat
+                or (journal[2] if journal else 0) != self._journal_bytes)
+
+    def refresh(self, session) -> bool:
+        """
+        在持有锁时调用：把其他进程写入的修改合并到 session（TaskManager）中，返回是否有变化。
+        - 快照未变、日志变长：只回放新增的记录。
+        - 快照被替换或删除（压缩、开始新的一天、当天任务全部结束）：整体重新加载。
+        """
+        if not self.changed():
+            return False
+        journal_size = self._stat(self.journal_file)
+        if self._stat(self.session_file) == self._snapshot_stat and journal_size and journal_size[2] > self._journal_bytes:
+            return self._replay(session) > 0
+
+        state = self._load()
+        if state is None or state.session_date != session.session_date:
+            state = SessionState(session.session_date)
+        session.tasks = state.tasks
+        session.total_points = state.total_points
+        session.postponed_today_count = state.postponed_today_count
+        return True
+
+    def _read_journal(self, start: int = 0) -> list:
+        if not os.path.exists(self.journal_file):
+            return []
+        records = []
+        valid_bytes = start
+        with open(self.journal_file, 'rb') as f:
+            f.seek(start)
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("incomplete record")
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                valid_bytes += len(line)
+        # 截掉崩溃时写了一半的末尾记录，后续追加才不会和它粘在一起
+        if valid_bytes != os.path.getsize(self.journal_file):
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(valid_bytes)
+        self._journal_bytes = valid_bytes
+        return records
+
+    def append(self, record: dict, session):
+        """追加一条记录，必要时顺带压缩。多进程共用目录时应在持有锁、并已 refresh() 之后调用。"""
+        self._seq += 1
+        record['seq'] = self._seq
+        line = json.dumps(_encode_record(record), ensure_ascii=False, separators=(',', ':')) + '\n'
+        if self.writer is not None:
+            self.writer.submit('journal', self, line)
+        else:
+            with self.lock:
+                self._store_lines([line])
+        self._journal_bytes += len(line.encode('utf-8'))
+        if self._journal_bytes > max(COMPACT_MIN_BYTES, self._snapshot_bytes):
+            self.write_snapshot(session)
+
+    def write_snapshot(self, session):
+        """原子地写入完整快照并清空日志。"""
+        data = {
+            'date': session.session_date,
+            'total_points': session.total_points,
+            'postponed_today_count': session.postponed_today_count,
+            'seq': self._seq,
+        }
+        # 紧凑格式：分组表 + 任务行，分组路径只写一次
+        data.update(encode_tasks(session.tasks))
+        self._journal_bytes = 0
+        if self.writer is not None:
+            self.writer.submit('snapshot', self, data)
+        else:
+            with self.lock:
+                self._store_snapshot(data)
+
+    def _store_lines(self, lines: list):
+        # 以二进制追加：日志的长度和回放位置都按字节计算，文本模式在 Windows 上会把 '\n' 写成 '\r\n'
+        if self._fp is None:
+            self._fp = open(self.journal_file, 'ab')
+        self._fp.write(''.join(lines).encode('utf-8'))
+        self._fp.flush()
+
+    def _store_snapshot(self, data: dict):
+        self._snapshot_bytes = atomic_write_json(self.session_file, data)
+        self._snapshot_stat = self._stat(self.session_file)
+        # 可能在后台线程中执行，只关闭日志文件，不动锁文件（其他线程可能正持有锁并在等待写完）
+        self._close_file()
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+    def flush(self):
+        """等待后台线程写完已提交的记录（未启用后台写入时什么也不做）。"""
+        if self.writer is not None:
+            self.writer.flush()
+
+    def _close_file(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def close(self):
+        self._close_file()
+        self.lock.close()
+
+    def clear(self):
+        """删除快照和日志。"""
+        self.flush()
+        self.close()
+        with self.lock:
+            for path in (self.session_file, self.journal_file):
+                if os.path.exists(path):
+                    os.remove(path)
+        self._snapshot_stat = None
+        self._seq = 0
+        self._journal_bytes = 0
+        self._snapshot_bytes = 0
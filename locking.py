@@ -0,0 +1,74 @@
+# atomize/locking.py
+
+import os
+import time
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """
+    基于锁文件的进程间互斥锁（POSIX 上用 flock，Windows 上用 msvcrt.locking）。
+    - 可重入：同一线程可以嵌套使用 with，只有最外层会真正加锁；不同线程之间同样互斥。
+    - 只在一次读写期间持有，进程退出时操作系统会自动释放，不会留下死锁。
+    - 锁文件的描述符在首次加锁时打开并一直复用，每次加锁只需一次系统调用。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+        self._thread_lock = threading.RLock()
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                _lock(self._fd)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        try:
+            if self._depth == 0:
+                _unlock(self._fd)
+        finally:
+            self._thread_lock.release()
+
+    def close(self):
+        """关闭锁文件的描述符（不能在持有锁时调用）。"""
+        with self._thread_lock:
+            if self._fd is not None and self._depth == 0:
+                os.close(self._fd)
+                self._fd = None
+
+
+if fcntl is not None:
+    def _lock(fd):
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _unlock(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+else:
+    def _lock(fd):
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK 重试约 10 秒后仍失败会抛出异常，继续等待
+                time.sleep(0.05)
+
+    def _unlock(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
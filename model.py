@@ -0,0 +1,223 @@
+# atomize/model.py
+
+import os
+import weakref
+import threading
+
+# 分组树和标签表在进程内共享（多用户服务的工作线程会同时创建），创建新节点时加锁
+_intern_lock = threading.Lock()
+
+
+class Group:
+    """
+    分组（父任务）节点。同一父节点下的同名分组只会创建一次，
+    所有任务共享这棵树，而不是各自保存一份 parent_chain 列表。
+    父节点只弱引用子分组：没有任务（或更深的分组）再使用某个分组时，它会随之释放，
+    因此常驻进程（多用户服务）中的分组树不会随着加载过的会话不断增长。
+    """
+    __slots__ = ('name', 'parent', 'depth', '_children', '_chain', '__weakref__')
+
+    def __init__(self, name: str = None, parent: 'Group' = None):
+        self.name = name
+        self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        # 多数分组没有子分组，第一次创建子分组时才建立弱引用字典
+        self._children = None
+        self._chain = None
+
+    def child(self, name: str) -> 'Group':
+        """返回（必要时创建）名为 name 的子分组。"""
+        node = self._children.get(name) if self._children is not None else None
+        if node is None:
+            with _intern_lock:
+                if self._children is None:
+                    self._children = weakref.WeakValueDictionary()
+                node = self._children.get(name)
+                if node is None:
+                    node = self._children[name] = Group(name, self)
+        return node
+
+    def descend(self, names) -> 'Group':
+        node = self
+        for name in names:
+            node = node.child(name)
+        return node
+
+    @property
+    def chain(self) -> tuple:
+        """从最外层到本分组的名称序列，首次访问时计算并缓存。"""
+        if self._chain is None:
+            names = []
+            node = self
+            while node.parent is not None:
+                names.append(node.name)
+                node = node.parent
+            self._chain = tuple(reversed(names))
+        return self._chain
+
+    def path(self, separator: str = " > ") -> str:
+        return separator.join(self.chain)
+
+
+# 进程内共享的分组树根节点（相当于 parent_chain 为空）
+ROOT = Group()
+
+NO_TAGS = frozenset()
+# 标签组合 -> 指向它自身的弱引用。与分组树一样只保留弱引用，没有任务再使用的标签组合会被释放
+_tag_sets = weakref.WeakKeyDictionary()
+
+
+def intern_tags(tags) -> frozenset:
+    """把标签序列转换为 frozenset，相同的标签组合共享同一个对象。"""
+    if not tags:
+        return NO_TAGS
+    tags = frozenset(tags)
+    ref = _tag_sets.get(tags)
+    if ref is None:
+        with _intern_lock:
+            ref = _tag_sets.setdefault(tags, weakref.ref(tags))
+    # 共享的对象恰好在两步之间被释放时，直接使用新建的这一份
+    return ref() or tags
+
+
+def as_dependencies(value) -> tuple:
+    """把磁盘 / 字典中的依赖字段统一为 id 元组：旧格式为单个 id 或 None，多个前置任务时为列表。"""
+    if not value:
+        return ()
+    if isinstance(value, str):
+        return (value,)
+    return tuple(value)
+
+
+def _dependency_field(depends_on: tuple):
+    """as_dependencies 的逆操作：没有依赖时为 None，只有一个时为 id 本身，保持与旧格式兼容。"""
+    if not depends_on:
+        return None
+    if len(depends_on) == 1:
+        return depends_on[0]
+    return list(depends_on)
+
+
+def new_task_id() -> str:
+    """生成 16 位十六进制的随机 id（64 位熵），比 uuid4 字符串短一半以上。"""
+    return os.urandom(8).hex()
+
+
+def new_task_ids(count: int) -> list:
+    """一次生成 count 个与 new_task_id 相同格式的 id，只读取一次随机数。"""
+    raw = os.urandom(8 * count).hex()
+    return [raw[i:i + 16] for i in range(0, 16 * count, 16)]
+
+
+class Task:
+    """使用 __slots__ 的紧凑任务对象，parent_chain 由共享的分组节点按需生成。"""
+    __slots__ = ('id', 'name', 'group', 'status', 'postponed_count', 'depends_on', 'is_late_task', 'weight', 'tags')
+
+    def __init__(self, name: str, group: Group = ROOT, depends_on=(), is_late_task: bool = False,
+                 task_id: str = None, status: str = 'pending', postponed_count: int = 0, weight: float = 1,
+                 tags=NO_TAGS):
+        self.id = task_id or new_task_id()
+        self.name = name
+        self.group = group
+        self.status = status
+        self.postponed_count = postponed_count
+        # 前置任务 id 的元组，全部完成（或取消）后本任务才可执行
+        self.depends_on = as_dependencies(depends_on)
+        self.is_late_task = is_late_task
+        # 加权调度时使用的基础权重，来自规划中的 “任务名*权重”
+        self.weight = weight
+        # 任务自身的标签加上所有外层分组的标签，来自规划中的 “#标签”
+        self.tags = intern_tags(tags)
+
+    @property
+    def parent_chain(self) -> tuple:
+        return self.group.chain
+
+    def path(self, separator: str = " > ") -> str:
+        """父任务路径，例如 “西方社会学 > 齐美尔”。"""
+        return self.group.path(separator)
+
+    def to_dict(self) -> dict:
+        """展开为旧版的字典格式，用于对外输出。"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'parent_chain': list(self.parent_chain),
+            'status': self.status,
+            'postponed_count': self.postponed_count,
+            'depends_on': _dependency_field(self.depends_on),
+            'is_late_task': self.is_late_task,
+            'weight': self.weight,
+            'tags': sorted(self.tags),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Task':
+        """从旧版的字典格式读取任务。"""
+        return cls(
+            data['name'], ROOT.descend(data.get('parent_chain', ())),
+            depends_on=data.get('depends_on'),
+            is_late_task=data.get('is_late_task', False),
+            task_id=data['id'],
+            status=data.get('status', 'pending'),
+            postponed_count=data.get('postponed_count', 0),
+            weight=data.get('weight', 1),
+            tags=data.get('tags', ()),
+        )
+
+    def to_record(self) -> list:
+        """单个任务的紧凑行格式（带完整分组路径），用于日志记录。"""
+        return [self.id, self.name, list(self.parent_chain), self.status,
+                self.postponed_count, _dependency_field(self.depends_on), int(self.is_late_task), self.weight,
+                sorted(self.tags)]
+
+    @classmethod
+    def from_record(cls, row: list) -> 'Task':
+        task_id, name, chain, status, postponed_count, depends_on, is_late, *rest = row
+        return cls(name, ROOT.descend(chain), depends_on, bool(is_late), task_id, status, postponed_count, *rest)
+
+
+def encode_tasks(tasks) -> dict:
+    """
+    把任务序列编码为紧凑的磁盘格式：
+    - groups: [[父分组下标或 -1, 名称], ...]，每个分组只出现一次，父分组总在子分组之前。
+    - tasks:  [[id, 名称, 分组下标, 状态, 推迟次数, 依赖, 是否末尾任务, 权重, 标签], ...]
+      依赖为 None、单个 id 或 id 列表（见 _dependency_field）。
+    """
+    group_index = {ROOT: -1}
+    groups = []
+
+    def index_of(group):
+        missing = []
+        node = group
+        while node not in group_index:
+            missing.append(node)
+            node = node.parent
+        for node in reversed(missing):
+            group_index[node] = len(groups)
+            groups.append([group_index[node.parent], node.name])
+        return group_index[group]
+
+    rows = [
+        [t.id, t.name, index_of(t.group), t.status, t.postponed_count, _dependency_field(t.depends_on),
+         int(t.is_late_task), t.weight, sorted(t.tags)]
+        for t in tasks
+    ]
+    return {'groups': groups, 'tasks': rows}
+
+
+def decode_tasks(data: dict) -> list:
+    """encode_tasks 的逆操作。也兼容旧版每个任务一个字典的格式。"""
+    rows = data.get('tasks', [])
+    if 'groups' not in data:
+        return [Task.from_dict(t) for t in rows]
+    nodes = []
+    for parent_index, name in data['groups']:
+        parent = ROOT if parent_index < 0 else nodes[parent_index]
+        nodes.append(parent.child(name))
+    # 较早的快照没有权重列和标签列，*rest 为空时使用默认值
+    return [
+        Task(name, ROOT if group_index < 0 else nodes[group_index], depends_on, bool(is_late),
+             task_id, status, postponed_count, *rest)
+        for task_id, name, group_index, status, postponed_count, depends_on, is_late, *rest in rows
+    ]
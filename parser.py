@@ -1,132 +1,264 @@
-import uuid
+import re
+from itertools import chain
 
-def _create_atomic_task(name: str, parent_chain: list, depends_on: str = None, is_late_task: bool = False) -> dict:
+import graph
+from model import ROOT, NO_TAGS, Group, Task, intern_tags, as_dependencies
+
+# 词法单元：分隔符 , - ( ) [ ] 各自成为一个单元，其余连续字符组成任务名
+_TOKEN_RE = re.compile(r'[,\-()\[\]]|[^,\-()\[\]]+')
+_CLOSING = {'(': ')', '[': ']'}
+# 任务名或分组名末尾的 “*权重”，例如 “写论文*3”
+_WEIGHT_RE = re.compile(r'^(.*?)\s*\*\s*(\d+(?:\.\d*)?)$', re.S)
+# 任务名或分组名末尾的 “#标签”，可以有多个，例如 “写论文 #深度 #上午” 或 “写论文 #深度#上午”。
+# 标签前须有空白（或位于名称开头），因此 “学C#”、“C#编程” 中的 # 仍是名称的一部分
+_TAG_RE = re.compile(r'(?:^|\s+)((?:#[^\s#*]+)+)$')
+_AFTER_GROUP_MESSAGE = "分组的右括号之后只能是 ','、'-' 或外层右括号"
+
+
+class ParseError(ValueError):
+    """带有出错位置的解析错误。position 为 0 起的字符下标，token 为出错的词法单元。"""
+    def __init__(self, message: str, position: int = None, token: str = None):
+        if position is not None:
+            message = f"第 {position + 1} 列 '{token}': {message}"
+        super().__init__(message)
+        self.position = position
+        self.token = token
+
+
+def _create_atomic_task(name: str, group: Group = ROOT, depends_on=(), is_late_task: bool = False,
+                        weight: float = 1, tags=NO_TAGS) -> Task:
     """创建一个标准的原子任务对象。"""
-    return {
-        'id': str(uuid.uuid4()),
-        'name': name.strip(),
-        'parent_chain': parent_chain,
-        'status': 'pending',
-        'postponed_count': 0,
-        'depends_on': depends_on,
-        'is_late_task': is_late_task
-    }
-
-def _split_at_level(text: str, delimiter: str = ',') -> list:
-    """在顶层按分隔符切分字符串，忽略括号/中括号内的分隔符。"""
-    parts = []
-    balance = 0
-    start = 0
-    for i, char in enumerate(text):
-        if char in '([':
-            balance += 1
-        elif char in ')]':
-            balance -= 1
-        elif char == delimiter and balance == 0:
-            parts.append(text[start:i])
-            start = i + 1
-    parts.append(text[start:])
-    
-    if balance != 0:
-        raise ValueError("括号或中括号不匹配")
-        
-    return [p.strip() for p in parts if p.strip()]
-
-def _parse_segment(segment: str, parent_chain: list, is_late_task: bool = False) -> list:
+    return Task(name.strip(), group, depends_on=depends_on, is_late_task=is_late_task, weight=weight, tags=tags)
+
+
+def _split_annotations(name: str, position: int):
     """
-    递归地解析一个任务片段。
-    【核心修改】此函数现在能正确处理 "A-B-C(...)" 这样的链式父任务结构。
+    拆出名称末尾的 “*权重” 和 “#标签”（顺序不限），返回 (名称, 权重, 标签列表)。
+    没有权重时权重为 1。紧跟在其他字符之后的 #（例如 “C#”）不是标签。
     """
-    segment = segment.strip()
-    
-    try:
-        first_bracket_index = min(
-            segment.index(c) for c in '([' if c in segment
+    weight = None
+    tags = []
+    while True:
+        match = _TAG_RE.search(name)
+        if match:
+            tags.extend(match.group(1).split('#')[1:])
+            name = name[:match.start()]
+            continue
+        match = _WEIGHT_RE.match(name) if weight is None else None
+        if match:
+            weight = float(match.group(2))
+            if weight <= 0:
+                raise ParseError("权重必须大于 0", position, name)
+            name = match.group(1)
+            continue
+        break
+    name = name.strip()
+    if not name:
+        raise ParseError("缺少任务名", position, '#' + tags[-1] if tags else '*')
+    if weight is None:
+        return name, 1, tags
+    return name, int(weight) if weight.is_integer() else weight, tags
+
+
+class _Frame:
+    """一层括号（或最外层）的解析状态。"""
+    __slots__ = ('group', 'is_late', 'weight', 'tags', 'entry_deps', 'closing', 'open_pos', 'open_token',
+                 'normal_tasks', 'late_tasks', 'sinks', 'late_sinks', 'seg_started', 'seg_late', 'seg_prev',
+                 'seg_after_group', 'item_name', 'item_pos')
+
+    def __init__(self, group, is_late, entry_deps=(), closing=None, open_pos=None, open_token=None, weight=1,
+                 tags=NO_TAGS):
+        self.group = group
+        self.is_late = is_late
+        # 分组上的权重会乘到其下所有任务上，标签会被其下所有任务继承
+        self.weight = weight
+        self.tags = tags
+        # 本层每条串行链的第一个任务所依赖的任务（最近一层父任务的前置任务）
+        self.entry_deps = entry_deps
+        self.closing = closing
+        self.open_pos = open_pos
+        self.open_token = open_token
+        self.normal_tasks = []
+        self.late_tasks = []
+        # 各条串行链的最后一个任务（常规 / 末尾），分组后接 - 时，后续任务依赖它们全部完成
+        self.sinks = []
+        self.late_sinks = []
+        self.reset_segment()
+
+    def reset_segment(self):
+        self.seg_started = False
+        self.seg_late = False
+        self.seg_prev = ()
+        self.seg_after_group = False
+        self.item_name = ''
+        self.item_pos = None
+
+    def segment_tasks(self) -> list:
+        return self.late_tasks if self.seg_late else self.normal_tasks
+
+    def end_segment(self):
+        """当前串行链结束，记录它的最后一个任务。"""
+        if self.seg_prev:
+            (self.late_sinks if self.seg_late else self.sinks).extend(self.seg_prev)
+
+    def exits(self) -> tuple:
+        """
+        分组之后的任务所依赖的任务：各条串行链的最后一个任务。
+        常规分组中的末尾任务不算在内（它们要等所有常规任务完成后才执行，依赖它们会造成死锁）；
+        分组内没有可依赖的任务时，沿用分组自身的前置任务。
+        """
+        exits = self.sinks + self.late_sinks if self.is_late else self.sinks
+        return tuple(exits) or self.entry_deps
+
+    def flatten(self) -> list:
+        """
+        按“常规在前、末尾在后”的顺序展开本层及所有子分组的任务。
+        子分组在关闭时只以引用的形式放入父层，这里统一展开一次，避免逐层复制列表。
+        """
+        result = []
+        stack = [chain(self.normal_tasks, self.late_tasks)]
+        while stack:
+            for item in stack[-1]:
+                if isinstance(item, _Frame):
+                    stack.append(chain(item.normal_tasks, item.late_tasks))
+                    break
+                result.append(item)
+            else:
+                stack.pop()
+        return result
+
+    def flush_item(self):
+        """把当前累积的任务名生成为串行链中的下一个原子任务。"""
+        name = self.item_name.strip()
+        self.item_name = ''
+        if not name:
+            return
+        name, weight, tags = _split_annotations(name, self.item_pos)
+        task = _create_atomic_task(
+            name, self.group,
+            depends_on=self.seg_prev or self.entry_deps,
+            is_late_task=self.seg_late or self.is_late,
+            weight=weight * self.weight,
+            tags=self.tags.union(tags) if tags else self.tags,
         )
-    except ValueError:
-        first_bracket_index = -1
-
-    if first_bracket_index == -1:
-        task_names = [name.strip() for name in segment.split('-') if name.strip()]
-        if not task_names:
-            return []
-
-        created_tasks = []
-        previous_task_id = None
-        for name in task_names:
-            new_task = _create_atomic_task(name, parent_chain, depends_on=previous_task_id, is_late_task=is_late_task)
-            created_tasks.append(new_task)
-            previous_task_id = new_task['id']
-        return created_tasks
-
-    else:
-        prefix = segment[:first_bracket_index]
-        last_hyphen_index = prefix.rfind('-')
-        
-        all_tasks = []
-        last_precusor_id = None
-
-        if last_hyphen_index != -1:
-            precursor_names_str = prefix[:last_hyphen_index]
-            # 解析 "A-B" 部分
-            precursor_tasks = _parse_segment(precursor_names_str, parent_chain, is_late_task)
-            if precursor_tasks:
-                all_tasks.extend(precursor_tasks)
-                last_precusor_id = precursor_tasks[-1]['id']
-
-        parent_name_start = last_hyphen_index + 1
-        task_name = prefix[parent_name_start:].strip()
-
-        if not task_name:
-            raise ValueError(f"无效的父任务格式，括号前缺少任务名: '{segment}'")
-        
-        last_bracket_index = len(segment) - 1
-        if (segment[first_bracket_index] == '(' and segment[-1] != ')') or \
-           (segment[first_bracket_index] == '[' and segment[-1] != ']'):
-            raise ValueError(f"任务 '{task_name}' 的括号不匹配")
-        
-        children_string = segment[first_bracket_index + 1 : last_bracket_index]
-        new_parent_chain = parent_chain + [task_name]
-        
-        children_tasks = _parse_children(children_string, new_parent_chain, parent_is_late=is_late_task)
-        
-        if children_tasks:
-            for child in children_tasks:
-                if child['depends_on'] is None and last_precusor_id is not None:
-                    child['depends_on'] = last_precusor_id
-            all_tasks.extend(children_tasks)
-        
-        return all_tasks
-
-
-def _parse_children(children_string: str, parent_chain: list, parent_is_late: bool = False) -> list:
-    """解析一个父任务的子任务字符串。"""
-    if not children_string:
-        return []
+        self.segment_tasks().append(task)
+        self.seg_prev = (task.id,)
+
+
+def _parse_children(children_string: str, parent_group: Group = ROOT, parent_is_late: bool = False,
+                    parent_tags=NO_TAGS) -> list:
+    """单遍解析一个（父任务的）子任务字符串，返回展开后的任务列表（语法见 _parse_frame）。"""
+    return _parse_frame(children_string, parent_group, parent_is_late, parent_tags).flatten()
 
-    child_segments = _split_at_level(children_string, ',')
-    
-    all_tasks = []
-    late_tasks_segments = []
 
-    for seg in child_segments:
-        if seg.startswith('-'):
-            late_tasks_segments.append(seg[1:])
+def parse_fragment(children_string: str, parent_group: Group = ROOT, parent_is_late: bool = False,
+                   parent_tags=NO_TAGS, entry_deps=()) -> tuple:
+    """
+    把子任务字符串解析为可以原地替换某个任务的片段（用于拆分），返回 (任务列表, 出口任务 id 元组)。
+    - 每条串行链的第一个任务依赖 entry_deps（被替换任务的前置任务）。
+    - 出口与分组之后的汇合规则相同：各条串行链的最后一个任务（常规任务被拆分时不含末尾任务）；
+      片段中没有这样的任务时为 entry_deps。原先依赖被替换任务的任务改为依赖这些出口。
+    """
+    frame = _parse_frame(children_string, parent_group, parent_is_late, parent_tags, as_dependencies(entry_deps))
+    return frame.flatten(), frame.exits()
+
+
+def _parse_frame(children_string: str, parent_group: Group = ROOT, parent_is_late: bool = False,
+                 parent_tags=NO_TAGS, entry_deps=()) -> _Frame:
+    """
+    单遍解析一个（父任务的）子任务字符串，返回最外层的 _Frame。
+    使用显式栈代替递归，每个字符只被扫描一次，深层嵌套也不会触发递归深度限制。
+    - 顶层用 , 分隔出并行片段，以 - 开头的片段为末尾任务，排在常规任务之后。
+    - 片段内用 - 串联，任务名后可以跟 (...) 或 [...] 表示分组。
+    - 分组的子任务依赖于分组之前的串行前置任务；分组之后可以用 - 继续串联，
+      例如 “X(a,b)-c” 中 c 依赖 a 和 b 全部完成（汇合）。
+    - 任务名和分组名末尾可以带 “*权重” 和 “ #标签”（# 前须有空白），分组的权重和标签作用于其下所有任务。
+    """
+    stack = [_Frame(parent_group, parent_is_late, entry_deps, tags=intern_tags(parent_tags))]
+
+    for match in _TOKEN_RE.finditer(children_string):
+        token = match.group()
+        pos = match.start()
+        frame = stack[-1]
+
+        if token == ',':
+            frame.flush_item()
+            frame.end_segment()
+            frame.reset_segment()
+
+        elif token == '-':
+            if frame.seg_after_group:
+                # 分组之后继续串联：下一个任务依赖分组的出口任务（已记录在 seg_prev 中）
+                frame.seg_after_group = False
+            elif not frame.seg_started:
+                # 片段开头的 - 表示末尾任务
+                frame.seg_started = True
+                frame.seg_late = True
+            else:
+                frame.flush_item()
+
+        elif token in _CLOSING:
+            if frame.seg_after_group:
+                raise ParseError(_AFTER_GROUP_MESSAGE, pos, token)
+            name = frame.item_name.strip()
+            if not name:
+                raise ParseError("无效的父任务格式，括号前缺少任务名", pos, token)
+            name, weight, tags = _split_annotations(name, frame.item_pos)
+            frame.item_name = ''
+            stack.append(_Frame(
+                frame.group.child(name),
+                frame.seg_late or frame.is_late,
+                frame.seg_prev or frame.entry_deps,
+                _CLOSING[token], pos, token,
+                weight * frame.weight,
+                intern_tags(frame.tags.union(tags)) if tags else frame.tags,
+            ))
+
+        elif token in ')]':
+            if frame.closing is None:
+                raise ParseError("多余的右括号", pos, token)
+            if token != frame.closing:
+                raise ParseError(
+                    f"括号不匹配，第 {frame.open_pos + 1} 列的 '{frame.open_token}' 应以 '{frame.closing}' 结束",
+                    pos, token)
+            frame.flush_item()
+            frame.end_segment()
+            stack.pop()
+            parent = stack[-1]
+            parent.segment_tasks().append(frame)
+            parent.seg_prev = frame.exits()
+            parent.seg_after_group = True
+
         else:
-            all_tasks.extend(_parse_segment(seg, parent_chain, is_late_task=parent_is_late))
-    
-    for seg in late_tasks_segments:
-        all_tasks.extend(_parse_segment(seg, parent_chain, is_late_task=True))
-        
-    return all_tasks
+            if frame.seg_after_group:
+                if token.strip():
+                    raise ParseError(_AFTER_GROUP_MESSAGE, pos + len(token) - len(token.lstrip()), token.strip())
+                continue
+            if token.strip():
+                frame.seg_started = True
+                if frame.item_pos is None or not frame.item_name.strip():
+                    frame.item_pos = pos + len(token) - len(token.lstrip())
+            frame.item_name += token
+
+    frame = stack[-1]
+    if frame.closing is not None:
+        raise ParseError(f"括号未闭合，缺少 '{frame.closing}'", frame.open_pos, frame.open_token)
+    frame.flush_item()
+    frame.end_segment()
+    return frame
+
 
 def parse_task_string(input_string: str) -> list:
     """解析用户输入的完整任务规划字符串。"""
     if not input_string.strip():
         return []
     try:
-        return _parse_children(input_string, [])
-    except ValueError as e:
-        raise ValueError(f"任务字符串格式错误: {e}")
+        tasks = _parse_children(input_string, ROOT)
+    except ParseError as e:
+        e.args = (f"任务字符串格式错误: {e}",)
+        raise
     except Exception:
-        raise ValueError("发生了未知的解析错误，请检查语法。")
\ No newline at end of file
+        raise ValueError("发生了未知的解析错误，请检查语法。")
+    # 解析结果总是无环的，这里再校验一次，防止语法扩展时引入循环或悬空依赖
+    graph.analyze(tasks)
+    return tasks
@@ -0,0 +1,108 @@
+# atomize/planfile.py
+
+import os
+import re
+import codecs
+
+import parser
+
+# 每次从文件读取的字节数
+CHUNK_BYTES = 64 * 1024
+# 单个顶层片段的最大字符数，超出时报告错误并跳过该片段，保证内存占用有上限
+MAX_SEGMENT_CHARS = 1024 * 1024
+# 每解析这么多个片段报告一次进度
+PROGRESS_EVERY = 1000
+
+# 需要逐个处理的字符，其余文本整段复制
+_SPECIAL_RE = re.compile(r'[,\n()\[\]]')
+_OPENING = '(['
+_CLOSING = ')]'
+
+
+def iter_segments(stream, chunk_bytes: int = CHUNK_BYTES, max_segment_chars: int = MAX_SEGMENT_CHARS):
+    """
+    从二进制流中逐块读取规划，按顶层的 ',' 和换行切分出片段，逐个产出 (片段, 行号, 已读取字节数)。
+    - 换行总是结束当前片段，括号不能跨行：某一行的括号未闭合时，只影响这一行。
+    - 任何时候只保存当前片段，超过 max_segment_chars 的片段产出 None 表示过长，并跳到下一行继续。
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    buffer = []
+    size = 0
+    depth = 0
+    line = 1
+    bytes_read = 0
+    overflow = False
+
+    while True:
+        chunk = stream.read(chunk_bytes)
+        bytes_read += len(chunk)
+        text = decoder.decode(chunk, final=not chunk)
+        start = 0
+        for match in _SPECIAL_RE.finditer(text):
+            char = match.group()
+            index = match.start()
+            if overflow:
+                if char == '\n':
+                    yield None, line, bytes_read
+                    overflow = False
+                    start = index + 1
+                    line += 1
+                continue
+            if char in _OPENING:
+                depth += 1
+            elif char in _CLOSING:
+                # 多余的右括号留给解析器报告
+                depth = max(depth - 1, 0)
+            elif depth == 0 or char == '\n':
+                buffer.append(text[start:index])
+                yield ''.join(buffer), line, bytes_read
+                buffer = []
+                size = 0
+                start = index + 1
+                if char == '\n':
+                    depth = 0
+                    line += 1
+            if size + index - start >= max_segment_chars:
+                buffer = []
+                size = 0
+                overflow = True
+        if not overflow:
+            buffer.append(text[start:])
+            size += len(text) - start
+            if size >= max_segment_chars:
+                buffer = []
+                size = 0
+                overflow = True
+        if not chunk:
+            break
+
+    if overflow:
+        yield None, line, bytes_read
+    elif buffer:
+        yield ''.join(buffer), line, bytes_read
+
+
+def parse_plan_file(path: str, progress=None, chunk_bytes: int = CHUNK_BYTES,
+                    max_segment_chars: int = MAX_SEGMENT_CHARS) -> tuple:
+    """
+    流式解析规划文件，返回 (任务列表, 错误列表)。
+    每个顶层片段单独解析，出错的片段记入错误列表（{'line', 'message'}）并跳过，不影响其余片段。
+    progress(已读取字节数, 文件总字节数, 已解析任务数) 会被定期调用，结束时再调用一次。
+    """
+    total_bytes = os.path.getsize(path)
+    tasks = []
+    errors = []
+    with open(path, 'rb') as f:
+        for count, (segment, line, bytes_read) in enumerate(iter_segments(f, chunk_bytes, max_segment_chars), 1):
+            if segment is None:
+                errors.append({'line': line, 'message': f"片段超过 {max_segment_chars} 个字符，已跳过"})
+            elif segment.strip():
+                try:
+                    tasks.extend(parser.parse_task_string(segment))
+                except ValueError as e:
+                    errors.append({'line': line, 'message': str(e)})
+            if progress is not None and count % PROGRESS_EVERY == 0:
+                progress(bytes_read, total_bytes, len(tasks))
+    if progress is not None:
+        progress(total_bytes, total_bytes, len(tasks))
+    return tasks, errors
@@ -0,0 +1,150 @@
+# atomize/profiling.py
+
+import os
+import sys
+import time
+import atexit
+import functools
+
+# 延迟直方图的分桶：以微秒为单位按 2 的幂划分，最后一个桶收纳所有更慢的调用
+_BUCKET_COUNT = 24
+
+# 需要计时的私有方法（公开方法会被自动包含）
+_PRIVATE_METHODS = ['_save_session', '_save_to_history', '_load_session', '_commit']
+
+
+class _Stats:
+    __slots__ = ('count', 'total', 'min', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.buckets = [0] * _BUCKET_COUNT
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        micros = int(seconds * 1e6)
+        self.buckets[min(micros.bit_length(), _BUCKET_COUNT - 1)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """根据直方图估算分位数（取所在桶的上界），单位为秒。"""
+        target = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return min((1 << index) / 1e6, self.max)
+        return self.max
+
+
+_stats = {}
+_profiler = None
+_enabled = False
+
+
+def _timed(name: str, func):
+    stats = _stats.setdefault(name, _Stats())
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.add(time.perf_counter() - started)
+
+    wrapper.__wrapped_by_profiling__ = True
+    return wrapper
+
+
+def _instrument_class(cls, prefix: str, extra_methods=()):
+    for name, attr in list(vars(cls).items()):
+        if not callable(attr) or getattr(attr, '__wrapped_by_profiling__', False):
+            continue
+        if name.startswith('_') and name not in extra_methods:
+            continue
+        setattr(cls, name, _timed(f"{prefix}.{name}", attr))
+
+
+def _instrument_module(module, names):
+    for name in names:
+        func = getattr(module, name)
+        if not getattr(func, '__wrapped_by_profiling__', False):
+            setattr(module, name, _timed(f"{module.__name__}.{name}", func))
+
+
+def enable(cprofile_path: str = None, report_stream=None):
+    """
+    开启性能统计。未调用时不会安装任何包装函数，因此没有额外开销。
+    - 为 TaskManager 的公开方法、几个持久化方法、parser.parse_task_string
+      和 display 的各个 show_* 函数计时，进程退出时输出报告。
+    - 指定 cprofile_path 时，同时用 cProfile 记录整个运行过程并保存到该文件。
+    """
+    global _enabled, _profiler
+    if _enabled:
+        return
+    _enabled = True
+
+    import core
+    import parser
+    import display
+    _instrument_class(core.TaskManager, 'TaskManager', _PRIVATE_METHODS)
+    _instrument_module(parser, ['parse_task_string'])
+    _instrument_module(display, [name for name in vars(display) if name.startswith('show_')] + ['clear_screen'])
+
+    if cprofile_path:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+    atexit.register(_finish, cprofile_path, report_stream)
+
+
+def enable_from_env():
+    """ATOMIZE_PROFILE=1 开启计时；ATOMIZE_CPROFILE=<文件> 额外开启 cProfile。"""
+    cprofile_path = os.environ.get('ATOMIZE_CPROFILE')
+    if os.environ.get('ATOMIZE_PROFILE') or cprofile_path:
+        enable(cprofile_path)
+
+
+def _finish(cprofile_path, report_stream):
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(cprofile_path)
+    write_report(report_stream or sys.stderr)
+    if cprofile_path:
+        print(f"cProfile 数据已保存到 {cprofile_path}", file=report_stream or sys.stderr)
+
+
+def report() -> dict:
+    """以字典形式返回当前的统计数据（时间单位为秒）。"""
+    return {
+        name: {
+            'count': s.count,
+            'total': s.total,
+            'mean': s.total / s.count,
+            'min': s.min,
+            'p50': s.percentile(0.5),
+            'p95': s.percentile(0.95),
+            'max': s.max,
+            'histogram_us': {f"<{1 << i}": c for i, c in enumerate(s.buckets) if c},
+        }
+        for name, s in _stats.items() if s.count
+    }
+
+
+def write_report(stream=sys.stderr):
+    """按总耗时从高到低输出统计表。耗时均包含被调用的子操作。"""
+    rows = sorted(report().items(), key=lambda item: item[1]['total'], reverse=True)
+    if not rows:
+        return
+    stream.write(f"\n{'operation':<38}{'calls':>8}{'total_ms':>12}{'mean_ms':>10}{'p50_ms':>10}{'p95_ms':>10}{'max_ms':>10}\n")
+    for name, r in rows:
+        stream.write(f"{name:<38}{r['count']:>8}{r['total'] * 1000:>12.2f}{r['mean'] * 1000:>10.3f}"
+                     f"{r['p50'] * 1000:>10.3f}{r['p95'] * 1000:>10.3f}{r['max'] * 1000:>10.3f}\n")
+    stream.flush()
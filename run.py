@@ -3,17 +3,36 @@
 import sys
 import os
 import time
+import random
+import argparse
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 import core
+import graph
 import display
 
+# 查看界面中的按键 -> 统计周期（None 为今日总结）
+REPORT_VIEWS = {'d': None, 'w': 'week', 'm': 'month'}
+
 def run_execution_loop(task_manager: core.TaskManager):
     """执行任务的核心循环，支持动态修改。"""
+    tag_filter = None
     while True:
-        task_info = task_manager.get_next_task_info()
+        try:
+            task_info = task_manager.get_next_task_info(tag_filter)
+        except graph.DependencyError as e:
+            # 会话中的依赖关系已损坏（例如合并或手工修改后出现了环），无法继续推送
+            display.show_message(f"无法继续执行: {e}", is_warning=True)
+            time.sleep(3)
+            break
         
+        if not task_info and tag_filter and task_manager.has_active_session():
+            display.show_message(f"暂时没有可执行的 #{tag_filter} 任务，已取消筛选。", is_warning=True)
+            time.sleep(1.5)
+            tag_filter = None
+            continue
+
         if not task_info:
             display.show_message("所有任务已完成！")
             time.sleep(2)
@@ -22,37 +41,50 @@ def run_execution_loop(task_manager: core.TaskManager):
         current_task = task_info['task']
         
         display.clear_screen()
-        display.show_current_task(current_task, task_info['current_num'], task_info['total_num'])
+        display.show_current_task(current_task, task_info['current_num'], task_info['total_num'], tag_filter)
         
-        action = input("\n> ").lower().strip()
+        action = display.prompt("\n> ").lower().strip()
 
         result = None
         # --- 基本操作 ---
         if action in ['d', 'done']:
-            result = task_manager.complete_task(current_task['id'])
+            result = task_manager.complete_task(current_task.id)
         elif action in ['p', 'postpone']:
-            result = task_manager.postpone_task(current_task['id'])
+            result = task_manager.postpone_task(current_task.id)
         elif action in ['q', 'quit']:
+            # 返回主菜单前确保后台写入已全部落盘
+            task_manager.flush()
             display.show_message("任务执行已暂停，返回主菜单。")
             time.sleep(1.5)
             break
         
         # --- 动态管理操作 ---
         elif action in ['s', 'split']:
-            sub_task_str = input("拆分子任务 (使用 , - () [] 规划): ")
-            result = task_manager.split_task(current_task['id'], sub_task_str)
+            sub_task_str = display.prompt("拆分子任务 (使用 , - () [] 规划): ")
+            result = task_manager.split_task(current_task.id, sub_task_str)
         elif action in ['a', 'add']:
-            new_task_name = input("输入要添加的新任务名: ")
-            result = task_manager.add_task_after(current_task['id'], new_task_name)
+            new_task_name = display.prompt("输入要添加的新任务名: ")
+            result = task_manager.add_task_after(current_task.id, new_task_name)
         elif action in ['e', 'edit']:
-            new_name = input(f"修改任务名 [{current_task['name']}]: ")
-            result = task_manager.edit_task(current_task['id'], new_name or current_task['name'])
+            new_name = display.prompt(f"修改任务名 [{current_task.name}]: ")
+            result = task_manager.edit_task(current_task.id, new_name or current_task.name)
+        
+        elif action in ['u', 'undo']:
+            result = task_manager.undo()
+        elif action in ['r', 'redo']:
+            result = task_manager.redo()
+        
+        elif action in ['f', 'filter']:
+            tags = task_manager.get_tags()
+            hint = " ".join(f"#{tag}({count})" for tag, count in sorted(tags.items()))
+            tag_filter = display.prompt(f"只推送带有该标签的任务，留空取消筛选 {hint}: ").strip().lstrip('#') or None
+            continue
         
         # --- 【指令优化】将 'x' (skip) 更改为 'c' (cancel) ---
         elif action in ['c', 'cancel']:
-            confirm = input(f"确认取消任务 “{current_task['name']}” 吗? 此操作无法撤销 [y/N]: ").lower()
+            confirm = display.prompt(f"确认取消任务 “{current_task.name}” 吗? (之后可按 u 撤销) [y/N]: ").lower()
             if confirm == 'y':
-                result = task_manager.cancel_task(current_task['id']) # 调用新方法
+                result = task_manager.cancel_task(current_task.id) # 调用新方法
             else:
                 display.show_message("操作已取消。", is_warning=True)
                 time.sleep(1.5)
@@ -67,29 +99,82 @@ def run_execution_loop(task_manager: core.TaskManager):
             time.sleep(1.5 if result.get('success', False) else 2.5)
 
 
-def main():
-    """程序主函数，负责显示主菜单和分派用户操作。"""
+_task_manager = None
+
+def get_task_manager() -> core.TaskManager:
+    """
+    进程内共享的 TaskManager：第一次需要时才加载会话，之后各个菜单项都复用它。
+    再次使用前只按会话文件的 mtime / 大小判断是否有其他终端的修改，没有变化时不读文件。
+    """
+    global _task_manager
+    if _task_manager is None:
+        _task_manager = core.TaskManager()
+    else:
+        _task_manager.revalidate()
+    return _task_manager
+
+
+def import_plan_file(task_manager: core.TaskManager, path: str, tasks_to_merge: list = None) -> bool:
+    """从规划文件开始新的一天，显示进度和出错的片段。成功时返回 True。"""
+    result = task_manager.import_plan(path, tasks_to_merge, progress=display.show_import_progress)
+    if result['errors']:
+        display.show_import_errors(result['errors'])
+    display.show_message(result['message'], is_warning=not result['success'] or bool(result['errors']))
+    time.sleep(3 if result['errors'] else 1)
+    return result['success']
+
+
+def main(import_path: str = None):
+    """程序主函数，负责显示主菜单和分派用户操作。import_path 为启动时要导入的规划文件。"""
+    if import_path:
+        task_manager = get_task_manager()
+        if import_plan_file(task_manager, import_path):
+            run_execution_loop(task_manager)
     while True:
         display.clear_screen()
         display.show_main_menu()
-        choice = input("> ").strip()
+        choice = display.prompt("> ").strip()
         
         if choice == '1':
-            task_manager = core.TaskManager()
+            task_manager = get_task_manager()
             overdue_tasks = task_manager.get_overdue_tasks()
             overdue_choice = '2'
 
             if overdue_tasks:
                 display.show_overdue_prompt(overdue_tasks)
-                overdue_choice = input("> ").strip()
+                overdue_choice = display.prompt("> ").strip()
 
             if overdue_choice == '3':
                 continue
             
             display.clear_screen()
-            display.show_message("规划或覆盖今天的任务规划")
-            task_string = input("> ")
+            display.show_message("规划或覆盖今天的任务规划（输入 @文件路径 从规划文件导入，!模板名 参数=值 使用模板）")
+            available_templates = task_manager.get_templates()
+            if available_templates:
+                display.show_templates(available_templates)
+            task_string = display.prompt("> ")
+
+            if task_string.strip().startswith('@'):
+                tasks_to_merge = overdue_tasks if overdue_choice == '1' else []
+                if import_plan_file(task_manager, task_string.strip()[1:].strip(), tasks_to_merge):
+                    run_execution_loop(task_manager)
+                continue
             
+            if task_string.strip().startswith('!'):
+                import templates
+                tasks_to_merge = overdue_tasks if overdue_choice == '1' else []
+                try:
+                    name, params = templates.parse_invocation(task_string.strip()[1:])
+                    task_manager.start_from_template(name, params, tasks_to_merge)
+                except ValueError as e:
+                    display.show_message(f"模板使用失败: {e}", is_warning=True)
+                    time.sleep(3)
+                    continue
+                display.show_message(f"已使用模板 {name}，即将开始执行...")
+                time.sleep(1)
+                run_execution_loop(task_manager)
+                continue
+
             if not task_string and overdue_choice != '1':
                 display.show_message("输入不能为空，请重新开始。", is_warning=True)
                 time.sleep(2)
@@ -106,7 +191,7 @@ def main():
                 time.sleep(3)
 
         elif choice == '2':
-            task_manager = core.TaskManager()
+            task_manager = get_task_manager()
             if task_manager.has_active_session():
                 display.show_message("加载任务成功，继续执行...")
                 time.sleep(1)
@@ -116,18 +201,56 @@ def main():
                 time.sleep(2)
 
         elif choice == '3':
-            task_manager = core.TaskManager()
-            summary = task_manager.get_summary()
-            display.clear_screen()
-            display.show_summary(summary)
-            input("\n按回车键返回主菜单...")
+            task_manager = get_task_manager()
+            view = 'd'
+            while view in REPORT_VIEWS:
+                display.clear_screen()
+                if REPORT_VIEWS[view]:
+                    display.show_report(REPORT_VIEWS[view], task_manager.get_report(REPORT_VIEWS[view]))
+                else:
+                    display.show_summary(task_manager.get_summary())
+                view = display.prompt("\n[d] 今日  [w] 周报  [m] 月报  按回车键返回主菜单: ").strip().lower()
 
         elif choice == '4':
+            if _task_manager is not None:
+                _task_manager.flush()
             display.show_message("保持专注，下次再见。")
             break
         else:
             display.show_message("无效输入，请输入 1-4 之间的数字。", is_warning=True)
             time.sleep(1.5)
 
+def parse_args(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Atomize: 专注当下的命令行任务执行器")
+    arg_parser.add_argument('--batch', action='store_true',
+                            help="从标准输入逐行读取命令并执行，不清屏、不等待，每条命令输出一行 JSON")
+    arg_parser.add_argument('--seed', type=int, help="固定随机种子，使任务的推送顺序可复现")
+    arg_parser.add_argument('--profile', action='store_true',
+                            help="统计各项操作的调用次数和耗时，退出时输出报告（也可设置环境变量 ATOMIZE_PROFILE=1）")
+    arg_parser.add_argument('--cprofile', metavar='FILE', help="用 cProfile 记录整个运行过程并保存到 FILE")
+    arg_parser.add_argument('--weighting', choices=sorted(core.WEIGHTINGS),
+                            help="加权调度：dsl 按规划中的 *权重，postponed 偏向推迟过的任务，shallow/deep 偏向浅层/深层任务")
+    arg_parser.add_argument('--import', dest='import_path', metavar='FILE',
+                            help="从规划文件导入今天的任务（流式解析，适用于很大的规划文件），然后开始执行")
+    arg_parser.add_argument('--write-behind', action='store_true',
+                            help="由后台线程写入会话和历史记录，操作后无需等待磁盘；退出时会自动写完")
+    return arg_parser.parse_args(argv)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    if args.profile or args.cprofile:
+        import profiling
+        profiling.enable(args.cprofile)
+    elif os.environ.get('ATOMIZE_PROFILE') or os.environ.get('ATOMIZE_CPROFILE'):
+        import profiling
+        profiling.enable_from_env()
+    if args.seed is not None:
+        random.seed(args.seed)
+    if args.weighting:
+        core.SCHEDULE_WEIGHTING = args.weighting
+    if args.write_behind:
+        core.WRITE_BEHIND = True
+    if args.batch:
+        import batch
+        sys.exit(batch.run_batch(sys.stdin))
+    main(args.import_path)
\ No newline at end of file
@@ -0,0 +1,391 @@
+# atomize/scheduler.py
+
+import random
+
+
+class _RandomPool:
+    """支持 O(1) 添加、删除和随机抽取的集合（列表 + 位置索引）。"""
+    __slots__ = ('_items', '_positions')
+
+    def __init__(self):
+        self._items = []
+        self._positions = {}
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def add(self, key):
+        if key in self._positions:
+            return
+        self._positions[key] = len(self._items)
+        self._items.append(key)
+
+    def discard(self, key):
+        index = self._positions.pop(key, None)
+        if index is None:
+            return
+        last = self._items.pop()
+        # 用末尾元素填补空位，保持列表紧凑
+        if index < len(self._items):
+            self._items[index] = last
+            self._positions[last] = index
+
+    def choice(self, rng=random):
+        return rng.choice(self._items)
+
+    def update(self, key, weight):
+        """均匀抽取时权重无意义，保留接口以便与加权池互换。"""
+
+
+class _WeightedPool:
+    """
+    按权重随机抽取的集合，用树状数组 (Fenwick tree) 维护前缀和：
+    添加、删除、修改权重和抽取都是 O(log n)。
+    删除时用最后一个元素填补空位，数组始终保持紧凑。
+    """
+    __slots__ = ('_items', '_positions', '_weights', '_tree')
+
+    def __init__(self):
+        self._items = []
+        self._positions = {}
+        self._weights = []
+        self._tree = [0.0]  # 1 起下标，_tree[0] 不使用
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._positions
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def _prefix_sum(self, index: int) -> float:
+        total = 0.0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def _add_at(self, index: int, delta: float):
+        index += 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def add(self, key, weight=1):
+        if key in self._positions:
+            self.update(key, weight)
+            return
+        index = len(self._items)
+        self._positions[key] = index
+        self._items.append(key)
+        self._weights.append(weight)
+        # 新节点覆盖区间 (i - lowbit(i), i]，其值可由两个前缀和求出
+        node = index + 1
+        self._tree.append(weight + self._prefix_sum(node - 1) - self._prefix_sum(node - (node & -node)))
+
+    def discard(self, key):
+        index = self._positions.pop(key, None)
+        if index is None:
+            return
+        last_key = self._items.pop()
+        last_weight = self._weights.pop()
+        # 最后一个位置只被它自己的树节点覆盖，直接截掉即可
+        self._tree.pop()
+        if index < len(self._items):
+            self._add_at(index, last_weight - self._weights[index])
+            self._items[index] = last_key
+            self._weights[index] = last_weight
+            self._positions[last_key] = index
+
+    def update(self, key, weight):
+        index = self._positions.get(key)
+        if index is None:
+            return
+        self._add_at(index, weight - self._weights[index])
+        self._weights[index] = weight
+
+    def choice(self, rng=random):
+        total = self._prefix_sum(len(self._items))
+        if total <= 0:
+            return rng.choice(self._items)
+        target = rng.random() * total
+        # 在树上自顶向下查找前缀和首次超过 target 的位置
+        index = 0
+        step = 1 << (len(self._items).bit_length() - 1)
+        while step:
+            next_index = index + step
+            if next_index <= len(self._items) and self._tree[next_index] <= target:
+                index = next_index
+                target -= self._tree[index]
+            step >>= 1
+        return self._items[min(index, len(self._items) - 1)]
+
+
+def _depth(task) -> int:
+    return task.group.depth
+
+
+# 'postponed' 模式下推迟过的任务的权重倍数
+POSTPONED_WEIGHT = 3
+
+# 加权调度的预设权重函数，均以规划中写明的任务权重为基础
+WEIGHTINGS = {
+    # 只使用规划中的 “任务名*权重”
+    'dsl': lambda task: task.weight,
+    # 推迟过的任务更容易被再次选中
+    'postponed': lambda task: task.weight * (POSTPONED_WEIGHT if task.postponed_count > 0 else 1),
+    # 偏向层级较浅的任务
+    'shallow': lambda task: task.weight / (1 + _depth(task)),
+    # 偏向层级较深的任务
+    'deep': lambda task: task.weight * (1 + _depth(task)),
+}
+
+
+class ReadyQueue:
+    """
+    增量维护的“结构化随机”就绪队列。
+    - 依赖索引：前置任务 id -> 依赖它的任务 id，另记每个待办任务还有几个前置任务未完成。
+      任务完成时只把它的后继的计数各减一（每条依赖边 O(1)），减到 0 即进入就绪池；
+      撤销完成（reopen）时反过来各加一，已就绪的后继退出就绪池。
+    - 就绪池按“常规”和“末尾”分开，各自支持 O(1) 随机抽取。
+    - 记录两类待办任务的数量，用于判断当前处于哪个阶段。
+    候选集合与逐个扫描任务列表得到的结果完全一致。
+    传入 weight_fn 时，就绪池改为按权重抽取（仍然先常规、后末尾）。
+    - 标签倒排索引：每个标签各有一组常规 / 末尾就绪池，按标签筛选时直接从中抽取，
+      不需要扫描全部任务。
+    """
+    def __init__(self, tasks=(), weight_fn=None):
+        self._weight_fn = weight_fn
+        self.rebuild(tasks)
+
+    def rebuild(self, tasks):
+        """根据完整的任务列表重建所有索引，O(n)。"""
+        self._pending = {}
+        self._finished = set()
+        self._dependents = {}
+        # 待办任务 id -> 尚未完成的前置任务数
+        self._waiting = {}
+        pool_class = _RandomPool if self._weight_fn is None else _WeightedPool
+        self._pool_class = pool_class
+        self._ready = {False: pool_class(), True: pool_class()}
+        self._pending_counts = {False: 0, True: 0}
+        # 标签 -> {是否末尾: 就绪池}，标签 -> 待办任务数
+        self._tag_ready = {}
+        self._tag_pending = {}
+
+        for task in tasks:
+            if task.status == 'pending':
+                self._add_pending(task)
+            else:
+                self._finished.add(task.id)
+
+        for task in self._pending.values():
+            if self._register_dependencies(task) == 0:
+                self._make_ready(task)
+
+    @staticmethod
+    def _is_late(task) -> bool:
+        return bool(task.is_late_task)
+
+    def _register_dependencies(self, task) -> int:
+        """
+        登记任务的前置任务，返回其中尚未完成的数量。不在列表中的前置任务（例如已被拆分）视为已满足。
+        已完成的前置任务也会登记，这样它被撤销完成、或被拆分后又恢复时，任务能重新等待它。
+        """
+        waiting = 0
+        for dep in task.depends_on:
+            dependents = self._dependents.get(dep)
+            if dependents is None:
+                dependents = self._dependents[dep] = {}
+            elif task.id in dependents:
+                continue
+            dependents[task.id] = None
+            if dep in self._pending:
+                waiting += 1
+        self._waiting[task.id] = waiting
+        return waiting
+
+    def _unregister_dependencies(self, task):
+        for dep in task.depends_on:
+            dependents = self._dependents.get(dep)
+            if dependents is not None:
+                dependents.pop(task.id, None)
+
+    def _add_pending(self, task):
+        self._pending[task.id] = task
+        self._pending_counts[self._is_late(task)] += 1
+        for tag in task.tags:
+            self._tag_pending[tag] = self._tag_pending.get(tag, 0) + 1
+
+    def _drop_pending(self, task_id: str):
+        """把任务移出待办和就绪池，返回任务对象（不在待办中时返回 None）。"""
+        task = self._pending.pop(task_id, None)
+        if task is None:
+            return None
+        del self._waiting[task_id]
+        self._pending_counts[self._is_late(task)] -= 1
+        for tag in task.tags:
+            self._tag_pending[tag] -= 1
+        self._discard_ready(task)
+        return task
+
+    def _discard_ready(self, task):
+        is_late = self._is_late(task)
+        self._ready[is_late].discard(task.id)
+        for tag in task.tags:
+            pools = self._tag_ready.get(tag)
+            if pools is not None:
+                pools[is_late].discard(task.id)
+
+    def _pools_of(self, task):
+        is_late = self._is_late(task)
+        yield self._ready[is_late]
+        for tag in task.tags:
+            pools = self._tag_ready.get(tag)
+            if pools is None:
+                pools = self._tag_ready[tag] = {False: self._pool_class(), True: self._pool_class()}
+            yield pools[is_late]
+
+    def _make_ready(self, task):
+        if self._weight_fn is None:
+            for pool in self._pools_of(task):
+                pool.add(task.id)
+        else:
+            weight = self._weight_fn(task)
+            for pool in self._pools_of(task):
+                pool.add(task.id, weight)
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    @property
+    def finished_count(self) -> int:
+        return len(self._finished)
+
+    def tag_counts(self) -> dict:
+        """各标签下尚未完成的任务数。"""
+        return {tag: count for tag, count in self._tag_pending.items() if count}
+
+    def add(self, task):
+        """登记一个新加入任务列表的任务。"""
+        if task.status != 'pending':
+            self._finished.add(task.id)
+            return
+        self._enter(task)
+
+    def _enter(self, task):
+        """任务进入待办：登记依赖，并让已登记的后继重新等待它（例如拆分被撤销后恢复的任务）。"""
+        self._add_pending(task)
+        if self._register_dependencies(task) == 0:
+            self._make_ready(task)
+        for dependent_id in self._dependents.get(task.id, ()):
+            waiting = self._waiting.get(dependent_id)
+            if waiting is None:
+                continue
+            self._waiting[dependent_id] = waiting + 1
+            if waiting == 0:
+                self._discard_ready(self._pending[dependent_id])
+
+    def finish(self, task_id: str):
+        """任务被完成或取消后调用，解除其后继任务的依赖。"""
+        if self._drop_pending(task_id) is None:
+            return
+        self._finished.add(task_id)
+        self._release_dependents(task_id)
+
+    def reopen(self, task):
+        """finish 的逆操作（撤销完成或取消）：任务回到待办，依赖它的待办任务重新等待它。"""
+        if task.id in self._pending:
+            return
+        self._finished.discard(task.id)
+        self._enter(task)
+
+    def remove(self, task_id: str):
+        """任务从列表中移除（例如被拆分）后调用。它已不存在，依赖它的任务不再等待它。"""
+        task = self._drop_pending(task_id)
+        if task is None:
+            self._finished.discard(task_id)
+        else:
+            self._unregister_dependencies(task)
+            self._release_dependents(task_id)
+
+    def dependents_of(self, task_id: str) -> list:
+        """直接依赖该任务的待办任务 id。"""
+        return [dependent_id for dependent_id in self._dependents.get(task_id, ()) if dependent_id in self._pending]
+
+    def repoint(self, dependent_ids, old_ids, new_ids):
+        """
+        拆分（或撤销拆分）后调用：这些待办任务不再依赖 old_ids，改为依赖 new_ids。
+        任务对象上的 depends_on 已由 apply_record 改好，这里只调整依赖登记和等待计数，代价与后继任务数成正比。
+        """
+        for dependent_id in dependent_ids:
+            if dependent_id not in self._pending:
+                continue
+            before = waiting = self._waiting[dependent_id]
+            for old_id in old_ids:
+                dependents = self._dependents.get(old_id)
+                if dependents is None or dependent_id not in dependents:
+                    continue
+                del dependents[dependent_id]
+                if old_id in self._pending:
+                    waiting -= 1
+            for new_id in new_ids:
+                dependents = self._dependents.get(new_id)
+                if dependents is None:
+                    dependents = self._dependents[new_id] = {}
+                elif dependent_id in dependents:
+                    continue
+                dependents[dependent_id] = None
+                if new_id in self._pending:
+                    waiting += 1
+            self._waiting[dependent_id] = waiting
+            if before == 0 and waiting > 0:
+                self._discard_ready(self._pending[dependent_id])
+            elif before > 0 and waiting == 0:
+                self._make_ready(self._pending[dependent_id])
+
+    def _release_dependents(self, task_id: str):
+        for dependent_id in self._dependents.get(task_id, ()):
+            waiting = self._waiting.get(dependent_id)
+            if waiting is None:
+                continue
+            self._waiting[dependent_id] = waiting - 1
+            if waiting == 1:
+                self._make_ready(self._pending[dependent_id])
+
+    def reweight(self, task):
+        """任务属性（例如推迟次数）变化后，更新它在加权池中的权重。"""
+        if self._weight_fn is not None:
+            weight = self._weight_fn(task)
+            for pool in self._pools_of(task):
+                pool.update(task.id, weight)
+
+    def pick(self, rng=random, tag: str = None):
+        """
+        随机选出一个可执行任务：常规任务未全部完成前只从常规就绪池中选择，
+        之后才轮到末尾任务。指定 tag 时只在带有该标签的就绪任务中选择。
+        没有可执行任务时返回 None。
+        """
+        is_late = self._pending_counts[False] == 0
+        if tag is None:
+            pool = self._ready[is_late]
+        else:
+            pool = self._tag_ready.get(tag, {}).get(is_late)
+        if not pool:
+            return None
+        return self._pending[pool.choice(rng)]
+
+    def candidates(self, tag: str = None) -> set:
+        """pick 此时会从中选择的任务 id（用于检查和测试）。"""
+        is_late = self._pending_counts[False] == 0
+        pool = self._ready[is_late] if tag is None else self._tag_ready.get(tag, {}).get(is_late)
+        return set(pool) if pool else set()
@@ -0,0 +1,279 @@
+# atomize/server.py
+
+import os
+import re
+import sys
+import json
+import signal
+import asyncio
+import argparse
+import collections
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import core
+from batch import BatchRunner, ACTION_ALIASES
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 常驻内存的会话数上限，超出后把最久未使用的会话写回磁盘并释放
+MAX_SESSIONS = 64
+# 执行 TaskManager 操作（可能读写文件）的线程数
+WORKER_THREADS = 8
+MAX_BODY_BYTES = 1024 * 1024
+
+_USER_RE = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class _Session:
+    """一个用户的会话：TaskManager + 记录“当前任务”的 BatchRunner，同一时间只执行一个操作。"""
+    def __init__(self, runner: BatchRunner):
+        self.runner = runner
+        self.lock = asyncio.Lock()
+        self.closed = False
+
+
+class SessionPool:
+    """
+    按用户名管理 TaskManager 实例，每个用户使用 <root>/users/<用户名>/ 作为数据目录。
+    - 会话按 LRU 顺序常驻内存，超过 max_sessions 时淘汰最久未使用的会话（写完并关闭文件）。
+      分组树和标签表虽然在进程内共享，但只弱引用各个节点，被淘汰的会话中的分组和标签会随任务一起释放。
+    - 加载、执行、淘汰都在线程池中进行，事件循环不会等待磁盘。
+    """
+    def __init__(self, root: str, max_sessions: int = MAX_SESSIONS, executor=None, weighting: str = None):
+        self.root = root
+        self.max_sessions = max_sessions
+        self.weighting = weighting
+        self.executor = executor or ThreadPoolExecutor(WORKER_THREADS, thread_name_prefix='atomize-worker')
+        self._sessions = collections.OrderedDict()
+        self._loading = {}
+        self._evicting = {}
+
+    def _run(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _create_manager(self, user: str) -> core.TaskManager:
+        data_dir = os.path.join(self.root, 'users', user)
+        return core.TaskManager(weighting=self.weighting, write_behind=True, data_dir=data_dir)
+
+    async def get(self, user: str) -> _Session:
+        if not _USER_RE.match(user) or user.strip('.') == '':
+            raise HttpError(400, f"无效的用户名: {user}")
+        session = self._sessions.get(user)
+        if session is not None:
+            self._sessions.move_to_end(user)
+            return session
+
+        # 同一用户的并发请求共享一次加载；被淘汰的会话需要先写完，才能重新加载
+        loading = self._loading.get(user)
+        if loading is None:
+            loading = self._loading[user] = asyncio.ensure_future(self._load(user))
+        try:
+            return await asyncio.shield(loading)
+        finally:
+            self._loading.pop(user, None)
+
+    async def _load(self, user: str) -> _Session:
+        if user in self._evicting:
+            await self._evicting[user]
+        task_manager = await self._run(self._create_manager, user)
+        session = self._sessions[user] = _Session(BatchRunner(task_manager))
+        self._evict_overflow()
+        return session
+
+    def _evict_overflow(self):
+        while len(self._sessions) > self.max_sessions:
+            user, session = self._sessions.popitem(last=False)
+            self._evicting[user] = asyncio.ensure_future(self._close(user, session))
+
+    async def _close(self, user: str, session: _Session):
+        try:
+            async with session.lock:
+                session.closed = True
+                await self._run(session.runner.task_manager.close)
+        finally:
+            self._evicting.pop(user, None)
+
+    async def execute(self, user: str, command: str, argument: str) -> dict:
+        while True:
+            session = await self.get(user)
+            async with session.lock:
+                # 等锁期间会话可能已被淘汰，此时重新加载
+                if not session.closed:
+                    return await self._run(session.runner.execute, command, argument)
+
+    async def close(self):
+        """关闭所有会话，确保修改都已写入磁盘。"""
+        sessions = list(self._sessions.items())
+        self._sessions.clear()
+        await asyncio.gather(*(self._close(user, session) for user, session in sessions),
+                             *self._evicting.values())
+        self.executor.shutdown(wait=True)
+
+
+def _route(method: str, path: str):
+    """
+    路由规则：
+        GET  /users/<用户名>/next | summary?tag=deep | report?period=week&count=4&tag=deep
+        POST /users/<用户名>/plan | template | done | postpone | cancel | split | add | edit | filter | undo | redo
+    返回 (用户名, 命令)。
+    """
+    parts = [part for part in path.split('?', 1)[0].split('/') if part]
+    if len(parts) != 3 or parts[0] != 'users':
+        raise HttpError(404, f"未知路径: {path}")
+    command = ACTION_ALIASES.get(parts[2])
+    if command is None or command == 'quit':
+        raise HttpError(404, f"未知操作: {parts[2]}")
+    expected = 'GET' if command in ('next', 'summary', 'report') else 'POST'
+    if method != expected:
+        raise HttpError(405, f"{command} 需要使用 {expected} 请求")
+    return parts[1], command
+
+
+def _argument(command: str, path: str, body: bytes) -> str:
+    """
+    取出命令参数：plan 为 {"plan", "merge"}（plan 为 “!模板名 参数=值” 时使用模板），template 为 {"name", "plan"}，
+    split/add/edit 为 {"text"}，filter 为 {"text": 标签}，summary / report 使用查询参数 period、count 和 tag。
+    """
+    if command in ('summary', 'report'):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)
+        argument = f"{query.get('period', ['week'])[0]} {query.get('count', ['4'])[0]}" if command == 'report' else ''
+        if query.get('tag'):
+            argument += ' #' + query['tag'][0].lstrip('#')
+        return argument
+    if not body:
+        payload = {}
+    else:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            raise HttpError(400, "请求体不是有效的 JSON")
+        if not isinstance(payload, dict):
+            raise HttpError(400, "请求体必须是 JSON 对象")
+    if command == 'plan':
+        plan = str(payload.get('plan', ''))
+        return f"--merge {plan}" if payload.get('merge') else plan
+    if command == 'template':
+        return f"{payload.get('name', '')} {payload.get('plan', '')}"
+    return str(payload.get('text', ''))
+
+
+class Server:
+    """基于 asyncio 的本地 HTTP/JSON 服务，支持 keep-alive。"""
+    def __init__(self, pool: SessionPool):
+        self.pool = pool
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self._dispatch(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HttpError as e:
+            self._write_response(writer, e.status, {'success': False, 'message': str(e)}, False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, path, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise HttpError(400, "无效的请求行")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HttpError(400, "无效的 Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "请求体过大")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), path, headers, body
+
+    async def _dispatch(self, method: str, path: str, body: bytes):
+        try:
+            user, command = _route(method, path)
+            result = await self.pool.execute(user, command, _argument(command, path, body))
+        except HttpError as e:
+            return e.status, {'success': False, 'message': str(e)}
+        except ValueError as e:
+            return 400, {'success': False, 'message': str(e)}
+        except Exception as e:
+            return 500, {'success': False, 'message': f"服务器内部错误: {e}"}
+        return (200 if result.get('success') else 400), result
+
+    @staticmethod
+    def _write_response(writer, status: int, payload: dict, keep_alive: bool):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+
+
+async def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, root: str = None,
+                max_sessions: int = MAX_SESSIONS, weighting: str = None):
+    pool = SessionPool(root or core.DATA_DIR, max_sessions, weighting=weighting)
+    server = Server(pool)
+    listener = await asyncio.start_server(server.handle_connection, host, port)
+    print(f"Atomize 服务已启动: http://{host}:{port}/users/<用户名>/next", file=sys.stderr)
+    # 后台写入线程由工作线程创建，不会安装自己的 SIGTERM 处理；这里收到 SIGTERM 后正常停止，写完再退出
+    stop = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    except (NotImplementedError, RuntimeError):  # Windows
+        pass
+    try:
+        async with listener:
+            await stop.wait()
+    finally:
+        await pool.close()
+        import writer
+        writer.shutdown()
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Atomize 多用户服务（本地 HTTP/JSON 接口）")
+    arg_parser.add_argument('--host', default=DEFAULT_HOST)
+    arg_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    arg_parser.add_argument('--data-dir', help="数据根目录，各用户的数据位于其下的 users/<用户名>/（默认为 data/）")
+    arg_parser.add_argument('--max-sessions', type=int, default=MAX_SESSIONS, help="常驻内存的会话数上限")
+    arg_parser.add_argument('--weighting', choices=sorted(core.WEIGHTINGS))
+    args = arg_parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.data_dir, args.max_sessions, args.weighting))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+# atomize/simulate.py
+
+import os
+import sys
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import parser
+from model import encode_tasks, decode_tasks
+from scheduler import ReadyQueue, WEIGHTINGS
+
+DEFAULT_RUNS = 2000
+# 每个工作进程平均分到的批次数，批次越多负载越均衡
+CHUNKS_PER_WORKER = 4
+
+
+class _Plan:
+    """工作进程内的模拟对象：解码后的任务列表，以及每个任务所属的各级分组（从外到内的路径）。"""
+    def __init__(self, encoded: dict, weighting: str = None):
+        self.tasks = [task for task in decode_tasks(encoded) if task.status == 'pending']
+        self.weight_fn = WEIGHTINGS[weighting] if weighting else None
+        self.index = {task.id: i for i, task in enumerate(self.tasks)}
+        self.groups = []
+        group_index = {}
+        self.task_groups = []
+        for task in self.tasks:
+            chain = task.parent_chain
+            indexes = []
+            for depth in range(1, len(chain) + 1):
+                key = " > ".join(chain[:depth])
+                if key not in group_index:
+                    group_index[key] = len(self.groups)
+                    self.groups.append(key)
+                indexes.append(group_index[key])
+            self.task_groups.append(indexes)
+        self.group_sizes = [0] * len(self.groups)
+        for indexes in self.task_groups:
+            for g in indexes:
+                self.group_sizes[g] += 1
+        self.late = [i for i, task in enumerate(self.tasks) if task.is_late_task]
+
+
+def _new_totals(plan: _Plan) -> dict:
+    """可合并的累计量：都是整数和，结果与进程数、批次划分无关。"""
+    return {
+        'runs': 0,
+        'picks': 0,
+        'postpones': 0,
+        # 每个任务：完成次数、完成位置之和、平方和
+        'task_done': [0] * len(plan.tasks),
+        'task_sum': [0] * len(plan.tasks),
+        'task_sq': [0] * len(plan.tasks),
+        # 每个分组：第一个任务完成的次数 / 位置之和，全部完成的次数 / 位置之和
+        'first_count': [0] * len(plan.groups),
+        'first_sum': [0] * len(plan.groups),
+        'last_count': [0] * len(plan.groups),
+        'last_sum': [0] * len(plan.groups),
+        # 至少有一个末尾任务没轮到的次数，没轮到的末尾任务总数
+        'late_starved_runs': 0,
+        'late_unfinished': 0,
+    }
+
+
+def _merge(totals: dict, other: dict):
+    for key, value in other.items():
+        if isinstance(value, list):
+            target = totals[key]
+            for i, item in enumerate(value):
+                target[i] += item
+        else:
+            totals[key] += value
+
+
+def _run_once(plan: _Plan, rng, totals: dict, postpone_rate: float, horizon: int):
+    """
+    模拟一次执行：与 TaskManager.get_next_task_info 相同，每一步从就绪队列中随机推送一个任务，
+    以 postpone_rate 的概率推迟它（每个任务最多推迟一次），否则完成它。
+    horizon 为最多推送的次数（一天能处理的量），None 表示一直执行到全部完成。
+    位置指任务是第几个被完成的（从 1 开始）。
+    """
+    tasks = plan.tasks
+    queue = ReadyQueue(tasks, weight_fn=plan.weight_fn)
+    postponed = []
+    position = 0
+    picks = 0
+    group_done = [0] * len(plan.groups)
+    done = [False] * len(tasks)
+    while horizon is None or picks < horizon:
+        task = queue.pick(rng)
+        if task is None:
+            break
+        picks += 1
+        if postpone_rate and task.postponed_count == 0 and rng.random() < postpone_rate:
+            task.postponed_count += 1
+            postponed.append(task)
+            queue.reweight(task)
+            continue
+        position += 1
+        queue.finish(task.id)
+        i = plan.index[task.id]
+        done[i] = True
+        totals['task_done'][i] += 1
+        totals['task_sum'][i] += position
+        totals['task_sq'][i] += position * position
+        for g in plan.task_groups[i]:
+            group_done[g] += 1
+            if group_done[g] == 1:
+                totals['first_count'][g] += 1
+                totals['first_sum'][g] += position
+            if group_done[g] == plan.group_sizes[g]:
+                totals['last_count'][g] += 1
+                totals['last_sum'][g] += position
+
+    # 推迟次数写在共享的任务对象上（加权模式会用到），下一次模拟前复原
+    for task in postponed:
+        task.postponed_count -= 1
+    unfinished = sum(1 for i in plan.late if not done[i])
+    totals['runs'] += 1
+    totals['picks'] += picks
+    totals['postpones'] += len(postponed)
+    totals['late_unfinished'] += unfinished
+    if unfinished:
+        totals['late_starved_runs'] += 1
+
+
+def _run_chunk(plan: _Plan, seeds: range, postpone_rate: float, horizon: int) -> dict:
+    totals = _new_totals(plan)
+    for seed in seeds:
+        _run_once(plan, random.Random(seed), totals, postpone_rate, horizon)
+    return totals
+
+
+# 工作进程中的计划，只在进程启动时解码一次
+_worker_plan = None
+
+
+def _init_worker(encoded: dict, weighting: str):
+    global _worker_plan
+    _worker_plan = _Plan(encoded, weighting)
+
+
+def _run_worker_chunk(seeds: range, postpone_rate: float, horizon: int) -> dict:
+    return _run_chunk(_worker_plan, seeds, postpone_rate, horizon)
+
+
+def _chunks(runs: int, seed: int, count: int) -> list:
+    size = math.ceil(runs / count)
+    return [range(seed + start, seed + min(start + size, runs)) for start in range(0, runs, size)]
+
+
+def simulate(tasks, runs: int = DEFAULT_RUNS, seed: int = 0, postpone_rate: float = 0.0, horizon: int = None,
+             weighting: str = None, workers: int = None) -> dict:
+    """
+    对一份计划做 runs 次蒙特卡洛模拟，不涉及界面和持久化。第 i 次模拟使用种子 seed + i，
+    所以结果只取决于参数，与进程数无关。workers 为进程数（默认使用全部 CPU），为 1 时在当前进程中运行。
+    返回：
+    - tasks: 任务 id -> {name, group, late, mean_position, std_position, completion_rate}
+    - groups: 分组路径 -> {tasks, mean_first, mean_last, first_rate, completion_rate}
+      （mean_first / mean_last 为该分组第一个 / 最后一个任务被完成的平均位置）
+    - late: {tasks, starved_rate, mean_unfinished}，starved_rate 为有末尾任务没能轮到的模拟比例（需指定 horizon）
+    - runs, picks_per_run, postpones_per_run
+    位置的平均值只统计在 horizon 之内完成的模拟；没有完成过的任务和分组为 None。
+    """
+    tasks = [task for task in tasks if task.status == 'pending']
+    encoded = encode_tasks(tasks)
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, runs))
+    plan = _Plan(encoded, weighting)
+    if workers == 1:
+        totals = _run_chunk(plan, range(seed, seed + runs), postpone_rate, horizon)
+    else:
+        # 工作进程各自解码一次计划；各批次只传种子区间，结果是可以直接相加的整数累计量
+        totals = _new_totals(plan)
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(encoded, weighting)) as executor:
+            futures = [executor.submit(_run_worker_chunk, seeds, postpone_rate, horizon)
+                       for seeds in _chunks(runs, seed, workers * CHUNKS_PER_WORKER)]
+            for future in futures:
+                _merge(totals, future.result())
+    return _summarize(plan, totals)
+
+
+def _mean(total: int, count: int):
+    return total / count if count else None
+
+
+def _summarize(plan: _Plan, totals: dict) -> dict:
+    runs = totals['runs']
+    task_stats = {}
+    for i, task in enumerate(plan.tasks):
+        count = totals['task_done'][i]
+        mean = _mean(totals['task_sum'][i], count)
+        std = math.sqrt(max(totals['task_sq'][i] / count - mean * mean, 0.0)) if count else None
+        task_stats[task.id] = {
+            'name': task.name,
+            'group': task.path(),
+            'late': task.is_late_task,
+            'mean_position': mean,
+            'std_position': std,
+            'completion_rate': count / runs if runs else 0.0,
+        }
+    group_stats = {}
+    for g, key in enumerate(plan.groups):
+        group_stats[key] = {
+            'tasks': plan.group_sizes[g],
+            'mean_first': _mean(totals['first_sum'][g], totals['first_count'][g]),
+            'mean_last': _mean(totals['last_sum'][g], totals['last_count'][g]),
+            'first_rate': totals['first_count'][g] / runs if runs else 0.0,
+            'completion_rate': totals['last_count'][g] / runs if runs else 0.0,
+        }
+    return {
+        'runs': runs,
+        'picks_per_run': _mean(totals['picks'], runs),
+        'postpones_per_run': _mean(totals['postpones'], runs),
+        'tasks': task_stats,
+        'groups': group_stats,
+        'late': {
+            'tasks': len(plan.late),
+            'starved_rate': totals['late_starved_runs'] / runs if runs else 0.0,
+            'mean_unfinished': _mean(totals['late_unfinished'], runs),
+        },
+    }
+
+
+def postpone_sensitivity(tasks, rates, **options) -> dict:
+    """在不同的推迟概率下各模拟一次（种子相同），返回 {推迟概率: simulate 的结果}，用于比较推迟对顺序的影响。"""
+    tasks = list(tasks)
+    return {rate: simulate(tasks, postpone_rate=rate, **options) for rate in rates}
+
+
+def _format_position(value) -> str:
+    return '-' if value is None else f"{value:.1f}"
+
+
+def main(argv=None):
+    import json
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="对一份规划做蒙特卡洛模拟，估计各分组和任务在结构化随机调度下的位置")
+    arg_parser.add_argument('plan', help="规划字符串，或 @文件路径")
+    arg_parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help="模拟次数")
+    arg_parser.add_argument('--seed', type=int, default=0, help="第一次模拟的随机种子")
+    arg_parser.add_argument('--postpone-rate', type=float, nargs='+', default=[0.0], metavar='RATE',
+                            help="每次推送时推迟的概率；给出多个值时比较它们的结果")
+    arg_parser.add_argument('--horizon', type=int, help="每次模拟最多推送的次数（一天能处理的量），默认执行到全部完成")
+    arg_parser.add_argument('--weighting', choices=sorted(WEIGHTINGS))
+    arg_parser.add_argument('--workers', type=int, help="进程数，默认使用全部 CPU")
+    arg_parser.add_argument('--json', action='store_true', help="输出完整的 JSON 结果")
+    args = arg_parser.parse_args(argv)
+
+    if args.plan.startswith('@'):
+        import planfile
+        tasks, errors = planfile.parse_plan_file(args.plan[1:])
+        for error in errors:
+            print(f"第 {error['line']} 行: {error['message']}", file=sys.stderr)
+    else:
+        tasks = parser.parse_task_string(args.plan)
+
+    results = postpone_sensitivity(tasks, args.postpone_rate, runs=args.runs, seed=args.seed, horizon=args.horizon,
+                                   weighting=args.weighting, workers=args.workers)
+    if args.json:
+        print(json.dumps({str(rate): result for rate, result in results.items()}, ensure_ascii=False, indent=2))
+        return 0
+
+    rates = list(results)
+    first = results[rates[0]]
+    print(f"{len(first['tasks'])} 个任务，每种推迟概率模拟 {first['runs']} 次")
+    print("\n分组第一个任务完成的平均位置（推迟概率: " + " / ".join(f"{rate:g}" for rate in rates) + "）")
+    for key in sorted(first['groups'], key=lambda k: first['groups'][k]['mean_first'] or math.inf):
+        values = " / ".join(_format_position(results[rate]['groups'][key]['mean_first']) for rate in rates)
+        print(f"  {key}: {values}")
+    print("\n末尾任务")
+    for rate in rates:
+        late = results[rate]['late']
+        print(f"  推迟概率 {rate:g}: {late['tasks']} 个，没能轮到的模拟占 {late['starved_rate']:.1%}，"
+              f"平均剩余 {late['mean_unfinished']:.2f} 个，平均推迟 {results[rate]['postpones_per_run']:.1f} 次")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# atomize/store.py
+
+
+class TaskStore:
+    """
+    有序的任务容器。
+    - 以 id 为键的字典索引，按 id 查找任务为 O(1)。
+    - 以双向链表维护任务顺序，在任意位置插入、删除和移动到末尾都是 O(1)。
+    迭代时按顺序返回任务对象，可以像列表一样直接用于序列化和展示。
+    """
+    def __init__(self, tasks=()):
+        self._tasks = {}
+        self._prev = {}
+        self._next = {}
+        self._head = None
+        self._tail = None
+        self.extend(tasks)
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __bool__(self):
+        return bool(self._tasks)
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def __iter__(self):
+        task_id = self._head
+        while task_id is not None:
+            yield self._tasks[task_id]
+            task_id = self._next[task_id]
+
+    def get(self, task_id):
+        """按 id 返回任务，不存在时返回 None。"""
+        return self._tasks.get(task_id)
+
+    def previous(self, task_id):
+        """返回排在指定任务之前的任务 id，它在最前面时返回 None。"""
+        return self._prev[task_id]
+
+    def _link_after(self, anchor_id, task):
+        task_id = task.id
+        following_id = self._head if anchor_id is None else self._next[anchor_id]
+        self._tasks[task_id] = task
+        self._prev[task_id] = anchor_id
+        self._next[task_id] = following_id
+        if anchor_id is None:
+            self._head = task_id
+        else:
+            self._next[anchor_id] = task_id
+        if following_id is None:
+            self._tail = task_id
+        else:
+            self._prev[following_id] = task_id
+
+    def _unlink(self, task_id):
+        prev_id = self._prev.pop(task_id)
+        next_id = self._next.pop(task_id)
+        if prev_id is None:
+            self._head = next_id
+        else:
+            self._next[prev_id] = next_id
+        if next_id is None:
+            self._tail = prev_id
+        else:
+            self._prev[next_id] = prev_id
+        return self._tasks.pop(task_id)
+
+    def append(self, task):
+        """把任务追加到末尾。id 已存在的任务会被忽略，以免破坏顺序链表。"""
+        if task.id in self._tasks:
+            return
+        self._link_after(self._tail, task)
+
+    def extend(self, tasks):
+        for task in tasks:
+            self.append(task)
+
+    def insert_after(self, anchor_id, tasks):
+        """把一组任务按顺序插入到 anchor_id 之后，代价只与插入的任务数有关。"""
+        if anchor_id not in self._tasks:
+            raise KeyError(anchor_id)
+        for task in tasks:
+            if task.id in self._tasks:
+                continue
+            self._link_after(anchor_id, task)
+            anchor_id = task.id
+
+    def remove(self, task_id):
+        """移除并返回指定任务。"""
+        if task_id not in self._tasks:
+            raise KeyError(task_id)
+        return self._unlink(task_id)
+
+    def replace(self, task_id, tasks):
+        """用一组任务原地替换指定任务（用于拆分）。"""
+        if task_id not in self._tasks:
+            raise KeyError(task_id)
+        anchor_id = self._prev[task_id]
+        self._unlink(task_id)
+        for task in tasks:
+            if task.id in self._tasks:
+                continue
+            self._link_after(anchor_id, task)
+            anchor_id = task.id
+
+    def move_to_end(self, task_id):
+        """把指定任务移动到末尾。"""
+        if task_id not in self._tasks:
+            raise KeyError(task_id)
+        if task_id != self._tail:
+            task = self._unlink(task_id)
+            self._link_after(self._tail, task)
+
+    def move_after(self, task_id, anchor_id):
+        """把指定任务移动到 anchor_id 之后；anchor_id 为 None 时移动到最前面。"""
+        if task_id not in self._tasks:
+            raise KeyError(task_id)
+        if anchor_id is not None and anchor_id not in self._tasks:
+            raise KeyError(anchor_id)
+        if task_id != anchor_id and self._prev[task_id] != anchor_id:
+            task = self._unlink(task_id)
+            self._link_after(anchor_id, task)
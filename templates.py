@@ -0,0 +1,304 @@
+# atomize/templates.py
+
+import os
+import re
+import sys
+import json
+import shlex
+import hashlib
+
+import parser
+from model import ROOT, Task, intern_tags, new_task_ids
+
+# 编译缓存中最多保留的规划数，超出后淘汰最久未使用的
+CACHE_MAX_ENTRIES = 64
+# 直接输入的规划至少有这么多字符时才写入编译缓存，较短的一次性规划直接解析
+CACHE_MIN_CHARS = 2048
+# 编译结果的格式版本，格式变化时旧的缓存自动失效
+COMPILED_VERSION = 1
+
+# 模板参数：{名称} 或带默认值的 {名称=默认值}
+_PARAM_RE = re.compile(r'\{(\w+)(?:=([^{}]*))?\}')
+_TEMPLATE_NAME_RE = re.compile(r'^[\w.-]{1,64}$')
+
+
+def _write_json(path: str, data):
+    """缓存文件可以随时重建，只需原子替换，不做 fsync。"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+class CompiledPlan:
+    """
+    编译好的规划：分组表 + 任务行，依赖写成行下标而不是 id。
+    instantiate() 只复制这个结构并分配新的 id，不再解析 DSL，也不再校验依赖图（编译时已校验过）。
+    名称、分组名和标签中的 {参数} 原样保留，实例化时替换。
+    """
+    __slots__ = ('groups', 'rows', 'params')
+
+    def __init__(self, groups: list, rows: list):
+        # groups: [[父分组下标或 -1, 名称], ...]
+        # rows:   [[名称, 分组下标, 前置任务的行下标, 是否末尾任务, 权重, 标签], ...]
+        self.groups = groups
+        self.rows = rows
+        self.params = {}
+        texts = [name for _, name in groups]
+        for name, _, _, _, _, tags in rows:
+            texts.append(name)
+            texts.extend(tags)
+        for text in texts:
+            for match in _PARAM_RE.finditer(text):
+                if match.group(2) is not None or match.group(1) not in self.params:
+                    self.params[match.group(1)] = match.group(2)
+
+    @classmethod
+    def from_tasks(cls, tasks: list) -> 'CompiledPlan':
+        group_index = {ROOT: -1}
+        groups = []
+
+        def index_of(group):
+            if group not in group_index:
+                parent = index_of(group.parent)
+                group_index[group] = len(groups)
+                groups.append([parent, group.name])
+            return group_index[group]
+
+        row_index = {task.id: i for i, task in enumerate(tasks)}
+        rows = [[task.name, index_of(task.group), [row_index[dep] for dep in task.depends_on],
+                 int(task.is_late_task), task.weight, sorted(task.tags)] for task in tasks]
+        return cls(groups, rows)
+
+    @classmethod
+    def compile(cls, text: str) -> 'CompiledPlan':
+        return cls.from_tasks(parser.parse_task_string(text))
+
+    def to_dict(self) -> dict:
+        return {'version': COMPILED_VERSION, 'groups': self.groups, 'tasks': self.rows}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'CompiledPlan':
+        if data.get('version') != COMPILED_VERSION:
+            raise ValueError("编译结果的版本不匹配")
+        return cls(data['groups'], data['tasks'])
+
+    def instantiate(self, params: dict = None) -> list:
+        """
+        生成一组新的任务对象。params 为 None 时名称原样使用（普通规划中的花括号只是文字）；
+        否则替换其中的 {参数}，没有给出、也没有默认值的参数会导致 ValueError。
+        """
+        substitute = _identity if params is None else self._substitution(params)
+        nodes = []
+        for parent_index, name in self.groups:
+            parent = ROOT if parent_index < 0 else nodes[parent_index]
+            nodes.append(parent.child(substitute(name)))
+        ids = new_task_ids(len(self.rows))
+        tag_sets = {}
+        tasks = []
+        for row, (name, group_index, deps, is_late, weight, tags) in enumerate(self.rows):
+            key = tuple(tags)
+            tag_set = tag_sets.get(key)
+            if tag_set is None:
+                tag_set = tag_sets[key] = intern_tags([substitute(tag) for tag in tags])
+            tasks.append(Task(substitute(name), ROOT if group_index < 0 else nodes[group_index],
+                              tuple([ids[i] for i in deps]), bool(is_late), ids[row], weight=weight, tags=tag_set))
+        return tasks
+
+    def _substitution(self, params: dict):
+        values = {name: default for name, default in self.params.items() if default is not None}
+        values.update((name, str(value)) for name, value in params.items())
+        missing = [name for name in self.params if name not in values]
+        if missing:
+            raise ValueError(f"缺少模板参数: {', '.join(missing)}")
+
+        def substitute(text: str) -> str:
+            if '{' not in text:
+                return text
+            return _PARAM_RE.sub(lambda match: values[match.group(1)], text)
+        return substitute
+
+
+def _identity(text: str) -> str:
+    return text
+
+
+class PlanCache:
+    """
+    编译结果的磁盘缓存：<目录>/<DSL 文本的 SHA-256>.json。
+    - 命中时只读取 JSON 并更新文件的 mtime，作为最近使用时间。
+    - 未命中时解析并写入缓存；缓存超过 max_entries 个时，按 mtime 淘汰最久未使用的（LRU）。
+    - 缓存文件损坏或格式版本不符时视为未命中，重新编译。
+    - 模板总是经过缓存；直接输入的规划（parse）短于 min_chars 时不写入缓存，免得挤掉模板。
+    """
+    def __init__(self, directory: str, max_entries: int = CACHE_MAX_ENTRIES, min_chars: int = CACHE_MIN_CHARS):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.min_chars = min_chars
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.json')
+
+    def compile(self, text: str) -> CompiledPlan:
+        """返回 DSL 文本的编译结果，优先使用缓存。解析错误以 ValueError 抛出，不写入缓存。"""
+        path = self._path(self.key(text))
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                compiled = CompiledPlan.from_dict(json.load(f))
+            os.utime(path)
+            return compiled
+        except (OSError, ValueError, KeyError):
+            pass
+        compiled = CompiledPlan.compile(text)
+        os.makedirs(self.directory, exist_ok=True)
+        _write_json(path, compiled.to_dict())
+        self._evict()
+        return compiled
+
+    def parse(self, text: str) -> list:
+        """解析直接输入的规划，返回新的任务列表。只有较长的规划才使用缓存。"""
+        if len(text) < self.min_chars:
+            return parser.parse_task_string(text)
+        return self.compile(text).instantiate()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.stat(path).st_mtime_ns, path))
+                except OSError:
+                    continue
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class TemplateStore:
+    """
+    具名的规划模板，每个模板是 <目录>/<名称>.txt 中的一段 DSL，可以包含 {参数} 或 {参数=默认值}。
+    实例化时经由 PlanCache 取得编译结果，再替换参数，同一模板只在第一次使用（或修改）后解析一次。
+    """
+    def __init__(self, directory: str, cache: PlanCache):
+        self.directory = directory
+        self.cache = cache
+
+    def _path(self, name: str) -> str:
+        if not _TEMPLATE_NAME_RE.match(name) or name.strip('.') == '':
+            raise ValueError(f"无效的模板名: {name}")
+        return os.path.join(self.directory, name + '.txt')
+
+    def names(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len('.txt')] for name in os.listdir(self.directory) if name.endswith('.txt'))
+
+    def get(self, name: str) -> str:
+        try:
+            with open(self._path(name), 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            raise ValueError(f"没有名为 {name} 的模板")
+
+    def params(self, name: str) -> dict:
+        """模板的参数 -> 默认值（没有默认值时为 None）。"""
+        return dict(self.cache.compile(self.get(name)).params)
+
+    def save(self, name: str, text: str):
+        """
+        保存模板。多行的内容按行用 ',' 连接（与规划文件一样，每行是独立的顶层片段）。
+        保存前先编译一次，格式错误时抛出 ValueError，同时预热缓存。
+        """
+        path = self._path(name)
+        text = ','.join(line.strip() for line in text.splitlines() if line.strip())
+        if not text:
+            raise ValueError("模板内容不能为空。")
+        self.cache.compile(text)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        os.replace(path + '.tmp', path)
+
+    def delete(self, name: str):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            raise ValueError(f"没有名为 {name} 的模板")
+
+    def instantiate(self, name: str, params: dict = None) -> list:
+        return self.cache.compile(self.get(name)).instantiate(params or {})
+
+
+def parse_invocation(text: str):
+    """
+    解析 “模板名 参数=值 ...” 形式的调用（值中有空格时可以加引号），返回 (模板名, 参数字典)。
+    """
+    try:
+        words = shlex.split(text)
+    except ValueError as e:
+        raise ValueError(f"模板调用格式错误: {e}")
+    if not words:
+        raise ValueError("缺少模板名。")
+    params = {}
+    for word in words[1:]:
+        key, sep, value = word.partition('=')
+        if not sep or not key:
+            raise ValueError(f"模板参数应写成 名称=值: {word}")
+        params[key] = value
+    return words[0], params
+
+
+def main(argv=None):
+    import argparse
+    import core
+
+    arg_parser = argparse.ArgumentParser(description="管理规划模板")
+    arg_parser.add_argument('--data-dir', default=core.DATA_DIR, help="数据目录（默认为 data/）")
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="列出所有模板及其参数")
+    show = commands.add_parser('show', help="显示模板内容")
+    show.add_argument('name')
+    save = commands.add_parser('save', help="保存模板（已存在时覆盖）")
+    save.add_argument('name')
+    save.add_argument('plan', help="规划，可以包含 {参数} 或 {参数=默认值}；以 @ 开头时从文件读取")
+    delete = commands.add_parser('delete', help="删除模板")
+    delete.add_argument('name')
+    args = arg_parser.parse_args(argv)
+
+    cache = PlanCache(os.path.join(args.data_dir, 'plan_cache'))
+    store = TemplateStore(os.path.join(args.data_dir, 'templates'), cache)
+    try:
+        if args.command == 'list':
+            for name in store.names():
+                params = store.params(name)
+                print(name + ('  ' + ' '.join(k if v is None else f"{k}={v}" for k, v in params.items()) if params else ''))
+        elif args.command == 'show':
+            print(store.get(args.name))
+        elif args.command == 'save':
+            text = args.plan
+            if text.startswith('@'):
+                with open(text[1:], 'r', encoding='utf-8-sig') as f:
+                    text = f.read()
+            store.save(args.name, text)
+            print(f"已保存模板 {args.name}")
+        else:
+            store.delete(args.name)
+            print(f"已删除模板 {args.name}")
+    except (ValueError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+# atomize/tests/__init__.py
+"""
+Atomize 的测试。
+
+    python -m pytest tests               # 或 python -m unittest discover tests
+"""
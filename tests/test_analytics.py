@@ -0,0 +1,236 @@
+# atomize/tests/test_analytics.py
+
+import io
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import core
+import analytics
+from history import HistoryStore, period_key
+
+TODAY = date(2024, 5, 31)
+
+
+def generate_rows(seed: int, days: int = 90) -> list:
+    """随机的历史行，按时间排列：完成、取消、推迟，以及少量撤销完成的抵消行。"""
+    rng = random.Random(seed)
+    rows = []
+    for offset in range(days, -1, -1):
+        day = datetime.combine(TODAY - timedelta(days=offset), datetime.min.time())
+        for i in range(rng.randint(0, 6)):
+            moment = day + timedelta(hours=8 + i * 2, minutes=rng.randint(0, 59))
+            status = rng.choice(('done', 'done', 'done', 'skipped', 'postponed'))
+            row = {'timestamp': moment.isoformat(timespec='seconds'), 'task_name': f"t{offset}-{i}",
+                   'parent_chain': rng.choice(('', '写作', '调研', '调研 > 访谈')), 'status': status,
+                   'was_postponed': rng.choice(('yes', 'no', 'no')), 'focus_points': 2 if status == 'done' else 0,
+                   'tags': rng.choice(('', 'deep', 'deep 阅读')), 'elapsed': rng.randint(0, 3600)}
+            rows.append(row)
+            if status == 'done' and rng.random() < 0.15:
+                rows.append(dict(row, status='undone',
+                                 timestamp=(moment + timedelta(minutes=1)).isoformat(timespec='seconds')))
+    return rows
+
+
+def scan(rows: list, period: str, key: str, tag: str = None) -> dict:
+    """直接扫描所有行得到的报告数字，与索引无关。"""
+    finished = done = points = skipped = postponed = 0
+    groups = {}
+    for row in rows:
+        if period_key(row['timestamp'][:10], period) != key or row['status'] == 'postponed':
+            continue
+        if tag is not None and tag not in row['tags'].split():
+            continue
+        sign = -1 if row['status'] == 'undone' else 1
+        finished += sign
+        postponed += sign if row['was_postponed'] == 'yes' else 0
+        if row['status'] == 'skipped':
+            skipped += 1
+        else:
+            done += sign
+            points += sign * row['focus_points']
+            group = groups.setdefault(row['parent_chain'], [0, 0])
+            group[0] += sign
+            group[1] += sign * row['focus_points']
+    top = sorted(groups.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))[:analytics.TOP_GROUPS]
+    return {'period': key, 'completed_count': done, 'total_points': points, 'finished_count': finished,
+            'postpone_rate': postponed / finished if finished else 0.0,
+            'skipped_ratio': skipped / finished if finished else 0.0,
+            'top_groups': [] if tag is not None else
+            [{'group': chain, 'completed_count': d, 'total_points': p} for chain, (d, p) in top]}
+
+
+class RecentKeysTest(unittest.TestCase):
+
+    def test_month_wraps_year(self):
+        self.assertEqual(analytics.recent_keys('month', 3, date(2024, 2, 10)), ['2023-12', '2024-01', '2024-02'])
+
+    def test_week_uses_iso_year(self):
+        self.assertEqual(analytics.recent_keys('week', 2, date(2024, 1, 3)), ['2023-W52', '2024-W01'])
+        self.assertEqual(analytics.recent_keys('day', 2, date(2024, 3, 1)), ['2024-02-29', '2024-03-01'])
+
+
+class ReportTest(unittest.TestCase):
+    """由预先汇总的索引得到的报告与直接扫描历史得到的数字一致。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.store = HistoryStore(os.path.join(self.data_dir, 'history.csv'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_report_matches_scan(self):
+        rows = generate_rows(seed=7)
+        for row in rows:
+            self.store.append(row)
+        for period, count in (('day', 10), ('week', 14), ('month', 4)):
+            for tag in (None, 'deep'):
+                with self.subTest(period=period, tag=tag):
+                    report = analytics.build_report(self.store, period, count, TODAY, tag)
+                    self.assertEqual([item['period'] for item in report],
+                                     analytics.recent_keys(period, count, TODAY))
+                    self.assertEqual(report, [scan(rows, period, item['period'], tag) for item in report])
+
+    def test_empty_periods(self):
+        report = analytics.build_report(self.store, 'month', 2, TODAY)
+        self.assertEqual([(item['finished_count'], item['postpone_rate'], item['top_groups']) for item in report],
+                         [(0, 0.0, []), (0, 0.0, [])])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            analytics.build_report(self.store, 'year')
+        with self.assertRaises(ValueError):
+            analytics.build_report(self.store, 'week', 0)
+
+
+class ManagerReportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.task_manager = core.TaskManager(data_dir=self.data_dir)
+
+    def tearDown(self):
+        self.task_manager.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_report_for_today(self):
+        self.task_manager.start_new_day("写作(提纲 #deep, 初稿 #deep), 回复邮件")
+        for task in list(self.task_manager.tasks):
+            if task.name == '回复邮件':
+                self.task_manager.cancel_task(task.id)
+            else:
+                self.task_manager.complete_task(task.id)
+        week = self.task_manager.get_report('week', 1)[0]
+        self.assertEqual((week['completed_count'], week['finished_count'], week['skipped_ratio']), (2, 3, 1 / 3))
+        self.assertEqual(week['top_groups'][0]['group'], '写作')
+        tagged = self.task_manager.get_report('month', 1, '#deep')[0]
+        self.assertEqual((tagged['completed_count'], tagged['finished_count']), (2, 2))
+
+
+def timed_row(timestamp: str, name: str, status: str, elapsed, chain: str = '写作') -> dict:
+    return {'timestamp': timestamp, 'task_name': name, 'parent_chain': chain, 'status': status,
+            'was_postponed': 'no', 'focus_points': 2 if status == 'done' else 0, 'tags': '', 'elapsed': elapsed}
+
+
+class ThroughputTest(unittest.TestCase):
+    """按天的计时汇总和由它算出的效率指标。"""
+
+    ROWS = [timed_row('2024-05-20 09:00:00', 'a', 'done', 600),
+            timed_row('2024-05-20 09:30:00', 'b', 'postponed', 120),
+            timed_row('2024-05-20 10:00:00', 'b', 'done', 0),
+            timed_row('2024-05-20 10:30:00', 'c', 'done', 1800, chain=''),
+            timed_row('2024-05-20 10:31:00', 'c', 'undone', 1800, chain=''),
+            timed_row('2024-05-20 11:00:00', 'd', 'done', '')]
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.history_file = os.path.join(self.data_dir, 'history.csv')
+        self.store = HistoryStore(self.history_file)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_day_metrics(self):
+        for row in self.ROWS:
+            self.store.append(row)
+        metrics = analytics.throughput(self.store.day_summary('2024-05-20'))
+        # 最早的推送为 08:50（09:00 完成、用时 600 秒）；最晚的计时操作为 10:30，抵消行和没有用时的行不计入
+        self.assertEqual(metrics['active_hours'], 100 / 60)
+        self.assertEqual((metrics['timed_count'], metrics['median_seconds_to_done']), (2, 300))
+        self.assertEqual(metrics['tasks_per_hour'], 2 / (100 / 60))
+        self.assertEqual(metrics['groups'], {'写作': {'count': 2, 'median_seconds': 300}})
+        self.assertEqual(metrics['postpone_latency'], {'count': 1, 'median_seconds': 120})
+
+    def test_zero_seconds_in_incremental_and_rebuilt_index(self):
+        self.store.day_summary('2024-05-20')
+        for row in self.ROWS:
+            self.store.append(row)
+        incremental = self.store.day_summary('2024-05-20')['timing']
+        self.assertEqual(incremental['done'], {'写作': [600, 0], '': []})
+        shutil.rmtree(self.store.index_dir)
+        rebuilt = HistoryStore(self.history_file)
+        try:
+            self.assertEqual(rebuilt.day_summary('2024-05-20')['timing'], incremental)
+        finally:
+            rebuilt.close()
+
+    def test_day_without_timing(self):
+        metrics = analytics.throughput(self.store.day_summary('2024-05-21'))
+        self.assertEqual((metrics['timed_count'], metrics['active_hours'], metrics['tasks_per_hour'],
+                          metrics['median_seconds_to_done']), (0, None, None, None))
+
+    def test_export(self):
+        for row in self.ROWS:
+            self.store.append(row)
+        rows = analytics.export_throughput(self.store, 2, date(2024, 5, 21))
+        self.assertEqual([(row['date'], row['timed_count']) for row in rows], [('2024-05-20', 2), ('2024-05-21', 0)])
+        with self.assertRaises(ValueError):
+            analytics.export_throughput(self.store, 0)
+        self.store.close()
+
+        output = io.StringIO()
+        with mock.patch.object(analytics, 'datetime') as fake_datetime, redirect_stdout(output):
+            fake_datetime.now.return_value = datetime(2024, 5, 20, 12)
+            self.assertEqual(analytics.main(['--days', '1', '--data-dir', self.data_dir]), 0)
+        self.assertEqual(json.loads(output.getvalue())['median_seconds_to_done'], 300)
+
+
+class ManagerThroughputTest(unittest.TestCase):
+    """从推送到操作的用时写入历史，今日总结中给出效率指标。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.task_manager = core.TaskManager(data_dir=self.data_dir)
+
+    def tearDown(self):
+        self.task_manager.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_elapsed_from_presentation(self):
+        self.task_manager.start_new_day("a-b")
+        with mock.patch.object(core.time, 'time', return_value=1000.0):
+            task = self.task_manager.get_next_task_info()['task']
+        with mock.patch.object(core.time, 'time', return_value=1090.0):
+            self.task_manager.complete_task(task.id)
+        # 没有被推送过的任务没有用时
+        self.task_manager.complete_task(next(t for t in self.task_manager.tasks if t.name == 'b').id)
+        rows = self.task_manager._history.read_day(self.task_manager.session_date)
+        self.assertEqual([row['elapsed'] for row in rows], ['90', ''])
+        throughput = self.task_manager.get_summary()['throughput']
+        self.assertEqual((throughput['timed_count'], throughput['median_seconds_to_done']), (1, 90))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# atomize/tests/test_display.py
+
+import io
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import display
+
+FULL_REDRAW = '\033[H\033[2J'
+
+
+class _Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+class RendererTest(unittest.TestCase):
+    """按行比较的重绘：只在屏幕内容仍与上一帧对应时才跳过未变化的行。"""
+
+    def setUp(self):
+        self.stream = _Terminal()
+        self.renderer = display._Renderer(self.stream)
+        patcher = mock.patch.object(display.shutil, 'get_terminal_size', return_value=os.terminal_size((80, 24)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def frame(self, text: str) -> str:
+        self.stream.seek(0)
+        self.stream.truncate()
+        self.renderer.new_frame()
+        self.renderer.write(text)
+        return self.stream.getvalue()
+
+    def test_unchanged_rows_are_skipped(self):
+        self.frame("标题\n任务 A\n1/3")
+        output = self.frame("标题\n任务 B\n1/3")
+        self.assertNotIn(FULL_REDRAW, output)
+        self.assertNotIn("标题", output)
+        self.assertIn("\033[2;1H\033[2K任务 B", output)
+
+    def test_output_after_frame_forces_full_redraw(self):
+        self.frame("标题\n任务 A")
+        self.renderer.write("已完成")
+        output = self.frame("标题\n任务 B")
+        self.assertTrue(output.startswith(FULL_REDRAW))
+        self.assertIn("标题", output)
+        # 整屏重绘后屏幕与帧一致，下一帧又可以只写变化的行
+        self.assertNotIn(FULL_REDRAW, self.frame("标题\n任务 C"))
+
+    def test_prompt_forces_full_redraw(self):
+        self.frame("标题\n任务 A")
+        with mock.patch.object(display, '_renderer', self.renderer), \
+                mock.patch('builtins.input', return_value='d'):
+            self.assertEqual(display.prompt("\n> "), 'd')
+        self.assertTrue(self.frame("标题\n任务 A").startswith(FULL_REDRAW))
+
+    def test_tall_frame_is_redrawn_in_full(self):
+        self.frame("a")
+        output = self.frame("\n".join(str(row) for row in range(30)))
+        self.assertTrue(output.startswith(FULL_REDRAW))
+        # 滚屏后上一帧不可信，下一帧也整屏重绘
+        self.assertIn("\033[1;1H\033[2Ka", self.frame("a"))
+
+    def test_pipe_gets_plain_text(self):
+        stream = io.StringIO()
+        renderer = display._Renderer(stream)
+        renderer.new_frame()
+        renderer.write("标题\n任务 A")
+        self.assertEqual(stream.getvalue(), "标题\n任务 A\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,234 @@
+# atomize/tests/test_events.py
+
+import os
+import sys
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import core
+import events
+from writer import BackgroundWriter
+
+PLAN = "调研 #deep(读文献-做笔记, 访谈), 写作[提纲-初稿]-校对, -整理桌面, -回复邮件"
+
+
+def snapshot(task_manager: core.TaskManager) -> tuple:
+    """会话的完整可比较状态：任务（含顺序）、专注点和推迟数。"""
+    return ([task.to_record() for task in task_manager.tasks], task_manager.total_points,
+            task_manager.postponed_today_count)
+
+
+class _ManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self._managers = []
+
+    def tearDown(self):
+        for task_manager in self._managers:
+            task_manager.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def manager(self, **kwargs) -> core.TaskManager:
+        task_manager = core.TaskManager(data_dir=self.data_dir, **kwargs)
+        self._managers.append(task_manager)
+        return task_manager
+
+    def replay_today(self, task_manager: core.TaskManager) -> dict:
+        task_manager.flush()
+        return events.replay(events.read_events(task_manager._events.path(task_manager.session_date)))
+
+
+class UndoRedoTest(_ManagerTestCase):
+    """每一种可撤销的修改：撤销后回到修改前的状态，重做后回到修改后的状态。"""
+
+    def apply(self, task_manager, op: str, task_id: str) -> dict:
+        if op == 'done':
+            return task_manager.complete_task(task_id)
+        if op == 'postpone':
+            return task_manager.postpone_task(task_id)
+        if op == 'cancel':
+            return task_manager.cancel_task(task_id)
+        if op == 'edit':
+            return task_manager.edit_task(task_id, "改名")
+        if op == 'add':
+            return task_manager.add_task_after(task_id, "新任务 #deep")
+        return task_manager.split_task(task_id, "甲-乙(丙, 丁)")
+
+    def test_inverse_round_trip(self):
+        for op in ('done', 'postpone', 'cancel', 'edit', 'add', 'split'):
+            with self.subTest(op=op):
+                task_manager = self.manager()
+                task_manager.start_new_day(PLAN)
+                # 选一个有后继的任务，拆分和添加时会改写后继的依赖
+                task = next(task for task in task_manager.tasks if task.name == '提纲')
+                before = snapshot(task_manager)
+                candidates_before = task_manager._ready_queue.candidates()
+                result = self.apply(task_manager, op, task.id)
+                self.assertTrue(result['success'], result['message'])
+                after = snapshot(task_manager)
+                candidates_after = task_manager._ready_queue.candidates()
+
+                self.assertTrue(task_manager.undo()['success'])
+                self.assertEqual(snapshot(task_manager), before)
+                self.assertEqual(task_manager._ready_queue.candidates(), candidates_before)
+                self.assertTrue(task_manager.redo()['success'])
+                self.assertEqual(snapshot(task_manager), after)
+                self.assertEqual(task_manager._ready_queue.candidates(), candidates_after)
+
+                # 撤销的结果也写进了会话日志：重新加载得到同样的状态
+                self.assertTrue(task_manager.undo()['success'])
+                task_manager.close()
+                self._managers.remove(task_manager)
+                self.assertEqual(snapshot(self.manager()), before)
+                shutil.rmtree(self.data_dir)
+
+    def test_nothing_to_undo(self):
+        task_manager = self.manager()
+        task_manager.start_new_day("a")
+        self.assertFalse(task_manager.undo()['success'])
+        self.assertFalse(task_manager.redo()['success'])
+
+    def test_new_change_clears_redo(self):
+        task_manager = self.manager()
+        task_manager.start_new_day("a, b")
+        a, b = task_manager.tasks
+        task_manager.complete_task(a.id)
+        task_manager.undo()
+        task_manager.complete_task(b.id)
+        self.assertFalse(task_manager.redo()['success'])
+
+
+class ReplayTest(_ManagerTestCase):
+    """事件流重放得到与会话相同的最终状态，并且每次推送都能用记录的种子重现。"""
+
+    def run_day(self, task_manager: core.TaskManager, rng, steps: int = 60):
+        for step in range(steps):
+            info = task_manager.get_next_task_info(rng.choice((None, None, 'deep')))
+            if info is None:
+                if not task_manager.has_active_session():
+                    return
+                continue
+            task_id = info['task'].id
+            action = rng.random()
+            if action < 0.5:
+                task_manager.complete_task(task_id)
+            elif action < 0.6:
+                task_manager.postpone_task(task_id)
+            elif action < 0.65:
+                task_manager.cancel_task(task_id)
+            elif action < 0.75:
+                task_manager.split_task(task_id, f"s{step}a-s{step}b")
+            elif action < 0.8:
+                task_manager.add_task_after(task_id, f"n{step}")
+            elif action < 0.85:
+                task_manager.edit_task(task_id, f"e{step}")
+            elif action < 0.95:
+                task_manager.undo()
+            else:
+                task_manager.redo()
+
+    def assert_replay_matches(self, task_manager: core.TaskManager) -> dict:
+        result = self.replay_today(task_manager)
+        self.assertEqual(result['mismatches'], 0)
+        if task_manager.has_active_session():
+            self.assertEqual([task.to_record() for task in result['state'].tasks],
+                             [task.to_record() for task in task_manager.tasks])
+            self.assertEqual(result['state'].total_points, task_manager.total_points)
+        else:
+            # 全部完成后会话已被清空，重放的结果中也没有待办任务
+            self.assertTrue(all(task.status != 'pending' for task in result['state'].tasks))
+        return result
+
+    def test_replay_reproduces_session_and_picks(self):
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                random.seed(seed)
+                task_manager = self.manager(weighting='postponed' if seed % 2 else None)
+                task_manager.start_new_day(PLAN)
+                self.run_day(task_manager, random.Random(seed))
+                self.assertGreater(self.assert_replay_matches(task_manager)['picks'], 0)
+                # 重新加载（就绪队列重建）之后继续推进，重放仍然一致
+                task_manager.close()
+                self._managers.remove(task_manager)
+                task_manager = self.manager(weighting='postponed' if seed % 2 else None)
+                self.run_day(task_manager, random.Random(seed + 100))
+                self.assert_replay_matches(task_manager)
+                shutil.rmtree(self.data_dir)
+
+    def test_legacy_session_gets_start_event(self):
+        """旧版本的 session.json（每个任务一个字典，没有日志和事件流）加载后补写 start 事件。"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        legacy_tasks = [
+            {'id': 'a1', 'name': '读文献', 'parent_chain': ['调研'], 'status': 'done', 'postponed_count': 0,
+             'depends_on': None, 'is_late_task': False},
+            {'id': 'a2', 'name': '做笔记', 'parent_chain': ['调研'], 'status': 'pending', 'postponed_count': 1,
+             'depends_on': 'a1', 'is_late_task': False},
+            {'id': 'a3', 'name': '整理', 'parent_chain': [], 'status': 'pending', 'postponed_count': 0,
+             'depends_on': None, 'is_late_task': True},
+        ]
+        with open(os.path.join(self.data_dir, 'session.json'), 'w', encoding='utf-8') as f:
+            json.dump({'date': today, 'tasks': legacy_tasks, 'total_points': 10, 'postponed_today_count': 1}, f)
+
+        task_manager = self.manager()
+        loaded = [task.to_record() for task in task_manager.tasks]
+        random.seed(1)
+        self.run_day(task_manager, random.Random(1))
+        stream = events.read_events(task_manager._events.path(today))
+        self.assertEqual(stream[0]['op'], 'start')
+        self.assertEqual([task.to_record() for task in events.decode_tasks(stream[0])], loaded)
+        self.assertEqual((stream[0]['total_points'], stream[0]['postponed_today_count']), (10, 1))
+        self.assertGreater(self.assert_replay_matches(task_manager)['events'], 0)
+
+    def test_existing_stream_is_not_restarted(self):
+        task_manager = self.manager()
+        task_manager.start_new_day("a, b")
+        task_manager.complete_task(task_manager.get_next_task_info()['task'].id)
+        task_manager.close()
+        self._managers.remove(task_manager)
+        task_manager = self.manager()
+        stream = events.read_events(task_manager._events.path(task_manager.session_date))
+        self.assertEqual([event['op'] for event in stream], ['start', 'done'])
+
+    def test_missing_start(self):
+        with self.assertRaises(ValueError):
+            events.replay([{'op': 'rebuild'}])
+
+
+class EventLogWriterTest(unittest.TestCase):
+    """后台写入时，每一行按提交时的日期写入对应的文件。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_day_rollover_in_one_batch(self):
+        writer = BackgroundWriter(debounce=0.5)
+        log = events.EventLog(self.data_dir, writer)
+        try:
+            log.start('2024-05-20', [])
+            log.append('2024-05-20', {'op': 'edit', 'id': 'x', 'name': '昨天', 'seq': 1})
+            # 跨天：前一天的行还在队列中，新的一天已经开始
+            log.start('2024-05-21', [])
+            log.append('2024-05-21', {'op': 'edit', 'id': 'y', 'name': '今天', 'seq': 1})
+            writer.flush()
+        finally:
+            writer.close()
+            log.close()
+        yesterday = events.read_events(log.path('2024-05-20'))
+        today = events.read_events(log.path('2024-05-21'))
+        self.assertEqual([event['op'] for event in yesterday], ['start', 'edit'])
+        self.assertEqual([event['op'] for event in today], ['start', 'edit'])
+        self.assertEqual((yesterday[0]['date'], today[0]['date']), ('2024-05-20', '2024-05-21'))
+
+
+if __name__ == '__main__':
+    unittest.main()
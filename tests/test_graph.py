@@ -0,0 +1,161 @@
+# atomize/tests/test_graph.py
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import core
+import graph
+import parser
+import run
+from model import Task
+
+
+def chain_of(*names) -> list:
+    """按顺序串联的任务：每个任务依赖前一个。"""
+    tasks = []
+    for name in names:
+        tasks.append(Task(name, depends_on=tasks[-1].id if tasks else ()))
+    return tasks
+
+
+class AnalyzeTest(unittest.TestCase):
+    """依赖图校验：环和悬空依赖。"""
+
+    def test_acyclic_plan_passes(self):
+        graph.analyze(parser.parse_task_string("调研(a,b)-写作(c-d), -整理"))
+
+    def test_cycle_raises(self):
+        tasks = chain_of('a', 'b', 'c')
+        tasks[0].depends_on = (tasks[2].id,)
+        with self.assertRaises(graph.DependencyError) as context:
+            graph.analyze(tasks)
+        for name in ('a', 'b', 'c'):
+            self.assertIn(name, str(context.exception))
+
+    def test_task_depending_on_cycle_is_reported(self):
+        tasks = chain_of('a', 'b')
+        tasks[0].depends_on = (tasks[1].id,)
+        tasks.append(Task('c', depends_on=tasks[1].id))
+        with self.assertRaises(graph.DependencyError):
+            graph.analyze(tasks)
+
+    def test_self_dependency_raises(self):
+        task = Task('a')
+        task.depends_on = (task.id,)
+        with self.assertRaises(graph.DependencyError):
+            graph.analyze([task])
+
+    def test_dangling_dependency(self):
+        tasks = [Task('a', depends_on='missing')]
+        with self.assertRaises(graph.DependencyError) as context:
+            graph.analyze(tasks)
+        self.assertIn('missing', str(context.exception))
+        # 非严格模式下视为已满足，与调度器的处理一致
+        graph.analyze(tasks, strict=False)
+
+    def test_dangling_does_not_hide_cycle(self):
+        tasks = chain_of('a', 'b')
+        tasks[0].depends_on = (tasks[1].id, 'missing')
+        with self.assertRaises(graph.DependencyError):
+            graph.analyze(tasks, strict=False)
+
+    def test_dependency_error_is_value_error(self):
+        # 调用方（batch、server）按 ValueError 处理解析和校验错误
+        self.assertTrue(issubclass(graph.DependencyError, ValueError))
+
+
+class PruneDanglingTest(unittest.TestCase):
+    """合并隔夜任务时去掉指向已不存在的任务的依赖。"""
+
+    def test_prunes_only_missing_dependencies(self):
+        done, pending = chain_of('done', 'pending')
+        later = Task('later', depends_on=(done.id, pending.id))
+        overdue = [pending, later]
+        self.assertEqual(graph.prune_dangling(overdue), 2)
+        self.assertEqual(pending.depends_on, ())
+        self.assertEqual(later.depends_on, (pending.id,))
+        graph.analyze(overdue)
+        self.assertEqual(graph.prune_dangling(overdue), 0)
+
+    def test_known_ids_are_kept(self):
+        task = Task('a', depends_on='elsewhere')
+        self.assertEqual(graph.prune_dangling([task], known_ids={'elsewhere'}), 0)
+        self.assertEqual(task.depends_on, ('elsewhere',))
+
+
+class ManagerDependencyTest(unittest.TestCase):
+    """TaskManager 合并隔夜任务、以及会话中的依赖损坏时的行为。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self._managers = []
+
+    def tearDown(self):
+        for task_manager in self._managers:
+            task_manager.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def _manager(self, name: str) -> core.TaskManager:
+        task_manager = core.TaskManager(data_dir=os.path.join(self.data_dir, name))
+        self._managers.append(task_manager)
+        return task_manager
+
+    def test_overdue_tasks_lose_finished_predecessors(self):
+        yesterday = self._manager('yesterday')
+        yesterday.start_new_day("a-b-c")
+        first = next(task for task in yesterday.tasks if task.name == 'a')
+        yesterday.complete_task(first.id)
+        overdue = [Task.from_dict(task.to_dict()) for task in yesterday.tasks if task.status == 'pending']
+
+        today = self._manager('today')
+        today.start_new_day("x", overdue)
+        b = next(task for task in today.tasks if task.name == 'b')
+        c = next(task for task in today.tasks if task.name == 'c')
+        self.assertEqual(b.depends_on, ())
+        self.assertEqual(c.depends_on, (b.id,))
+        self.assertEqual(today._ready_queue.candidates(), {b.id, next(t.id for t in today.tasks if t.name == 'x')})
+
+    def test_cyclic_merge_keeps_previous_session(self):
+        today = self._manager('today')
+        today.start_new_day("keep")
+        overdue = chain_of('a', 'b')
+        overdue[0].depends_on = (overdue[1].id,)
+        with self.assertRaises(graph.DependencyError):
+            today.start_new_day("x", overdue)
+        self.assertEqual([task.name for task in today.tasks], ['keep'])
+
+    def _broken_manager(self) -> core.TaskManager:
+        """会话中的任务互相依赖，就绪队列为空但仍有待办任务。"""
+        task_manager = self._manager('broken')
+        task_manager.start_new_day("a-b")
+        a, b = task_manager.tasks
+        a.depends_on = (b.id,)
+        task_manager._ready_queue.rebuild(task_manager.tasks)
+        return task_manager
+
+    def test_get_next_task_info_raises_on_cycle(self):
+        task_manager = self._broken_manager()
+        with self.assertRaises(graph.DependencyError):
+            task_manager.get_next_task_info()
+        # 按标签筛选时只是没有可执行的任务
+        self.assertIsNone(task_manager.get_next_task_info('deep'))
+
+    def test_execution_loop_reports_cycle_instead_of_crashing(self):
+        task_manager = self._broken_manager()
+        with mock.patch.object(run.display, 'show_message') as show_message, \
+                mock.patch.object(run.time, 'sleep'), \
+                mock.patch('builtins.input', side_effect=AssertionError("不应再等待输入")):
+            run.run_execution_loop(task_manager)
+        message, = show_message.call_args.args
+        self.assertIn("无法继续执行", message)
+        self.assertTrue(show_message.call_args.kwargs['is_warning'])
+
+
+if __name__ == '__main__':
+    unittest.main()
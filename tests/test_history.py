@@ -0,0 +1,294 @@
+# atomize/tests/test_history.py
+
+import os
+import sys
+import csv
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import history
+from history import HistoryStore
+
+
+def row(timestamp: str, name: str, status: str = 'done', points: int = 2, tags: str = '', chain: str = '',
+        elapsed=60) -> dict:
+    return {'timestamp': timestamp, 'task_name': name, 'parent_chain': chain, 'status': status,
+            'was_postponed': 'no', 'focus_points': points, 'tags': tags, 'elapsed': elapsed}
+
+
+class _HistoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.history_file = os.path.join(self.data_dir, 'history.csv')
+        self._stores = []
+
+    def tearDown(self):
+        for store in self._stores:
+            store.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def store(self) -> HistoryStore:
+        store = HistoryStore(self.history_file)
+        self._stores.append(store)
+        return store
+
+    def summaries(self, store: HistoryStore, days, weeks, months) -> dict:
+        result = {}
+        for period, keys in (('day', days), ('week', weeks), ('month', months)):
+            for key in keys:
+                result[period, key] = store.period_summary(period, key)
+                result[period, key, 'deep'] = store.period_summary(period, key, 'deep')
+        return result
+
+
+class MonthlyIndexTest(_HistoryTestCase):
+    """按月份存放的索引：只重写有变化的月份，跨月的周由两个月的部分合并。"""
+
+    # 2024-W18 从 4 月 29 日到 5 月 5 日，跨越两个分区
+    ROWS = [row('2024-04-10 09:00:00', 'a', chain='写作'),
+            row('2024-04-29 09:00:00', 'b', tags='deep'),
+            row('2024-04-30 10:00:00', 'c', status='skipped'),
+            row('2024-05-02 11:00:00', 'd', tags='deep', points=3),
+            row('2024-05-02 12:00:00', 'd', status='undone', tags='deep', points=3),
+            row('2024-05-03 13:00:00', 'e', chain='写作', elapsed=0),
+            row('2024-05-10 14:00:00', 'f')]
+    KEYS = (['2024-04-29', '2024-05-02', '2024-05-03'], ['2024-W15', '2024-W18', '2024-W19'],
+            ['2024-04', '2024-05'])
+
+    def index_files(self, store: HistoryStore) -> dict:
+        return {name: os.stat(os.path.join(store.index_dir, name)) for name in os.listdir(store.index_dir)}
+
+    def test_only_changed_month_is_rewritten(self):
+        store = self.store()
+        for item in self.ROWS:
+            store.append(item)
+        store.period_summary('month', '2024-05')
+        before = self.index_files(store)
+        self.assertEqual(sorted(before), ['2024-04.json', '2024-05.json'])
+
+        store.append(row('2024-05-11 09:00:00', 'g'))
+        self.assertEqual(store.day_summary('2024-05-11')['done'], 1)
+        after = self.index_files(store)
+        self.assertEqual((after['2024-04.json'].st_ino, after['2024-04.json'].st_mtime_ns),
+                         (before['2024-04.json'].st_ino, before['2024-04.json'].st_mtime_ns))
+        self.assertNotEqual(after['2024-05.json'].st_ino, before['2024-05.json'].st_ino)
+
+        # 没有新行时不写入
+        store.period_summary('week', '2024-W19')
+        self.assertEqual({name: st.st_ino for name, st in self.index_files(store).items()},
+                         {name: st.st_ino for name, st in after.items()})
+
+    def test_week_across_months(self):
+        store = self.store()
+        for item in self.ROWS:
+            store.append(item)
+        week = store.period_summary('week', '2024-W18')
+        self.assertEqual((week['rows'], week['done'], week['skipped'], week['points']), (3, 2, 1, 4))
+        self.assertEqual(week['groups'], {'': [1, 2], '写作': [1, 2]})
+        self.assertEqual(store.period_summary('week', '2024-W18', 'deep'),
+                         {'rows': 1, 'done': 1, 'skipped': 0, 'points': 2, 'postponed_rows': 0})
+        self.assertEqual(store.period_summary('month', '2024-04')['done'], 2)
+        self.assertEqual(store.period_summary('month', '2024-06'), history._new_bucket())
+
+    def test_incremental_matches_rebuilt(self):
+        store = self.store()
+        # 索引已加载后追加的行走增量更新；另一个进程追加的行在下次加载时补扫
+        store.period_summary('day', '2024-04-01')
+        for item in self.ROWS[:4]:
+            store.append(item)
+        other = self.store()
+        for item in self.ROWS[4:]:
+            other.append(item)
+        incremental = self.summaries(store, *self.KEYS)
+
+        shutil.rmtree(store.index_dir)
+        rebuilt = self.summaries(self.store(), *self.KEYS)
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(self.store().day_summary('2024-05-03')['timing']['done'], {'写作': [0]})
+
+    def test_corrupt_month_is_rebuilt_alone(self):
+        store = self.store()
+        for item in self.ROWS:
+            store.append(item)
+        expected = self.summaries(store, *self.KEYS)
+        april = os.stat(store._index_path('2024-04'))
+        with open(store._index_path('2024-05'), 'w', encoding='utf-8') as f:
+            f.write('{"version"')
+        fresh = self.store()
+        self.assertEqual(self.summaries(fresh, *self.KEYS), expected)
+        self.assertEqual(os.stat(store._index_path('2024-04')).st_ino, april.st_ino)
+        with open(store._index_path('2024-05'), 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['version'], history.INDEX_VERSION)
+
+    def test_legacy_index_file_is_removed(self):
+        legacy_file = os.path.join(self.data_dir, 'history.idx.json')
+        with open(legacy_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': 5, 'partitions': {}, 'days': {}, 'weeks': {}, 'months': {}}, f)
+        store = self.store()
+        store.append(self.ROWS[0])
+        self.assertEqual(store.day_summary('2024-04-10')['done'], 1)
+        self.assertFalse(os.path.exists(legacy_file))
+
+
+class DayIndexTest(_HistoryTestCase):
+    """按天汇总的索引：查询只读索引，明细只读取那一天的字节范围，新行只补扫新增部分。"""
+
+    ROWS = [row('2024-05-01 09:00:00', 'a', tags='deep'),
+            dict(row('2024-05-02 09:00:00', 'b', status='postponed'), was_postponed='yes'),
+            dict(row('2024-05-02 10:00:00', 'b', points=3), was_postponed='yes'),
+            row('2024-05-02 11:00:00', 'c', status='skipped', elapsed=''),
+            row('2024-05-03 09:00:00', 'd')]
+
+    def test_day_summary(self):
+        store = self.store()
+        for item in self.ROWS:
+            store.append(item)
+        day = store.day_summary('2024-05-02')
+        # 推迟行只计入计时和推迟列表
+        self.assertEqual((day['rows'], day['done'], day['skipped'], day['points'], day['postponed_rows']),
+                         (2, 1, 1, 3, 1))
+        self.assertEqual(day['postponed'], ['b'])
+        self.assertEqual(day['timing']['done'], {'': [60]})
+        self.assertEqual(day['timing']['postpone'], [60])
+        self.assertEqual(store.day_summary('2024-05-04')['rows'], 0)
+        self.assertEqual(store.period_summary('day', '2024-05-01', 'deep')['done'], 1)
+
+    def test_read_day(self):
+        store = self.store()
+        for item in self.ROWS:
+            store.append(item)
+        rows = store.read_day('2024-05-02')
+        self.assertEqual([(item['task_name'], item['status']) for item in rows],
+                         [('b', 'postponed'), ('b', 'done'), ('c', 'skipped')])
+        self.assertEqual(rows[1]['focus_points'], '3')
+        self.assertEqual(store.read_day('2024-05-04'), [])
+        self.assertEqual(store.read_day('2023-01-01'), [])
+
+    def test_catch_up_scans_only_new_rows(self):
+        store = self.store()
+        for item in self.ROWS[:3]:
+            store.append(item)
+        store.day_summary('2024-05-01')
+        store.close()
+        other = self.store()
+        for item in self.ROWS[3:]:
+            other.append(item)
+        with mock.patch.object(history, '_index_row', wraps=history._index_row) as index_row:
+            day = self.store().day_summary('2024-05-03')
+        self.assertEqual(index_row.call_count, 2)
+        self.assertEqual(day['done'], 1)
+
+    def test_old_header_is_upgraded(self):
+        """当月分区缺少新增的列时，写入前先补全表头，旧行的新列为空。"""
+        partition_dir = os.path.join(self.data_dir, 'history')
+        os.makedirs(partition_dir)
+        with open(os.path.join(partition_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({'version': history.MANIFEST_VERSION,
+                       'partitions': {'2024-05': history._new_partition('2024-05', compressed=False)}}, f)
+        with open(os.path.join(partition_dir, '2024-05.csv'), 'w', encoding='utf-8', newline='') as f:
+            f.write("timestamp,task_name,parent_chain,status,was_postponed,focus_points\r\n"
+                    "2024-05-01 09:00:00,旧任务,,done,no,2\r\n")
+        store = self.store()
+        self.assertEqual(store.day_summary('2024-05-01')['points'], 2)
+        store.append(self.ROWS[0])
+        with open(os.path.join(partition_dir, '2024-05.csv'), 'r', encoding='utf-8') as f:
+            self.assertEqual(f.readline().strip().split(','), history.HISTORY_FIELDS)
+        rows = store.read_day('2024-05-01')
+        self.assertEqual([(item['task_name'], item['tags'] or '') for item in rows], [('旧任务', ''), ('a', 'deep')])
+        self.assertEqual(store.day_summary('2024-05-01')['points'], 4)
+
+
+class PartitionTest(_HistoryTestCase):
+    """按月分区：进入新月份后压缩旧分区，迟到的行追加到压缩分区，旧版的单个文件一次性迁移。"""
+
+    def partition_file(self, name: str) -> str:
+        return os.path.join(self.data_dir, 'history', name)
+
+    def test_new_month_compresses_previous_partition(self):
+        store = self.store()
+        store.append(row('2024-04-10 09:00:00', 'a'))
+        store.append(row('2024-04-12 09:00:00', 'b'))
+        self.assertFalse(store.partitions()['2024-04']['compressed'])
+        store.append(row('2024-05-01 09:00:00', 'c'))
+
+        partitions = store.partitions()
+        april = partitions['2024-04']
+        self.assertEqual((april['file'], april['compressed'], april['rows'], april['first'], april['last']),
+                         ('2024-04.csv.gz', True, 2, '2024-04-10', '2024-04-12'))
+        self.assertFalse(os.path.exists(self.partition_file('2024-04.csv')))
+        with gzip.open(self.partition_file('2024-04.csv.gz'), 'rt', encoding='utf-8', newline='') as f:
+            content = f.read()
+        self.assertEqual(len(content.encode('utf-8')), april['bytes'])
+        self.assertEqual([item['task_name'] for item in csv.DictReader(content.splitlines())], ['a', 'b'])
+        self.assertEqual(partitions['2024-05']['file'], '2024-05.csv')
+        self.assertEqual([item['task_name'] for item in store.read_day('2024-04-12')], ['b'])
+
+    def test_late_rows_go_to_the_archive(self):
+        store = self.store()
+        store.append(row('2024-04-10 09:00:00', 'a'))
+        store.append(row('2024-05-01 09:00:00', 'b'))
+        self.assertEqual(store.period_summary('month', '2024-04')['done'], 1)
+        store.append(row('2024-04-30 23:59:00', '迟到'))
+        store.append(row('2024-03-31 09:00:00', '更早'))
+
+        partitions = store.partitions()
+        self.assertEqual((partitions['2024-04']['rows'], partitions['2024-04']['last']), (2, '2024-04-30'))
+        self.assertEqual((partitions['2024-03']['file'], partitions['2024-03']['rows']), ('2024-03.csv.gz', 1))
+        self.assertEqual(store.period_summary('month', '2024-04')['done'], 2)
+        self.assertEqual([item['task_name'] for item in store.read_day('2024-04-30')], ['迟到'])
+        # 重建的索引与增量更新的一致
+        expected = self.summaries(store, ['2024-03-31', '2024-04-30'], ['2024-W13', '2024-W18'],
+                                  ['2024-03', '2024-04', '2024-05'])
+        shutil.rmtree(store.index_dir)
+        self.assertEqual(self.summaries(self.store(), ['2024-03-31', '2024-04-30'], ['2024-W13', '2024-W18'],
+                                        ['2024-03', '2024-04', '2024-05']), expected)
+
+    def test_legacy_history_is_split_on_first_use(self):
+        today = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        legacy_rows = [row('2024-04-10 09:00:00', 'a'), row('2024-04-11 09:00:00', 'b', tags='deep'),
+                       row('2024-05-02 09:00:00', 'c'), row(today, '今天')]
+        # 旧版的表头没有 tags 和 elapsed 列
+        fields = history.HISTORY_FIELDS[:6]
+        with open(self.history_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            for item in legacy_rows:
+                writer.writerow([item[name] for name in fields])
+
+        store = self.store()
+        partitions = store.partitions()
+        self.assertEqual(sorted(partitions), ['2024-04', '2024-05', today[:7]])
+        self.assertEqual([partitions[month]['compressed'] for month in ('2024-04', '2024-05', today[:7])],
+                         [True, True, False])
+        self.assertTrue(os.path.exists(self.history_file + '.bak'))
+        self.assertFalse(os.path.exists(self.history_file))
+        self.assertEqual(store.period_summary('month', '2024-04')['done'], 2)
+        self.assertEqual(store.day_summary(today[:10])['done'], 1)
+        self.assertEqual(store.read_day('2024-04-11')[0]['tags'], '')
+
+    def test_split_history_into_existing_partitions(self):
+        store = self.store()
+        store.append(row('2024-04-10 09:00:00', 'a'))
+        store.append(row('2024-05-01 09:00:00', 'b'))
+        store.day_summary('2024-04-10')
+        store.close()
+        with open(self.history_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(history.HISTORY_FIELDS)
+            writer.writerow([row('2024-04-20 09:00:00', '补充')[name] for name in history.HISTORY_FIELDS])
+        self.assertEqual(history.split_history(self.history_file, keep=False), {'2024-04': 1})
+        self.assertFalse(os.path.exists(self.history_file))
+        self.assertFalse(os.path.exists(store.index_dir))
+        self.assertEqual(self.store().period_summary('month', '2024-04')['done'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+# atomize/tests/test_journal.py
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import core
+import journal
+import parser
+from journal import SessionJournal, SessionState, apply_record
+
+PLAN = "调研(读文献-做笔记, 访谈), 写作[提纲-初稿]-校对, -整理桌面"
+
+
+def snapshot(session) -> tuple:
+    return ([task.to_record() for task in session.tasks], session.total_points, session.postponed_today_count)
+
+
+class _JournalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.session_file = os.path.join(self.data_dir, 'session.json')
+        self.journal_file = os.path.join(self.data_dir, 'session.journal')
+        self._managers = []
+
+    def tearDown(self):
+        for task_manager in self._managers:
+            task_manager.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def manager(self) -> core.TaskManager:
+        task_manager = core.TaskManager(data_dir=self.data_dir)
+        self._managers.append(task_manager)
+        return task_manager
+
+    def reopen(self, task_manager: core.TaskManager) -> core.TaskManager:
+        task_manager.close()
+        self._managers.remove(task_manager)
+        return self.manager()
+
+    def work(self, task_manager: core.TaskManager):
+        """完成、推迟、改名、拆分各一次。"""
+        by_name = {task.name: task for task in task_manager.tasks}
+        self.assertTrue(task_manager.complete_task(by_name['读文献'].id)['success'])
+        self.assertTrue(task_manager.postpone_task(by_name['访谈'].id)['success'])
+        self.assertTrue(task_manager.edit_task(by_name['整理桌面'].id, "整理书架")['success'])
+        self.assertTrue(task_manager.split_task(by_name['提纲'].id, "列要点-排顺序")['success'])
+
+
+class ReplayTest(_JournalTestCase):
+    """修改只追加到日志，重新加载时由快照和日志恢复出同样的会话。"""
+
+    def test_actions_append_without_rewriting_snapshot(self):
+        task_manager = self.manager()
+        task_manager.start_new_day(PLAN)
+        before = os.stat(self.session_file)
+        self.work(task_manager)
+        expected = snapshot(task_manager)
+        after = os.stat(self.session_file)
+        self.assertEqual((after.st_ino, after.st_mtime_ns), (before.st_ino, before.st_mtime_ns))
+        with open(self.journal_file, 'rb') as f:
+            self.assertEqual(len(f.read().splitlines()), 4)
+        self.assertEqual(snapshot(self.reopen(task_manager)), expected)
+
+    def test_torn_last_record_is_truncated(self):
+        task_manager = self.manager()
+        task_manager.start_new_day(PLAN)
+        self.work(task_manager)
+        expected = snapshot(task_manager)
+        task_manager.close()
+        valid_size = os.path.getsize(self.journal_file)
+        # 崩溃时写了一半的记录
+        with open(self.journal_file, 'ab') as f:
+            f.write('{"op":"edit","id":"x","name":"半'.encode('utf-8'))
+
+        self._managers.remove(task_manager)
+        task_manager = self.manager()
+        self.assertEqual(snapshot(task_manager), expected)
+        self.assertEqual(os.path.getsize(self.journal_file), valid_size)
+        # 之后追加的记录不会和残留的半行粘在一起
+        task = next(task for task in task_manager.tasks if task.name == '做笔记')
+        self.assertTrue(task_manager.complete_task(task.id)['success'])
+        expected = snapshot(task_manager)
+        self.assertEqual(snapshot(self.reopen(task_manager)), expected)
+
+    def test_compaction_rewrites_snapshot_and_clears_journal(self):
+        with mock.patch.object(journal, 'COMPACT_MIN_BYTES', 0):
+            task_manager = self.manager()
+            task_manager.start_new_day("a, b")
+            task = next(iter(task_manager.tasks))
+            for i in range(20):
+                task_manager.edit_task(task.id, f"改名{i}" * 10)
+                if not os.path.exists(self.journal_file):
+                    break
+            else:
+                self.fail("日志没有被压缩")
+            expected = snapshot(task_manager)
+            self.assertEqual(snapshot(self.reopen(task_manager)), expected)
+
+    def test_records_in_snapshot_are_not_replayed_again(self):
+        """快照已替换、日志还没删除时崩溃：序号不大于快照的记录被跳过。"""
+        session = SessionState('2024-05-20', parser.parse_task_string("a, b"))
+        session_journal = SessionJournal(self.session_file)
+        try:
+            session_journal.write_snapshot(session)
+            record = {'op': 'done', 'id': next(iter(session.tasks)).id, 'points': 2}
+            apply_record(session, record)
+            session_journal.append(record, session)
+            with open(self.journal_file, 'rb') as f:
+                stale_journal = f.read()
+            session_journal.write_snapshot(session)
+            with open(self.journal_file, 'wb') as f:
+                f.write(stale_journal)
+            state = session_journal.load()
+        finally:
+            session_journal.close()
+        self.assertEqual(state.total_points, 2)
+        self.assertEqual([task.status for task in state.tasks], ['done', 'pending'])
+
+    def test_corrupt_snapshot_is_kept_aside(self):
+        with open(self.session_file, 'w', encoding='utf-8') as f:
+            f.write('{"date": "2024-')
+        session_journal = SessionJournal(self.session_file)
+        try:
+            self.assertIsNone(session_journal.load())
+        finally:
+            session_journal.close()
+        self.assertTrue(os.path.exists(self.session_file + '.corrupt'))
+        self.assertFalse(os.path.exists(self.session_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
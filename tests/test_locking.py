@@ -0,0 +1,174 @@
+# atomize/tests/test_locking.py
+
+import io
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import core
+import history
+from locking import FileLock
+from history import HistoryStore
+
+
+class FileLockTest(unittest.TestCase):
+    """可重入，不同实例（相当于不同进程）之间互斥。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.data_dir, 'test.lock')
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_reentrant(self):
+        lock = FileLock(self.path)
+        with lock:
+            with lock:
+                self.assertEqual(lock._depth, 2)
+            self.assertEqual(lock._depth, 1)
+        lock.close()
+        self.assertIsNone(lock._fd)
+
+    def test_instances_exclude_each_other(self):
+        first, second = FileLock(self.path), FileLock(self.path)
+        acquired = threading.Event()
+
+        def contend():
+            with second:
+                acquired.set()
+
+        with first:
+            thread = threading.Thread(target=contend)
+            thread.start()
+            self.assertFalse(acquired.wait(0.2))
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+        first.close()
+        second.close()
+
+
+class _ManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self._managers = []
+
+    def tearDown(self):
+        for task_manager in self._managers:
+            task_manager.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def manager(self, **kwargs) -> core.TaskManager:
+        task_manager = core.TaskManager(data_dir=self.data_dir, **kwargs)
+        self._managers.append(task_manager)
+        return task_manager
+
+    @staticmethod
+    def statuses(task_manager: core.TaskManager) -> dict:
+        return {task.name: task.status for task in task_manager.tasks}
+
+
+class ConcurrentManagersTest(_ManagerTestCase):
+    """两个 TaskManager（相当于两个终端）共用同一个数据目录。"""
+
+    def test_changes_are_merged(self):
+        first = self.manager()
+        first.start_new_day("a, b, c")
+        second = self.manager()
+        ids = {task.name: task.id for task in second.tasks}
+        self.assertTrue(first.complete_task(ids['a'])['success'])
+        self.assertTrue(second.complete_task(ids['b'])['success'])
+        self.assertTrue(first.edit_task(ids['c'], "c2")['success'])
+        # 没有修改的一方在读取前合并
+        first.revalidate()
+        second.revalidate()
+        expected = {'a': 'done', 'b': 'done', 'c2': 'pending'}
+        self.assertEqual(self.statuses(first), expected)
+        self.assertEqual(self.statuses(second), expected)
+        self.assertEqual(first.total_points, second.total_points)
+        self.assertEqual(self.statuses(self.manager()), expected)
+        self.assertEqual(first.get_summary()['completed_count'], 2)
+
+    def test_conflicting_change_is_rejected(self):
+        first = self.manager()
+        first.start_new_day("a, b")
+        second = self.manager()
+        task_id = next(task.id for task in first.tasks if task.name == 'a')
+        self.assertTrue(first.complete_task(task_id)['success'])
+        result = second.cancel_task(task_id)
+        self.assertFalse(result['success'])
+        self.assertEqual(result['message'], core.CONFLICT_MESSAGE)
+        self.assertEqual(self.statuses(second)['a'], 'done')
+
+    def test_new_day_replaces_session_elsewhere(self):
+        first = self.manager()
+        first.start_new_day("a, b")
+        second = self.manager()
+        first.start_new_day("x")
+        second.revalidate()
+        self.assertEqual(self.statuses(second), {'x': 'pending'})
+
+
+class RegressionTest(_ManagerTestCase):
+
+    def test_new_day_with_write_behind_does_not_deadlock(self):
+        task_manager = self.manager(write_behind=True)
+        errors = []
+
+        def start_days():
+            try:
+                for i in range(3):
+                    task_manager.start_new_day(f"第{i}天-收尾")
+                    task_manager.complete_task(task_manager.get_next_task_info()['task'].id)
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=start_days, daemon=True)
+        thread.start()
+        thread.join(20)
+        if thread.is_alive():
+            # 已经卡住的实例无法关闭，不交给 tearDown
+            self._managers.remove(task_manager)
+            self.fail("start_new_day 与后台写入线程互相等待")
+        self.assertEqual(errors, [])
+        task_manager.flush()
+        self.assertEqual(self.statuses(self.manager()), {'第2天': 'done', '收尾': 'pending'})
+
+    def test_journal_is_appended_in_binary(self):
+        """日志按字节计算长度：以文本模式追加时（Windows 上换行变为 \\r\\n）长度会对不上。"""
+        task_manager = self.manager()
+        task_manager.start_new_day("读书, 写作")
+        for task in list(task_manager.tasks):
+            task_manager.edit_task(task.id, task.name + "（改）")
+        session_journal = task_manager._journal
+        self.assertNotIsInstance(session_journal._fp, io.TextIOBase)
+        self.assertEqual(os.path.getsize(session_journal.journal_file), session_journal._journal_bytes)
+        self.assertFalse(session_journal.changed())
+
+    def test_index_is_saved_under_lock(self):
+        store = HistoryStore(os.path.join(self.data_dir, 'history.csv'))
+        held = []
+
+        def write(path, data):
+            held.append(store.lock._depth > 0)
+            return 0
+
+        try:
+            store.append({'timestamp': '2024-05-01 09:00:00', 'task_name': 'a', 'status': 'done'})
+            with mock.patch.object(history, 'atomic_write_json', side_effect=write):
+                store.day_summary('2024-05-01')
+        finally:
+            store.close()
+        self.assertTrue(held)
+        self.assertTrue(all(held))
+
+
+if __name__ == '__main__':
+    unittest.main()
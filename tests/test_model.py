@@ -0,0 +1,79 @@
+# atomize/tests/test_model.py
+
+import gc
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import model
+import parser
+from model import ROOT, Task, intern_tags
+
+
+class GroupTreeTest(unittest.TestCase):
+    """进程内共享的分组树：同名分组只创建一次，没有任务使用后随之释放。"""
+
+    def test_same_path_shares_group(self):
+        first = parser.parse_task_string("共享分组(a, 子组[b])")
+        second = parser.parse_task_string("共享分组(c, 子组[d])")
+        self.assertIs(first[0].group, second[0].group)
+        self.assertIs(first[1].group, second[1].group)
+        self.assertEqual(first[1].parent_chain, ('共享分组', '子组'))
+        self.assertIs(ROOT.descend(('共享分组', '子组')), first[1].group)
+
+    def test_unused_groups_are_released(self):
+        tasks = parser.parse_task_string("临时分组(a, 子组[b])")
+        self.assertIn('临时分组', ROOT._children)
+        del tasks
+        gc.collect()
+        self.assertNotIn('临时分组', ROOT._children)
+        # 释放后可以重新创建
+        self.assertEqual(parser.parse_task_string("临时分组(c)")[0].path(), '临时分组')
+
+    def test_group_kept_alive_by_descendants(self):
+        task = parser.parse_task_string("外层(内层[a])")[0]
+        gc.collect()
+        self.assertIs(ROOT.descend(('外层',)), task.group.parent)
+
+    def test_concurrent_child_creation(self):
+        parent = ROOT.child('并发')
+        barrier = threading.Barrier(8)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append([parent.child(f"子{i}") for i in range(200)])
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for nodes in results[1:]:
+            self.assertTrue(all(a is b for a, b in zip(nodes, results[0])))
+
+
+class InternTagsTest(unittest.TestCase):
+    """标签组合的共享与释放。"""
+
+    def test_equal_tag_sets_are_shared(self):
+        first = Task('a', tags=['共享', '标签'])
+        second = Task('b', tags=('标签', '共享'))
+        self.assertIs(first.tags, second.tags)
+        self.assertIs(intern_tags([]), model.NO_TAGS)
+
+    def test_unused_tag_sets_are_released(self):
+        key = frozenset(['一次性标签'])
+        task = Task('a', tags=key)
+        self.assertIn(key, model._tag_sets)
+        del task
+        key = None
+        gc.collect()
+        self.assertNotIn(frozenset(['一次性标签']), model._tag_sets)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# atomize/tests/test_parser.py
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import parser
+from tests import legacy_parser
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+# README 和 DSL_eg.txt 中的规划示例
+EXAMPLES = [
+    "社会统计(第四章学完-第四章课后习题-制卡),英语(阅读[做题-分析],墨墨背单词),-整理桌面,-回复邮件",
+    "工作(项目A[规划-开发], 项目B), -学习",
+    "任务A, 任务B",
+    "任务A-任务B",
+    "项目A(子任务1, 子任务2)",
+    "-任务C, -项目B(x)",
+]
+FUZZ_SEED = 0
+FUZZ_CASES = 200000
+# 随机字符串的字母表：旧解析器支持的全部语法（标签和权重是之后新增的，不在其中）
+FUZZ_ALPHABET = ['a', 'b', ' ', '-', '-', ',', ',', '(', ')', '[', ']', 'c d']
+
+
+def _normalize(tasks) -> list:
+    """把两种解析结果统一为可比较的形式：依赖写成任务在列表中的下标，不比较随机生成的 id。"""
+    rows = [task if isinstance(task, dict) else task.to_dict() for task in tasks]
+    index = {row['id']: i for i, row in enumerate(rows)}
+    normalized = []
+    for row in rows:
+        depends_on = row['depends_on']
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        normalized.append((row['name'], list(row['parent_chain']), row['status'], row['postponed_count'],
+                           tuple(index[dep] for dep in depends_on or ()), bool(row['is_late_task'])))
+    return normalized
+
+
+def _parse(module, text: str):
+    try:
+        return _normalize(module.parse_task_string(text))
+    except ValueError:
+        return None
+
+
+class ParserEquivalenceTest(unittest.TestCase):
+    """单遍解析器对旧解析器能接受的输入给出完全相同的结果。"""
+
+    def assert_same(self, text: str):
+        expected = _parse(legacy_parser, text)
+        if expected is not None:
+            self.assertEqual(_parse(parser, text), expected, text)
+
+    def test_examples(self):
+        with open(os.path.join(ROOT_DIR, 'DSL_eg.txt'), 'r', encoding='utf-8') as f:
+            examples = EXAMPLES + [f.read().strip()]
+        for text in examples:
+            self.assertIsNotNone(_parse(legacy_parser, text), text)
+            self.assert_same(text)
+
+    def test_fuzz(self):
+        rng = random.Random(FUZZ_SEED)
+        for _ in range(FUZZ_CASES):
+            self.assert_same(''.join(rng.choice(FUZZ_ALPHABET) for _ in range(rng.randint(0, 14))))
+
+    def test_deep_nesting(self):
+        # 旧解析器逐层递归，新解析器用显式的栈，不受递归深度限制
+        text = 'a(' * 2000 + 'x' + ')' * 2000
+        tasks = parser.parse_task_string(text)
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(len(tasks[0].parent_chain), 2000)
+
+    def test_errors_carry_position(self):
+        with self.assertRaises(parser.ParseError) as caught:
+            parser.parse_task_string("a(b,c")
+        self.assertIsInstance(caught.exception, ValueError)
+        self.assertEqual(caught.exception.position, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
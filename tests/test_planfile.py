@@ -0,0 +1,121 @@
+# atomize/tests/test_planfile.py
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import core
+import parser
+import planfile
+from planfile import parse_plan_file
+
+PLAN_LINES = ["调研 #deep(读文献-做笔记, 访谈), 写作[提纲-初稿]-校对",
+              "-整理桌面, 英语*2(单词, 听力)",
+              "",
+              "回复邮件"]
+
+
+def describe(tasks) -> list:
+    index = {task.id: i for i, task in enumerate(tasks)}
+    return [(task.name, task.parent_chain, sorted(index[dep] for dep in task.depends_on), task.is_late_task,
+             task.weight, sorted(task.tags)) for task in tasks]
+
+
+class ParsePlanFileTest(unittest.TestCase):
+    """按片段流式解析：结果与一次性解析相同，出错的片段单独跳过。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.data_dir, 'plan.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def write(self, text: str, encoding: str = 'utf-8'):
+        with open(self.path, 'w', encoding=encoding, newline='') as f:
+            f.write(text)
+
+    def test_matches_whole_string_parse(self):
+        self.write("\n".join(PLAN_LINES) + "\n")
+        expected = describe(parser.parse_task_string(",".join(line for line in PLAN_LINES if line)))
+        # 很小的块会把多字节字符切开
+        for chunk_bytes in (planfile.CHUNK_BYTES, 5, 1):
+            with self.subTest(chunk_bytes=chunk_bytes):
+                tasks, errors = parse_plan_file(self.path, chunk_bytes=chunk_bytes)
+                self.assertEqual(errors, [])
+                # 一次性解析把末尾任务统一排到最后，逐片段解析保持文件中的顺序
+                self.assertEqual(describe(sorted(tasks, key=lambda task: task.is_late_task)), expected)
+
+    def test_byte_order_mark_and_crlf(self):
+        self.write("a-b\r\nc", encoding='utf-8-sig')
+        tasks, errors = parse_plan_file(self.path)
+        self.assertEqual(errors, [])
+        self.assertEqual([task.name for task in tasks], ['a', 'b', 'c'])
+
+    def test_bad_segments_are_skipped(self):
+        self.write("a, b(c\n坏)-d\ne, f[g]h\n好(x, y)")
+        tasks, errors = parse_plan_file(self.path)
+        # 未闭合的括号只影响所在的行
+        self.assertEqual([task.name for task in tasks], ['a', 'e', 'x', 'y'])
+        self.assertEqual([error['line'] for error in errors], [1, 2, 3])
+        self.assertTrue(all(error['message'] for error in errors))
+
+    def test_overlong_segment(self):
+        self.write("a, " + "长" * 50 + ", b\nc")
+        tasks, errors = parse_plan_file(self.path, chunk_bytes=7, max_segment_chars=20)
+        self.assertEqual([task.name for task in tasks], ['a', 'c'])
+        self.assertEqual([error['line'] for error in errors], [1])
+        self.assertIn('20', errors[0]['message'])
+
+    def test_progress(self):
+        self.write(",".join(f"任务{i}" for i in range(10)))
+        calls = []
+        with mock.patch.object(planfile, 'PROGRESS_EVERY', 3):
+            tasks, _ = parse_plan_file(self.path, lambda *args: calls.append(args), chunk_bytes=8)
+        total = os.path.getsize(self.path)
+        self.assertEqual([parsed for _, _, parsed in calls], [3, 6, 9, 10])
+        self.assertEqual(calls[-1], (total, total, 10))
+        self.assertEqual([done for done, _, _ in calls], sorted(done for done, _, _ in calls))
+        self.assertTrue(all(done <= total for done, _, _ in calls))
+
+
+class ImportPlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.task_manager = core.TaskManager(data_dir=self.data_dir)
+
+    def tearDown(self):
+        self.task_manager.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_import_with_errors(self):
+        path = os.path.join(self.data_dir, 'plan.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("a-b\nc(\nd")
+        result = self.task_manager.import_plan(path)
+        self.assertTrue(result['success'], result['message'])
+        self.assertEqual((result['total_num'], [error['line'] for error in result['errors']]), (3, [2]))
+        reloaded = core.TaskManager(data_dir=self.data_dir)
+        try:
+            self.assertEqual([task.name for task in reloaded.tasks], ['a', 'b', 'd'])
+        finally:
+            reloaded.close()
+
+    def test_nothing_to_import(self):
+        path = os.path.join(self.data_dir, 'plan.txt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n\n(\n")
+        result = self.task_manager.import_plan(path)
+        self.assertFalse(result['success'])
+        self.assertEqual(len(result['errors']), 1)
+        self.assertFalse(self.task_manager.import_plan(os.path.join(self.data_dir, 'missing.txt'))['success'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+# atomize/tests/test_scheduler.py
+
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import core
+import parser
+from model import Task
+from scheduler import ReadyQueue
+
+SEEDS = range(20)
+TAGS = ('a', 'b')
+# 每个随机场景中随机操作的次数，之后逐个完成剩下的任务
+MAX_STEPS = 300
+
+
+def reference_candidates(tasks, tag: str = None) -> set:
+    """
+    改写前 get_next_task_info 的全量扫描（推广到多个前置任务）：常规任务未全部结束前只看常规任务，
+    前置任务都已结束（或不在列表中）的待办任务可以执行。指定 tag 时只保留带有该标签的任务。
+    """
+    ids = {task.id for task in tasks}
+    finished = {task.id for task in tasks if task.status != 'pending'}
+    pending = [task for task in tasks if task.status == 'pending']
+    pool = [task for task in pending if not task.is_late_task] or [task for task in pending if task.is_late_task]
+    return {task.id for task in pool
+            if all(dep in finished or dep not in ids for dep in task.depends_on)
+            and (tag is None or tag in task.tags)}
+
+
+def random_plan(rng, depth: int = 0, counter=None) -> str:
+    """随机生成一份合法的规划：串行链、两种括号的嵌套分组、末尾任务（-）和标签。"""
+    counter = counter if counter is not None else [0]
+    items = []
+    for _ in range(rng.randint(1, 4)):
+        nodes = []
+        for _ in range(rng.randint(1, 3)):
+            counter[0] += 1
+            name = f"t{counter[0]}"
+            if depth < 2 and rng.random() < 0.3:
+                opening, closing = rng.choice(['()', '[]'])
+                name += opening + random_plan(rng, depth + 1, counter) + closing
+            elif rng.random() < 0.3:
+                name += ' #' + rng.choice(TAGS)
+            nodes.append(name)
+        chain = '-'.join(nodes)
+        items.append('-' + chain if rng.random() < 0.2 else chain)
+    return ','.join(items)
+
+
+class ReadyQueueEquivalenceTest(unittest.TestCase):
+    """就绪队列在每一步给出的候选任务，与旧的全量扫描完全相同；固定种子时推送顺序可以复现。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self._managers = []
+
+    def tearDown(self):
+        for task_manager in self._managers:
+            task_manager.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def _manager(self, name: str, weighting: str = None) -> core.TaskManager:
+        # 每个实例使用单独的目录，同一种子重复运行时互不影响
+        data_dir = os.path.join(self.data_dir, f"{name}-{len(self._managers)}")
+        task_manager = core.TaskManager(weighting=weighting, data_dir=data_dir)
+        self._managers.append(task_manager)
+        return task_manager
+
+    def assert_candidates(self, task_manager: core.TaskManager, tag: str = None):
+        expected = reference_candidates(task_manager.tasks, tag)
+        self.assertEqual(task_manager._ready_queue.candidates(tag), expected)
+        return expected
+
+    def _overdue(self, seed: int, rng) -> list:
+        """前一天执行到一半的规划中尚未完成的任务（副本），用于合并。"""
+        yesterday = self._manager("yesterday")
+        yesterday.start_new_day(random_plan(rng))
+        for _ in range(rng.randint(0, 10)):
+            info = yesterday.get_next_task_info()
+            if info is None:
+                break
+            yesterday.complete_task(info['task'].id)
+        return [Task.from_dict(task.to_dict()) for task in yesterday.tasks if task.status == 'pending']
+
+    def run_scenario(self, seed: int, weighting: str = None) -> list:
+        """按种子随机执行一天：完成、推迟、取消、添加、拆分、修改、撤销、重做和按标签筛选。返回推送的任务名。"""
+        random.seed(seed)
+        rng = random.Random(seed)
+        task_manager = self._manager("today", weighting)
+        task_manager.start_new_day(random_plan(rng), self._overdue(seed, rng))
+        picked = []
+        for _ in range(MAX_STEPS):
+            tag = rng.choice((None, None, None) + TAGS)
+            expected = self.assert_candidates(task_manager, tag)
+            info = task_manager.get_next_task_info(tag)
+            if info is None:
+                self.assertEqual(expected, set())
+                if tag is None:
+                    break
+                continue
+            task = info['task']
+            self.assertIn(task.id, expected)
+            picked.append(task.name)
+            action = rng.random()
+            if action < 0.45:
+                result = task_manager.complete_task(task.id)
+            elif action < 0.55:
+                result = task_manager.postpone_task(task.id)
+            elif action < 0.62:
+                result = task_manager.cancel_task(task.id)
+            elif action < 0.70:
+                result = task_manager.add_task_after(task.id, f"new{len(picked)}" + rng.choice(('', ' #a')))
+            elif action < 0.80:
+                result = task_manager.split_task(task.id, random_plan(rng, depth=1))
+            elif action < 0.85:
+                result = task_manager.edit_task(task.id, task.name + "'")
+            elif action < 0.95:
+                result = task_manager.undo()
+            else:
+                result = task_manager.redo()
+            if action < 0.85:
+                # 推迟过一次的任务不能再推迟，其余操作都应成功
+                self.assertTrue(result['success'] or task.postponed_count > 0, result['message'])
+            self.assert_candidates(task_manager)
+        # 拆分和添加会不断产生新任务，最后逐个完成剩下的任务
+        while True:
+            expected = self.assert_candidates(task_manager)
+            info = task_manager.get_next_task_info()
+            if info is None:
+                break
+            self.assertIn(info['task'].id, expected)
+            picked.append(info['task'].name)
+            task_manager.complete_task(info['task'].id)
+        self.assertTrue(all(task.status != 'pending' for task in task_manager.tasks))
+        return picked
+
+    def test_same_candidates_as_full_scan(self):
+        for seed in SEEDS:
+            with self.subTest(seed=seed):
+                self.run_scenario(seed)
+
+    def test_same_candidates_weighted(self):
+        for seed in SEEDS:
+            with self.subTest(seed=seed):
+                self.run_scenario(seed, weighting='postponed')
+
+    def test_fixed_seed_is_reproducible(self):
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                self.assertEqual(self.run_scenario(seed), self.run_scenario(seed))
+
+    def test_queue_without_task_manager(self):
+        """直接对 ReadyQueue 做完成和移除，与全量扫描比较。"""
+        for seed in SEEDS:
+            rng = random.Random(seed)
+            tasks = parser.parse_task_string(random_plan(rng))
+            queue = ReadyQueue(tasks)
+            while True:
+                self.assertEqual(queue.candidates(), reference_candidates(tasks))
+                task = queue.pick(rng)
+                if task is None:
+                    break
+                if rng.random() < 0.8:
+                    task.status = 'done'
+                    queue.finish(task.id)
+                else:
+                    tasks.remove(task)
+                    queue.remove(task.id)
+            self.assertTrue(all(task.status == 'done' for task in tasks))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+# atomize/tests/test_server.py
+
+import gc
+import os
+import sys
+import json
+import time
+import signal
+import shutil
+import socket
+import asyncio
+import tempfile
+import unittest
+import subprocess
+import urllib.request
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import server
+from model import ROOT
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class SessionPoolTest(unittest.TestCase):
+    """按用户名管理的会话池：LRU 淘汰、共享加载和淘汰后的数据。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_least_recently_used_session_is_evicted(self):
+        async def scenario():
+            pool = server.SessionPool(self.data_dir, max_sessions=2)
+            try:
+                for user in ('alice', 'bob'):
+                    result = await pool.execute(user, 'plan', f"{user}的任务")
+                    self.assertTrue(result['success'], result['message'])
+                # 访问 alice 之后，bob 成为最久未使用的会话
+                await pool.execute('alice', 'next', '')
+                await pool.execute('carol', 'plan', "carol的任务")
+                self.assertEqual(list(pool._sessions), ['alice', 'carol'])
+                await asyncio.gather(*pool._evicting.values())
+                # bob 的会话已写回磁盘，重新加载后仍是原来的规划
+                result = await pool.execute('bob', 'next', '')
+                self.assertEqual(result['task']['name'], 'bob的任务')
+                self.assertEqual(list(pool._sessions), ['carol', 'bob'])
+            finally:
+                await pool.close()
+        run(scenario())
+
+    def test_concurrent_requests_share_one_load(self):
+        created = []
+
+        class CountingPool(server.SessionPool):
+            def _create_manager(self, user):
+                created.append(user)
+                return super()._create_manager(user)
+
+        async def scenario():
+            pool = CountingPool(self.data_dir)
+            try:
+                await pool.execute('alice', 'plan', "a, b")
+                results = await asyncio.gather(*(pool.execute('alice', 'next', '') for _ in range(5)))
+                self.assertTrue(all(result['success'] for result in results))
+                self.assertEqual(len({result['task']['id'] for result in results}), 1)
+            finally:
+                await pool.close()
+        run(scenario())
+        self.assertEqual(created, ['alice'])
+
+    def test_evicted_session_releases_groups(self):
+        async def scenario():
+            pool = server.SessionPool(self.data_dir, max_sessions=1)
+            try:
+                await pool.execute('alice', 'plan', "淘汰分组(a #淘汰标签, b)")
+                self.assertIn('淘汰分组', ROOT._children)
+                await pool.execute('bob', 'plan', "x")
+                await asyncio.gather(*pool._evicting.values())
+            finally:
+                await pool.close()
+        run(scenario())
+        gc.collect()
+        self.assertNotIn('淘汰分组', ROOT._children)
+
+    def test_invalid_user(self):
+        async def scenario():
+            pool = server.SessionPool(self.data_dir)
+            try:
+                for user in ('..', 'a/b', ''):
+                    with self.assertRaises(server.HttpError):
+                        await pool.get(user)
+            finally:
+                await pool.close()
+        run(scenario())
+
+
+class RoutingTest(unittest.TestCase):
+
+    def test_route(self):
+        self.assertEqual(server._route('GET', '/users/alice/next'), ('alice', 'next'))
+        self.assertEqual(server._route('POST', '/users/alice/d'), ('alice', 'done'))
+        for method, path, status in (('GET', '/users/alice/done', 405), ('GET', '/users/alice/quit', 404),
+                                     ('GET', '/tasks', 404)):
+            with self.assertRaises(server.HttpError) as context:
+                server._route(method, path)
+            self.assertEqual(context.exception.status, status)
+
+    def test_argument(self):
+        self.assertEqual(server._argument('plan', '/', b'{"plan": "a-b", "merge": true}'), '--merge a-b')
+        self.assertEqual(server._argument('report', '/users/a/report?period=month&count=6&tag=%23deep', b''),
+                         'month 6 #deep')
+        self.assertEqual(server._argument('split', '/', b'{"text": "x-y"}'), 'x-y')
+        for body in (b'{', b'[1]'):
+            with self.assertRaises(server.HttpError):
+                server._argument('plan', '/', body)
+
+
+class HttpTest(unittest.TestCase):
+    """经由 asyncio 服务的完整请求（keep-alive 连接上的多个请求）。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_keep_alive_requests(self):
+        async def request(reader, writer, method, path, payload=None):
+            body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+            writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line:
+                    break
+                name, _, value = line.partition(':')
+                headers[name.lower()] = value.strip()
+            return status, json.loads(await reader.readexactly(int(headers['content-length'])))
+
+        async def scenario():
+            pool = server.SessionPool(self.data_dir)
+            listener = await asyncio.start_server(server.Server(pool).handle_connection, '127.0.0.1', 0)
+            port = listener.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            try:
+                status, result = await request(reader, writer, 'POST', '/users/alice/plan', {'plan': "a-b"})
+                self.assertEqual((status, result['total_num']), (200, 2))
+                status, result = await request(reader, writer, 'GET', '/users/alice/next')
+                self.assertEqual((status, result['task']['name']), (200, 'a'))
+                status, result = await request(reader, writer, 'POST', '/users/alice/plan', {'plan': "a("})
+                self.assertEqual(status, 400)
+                self.assertFalse(result['success'])
+                status, _ = await request(reader, writer, 'GET', '/users/alice/unknown')
+                self.assertEqual(status, 404)
+            finally:
+                writer.close()
+                listener.close()
+                await listener.wait_closed()
+                await pool.close()
+        run(scenario())
+
+
+@unittest.skipIf(sys.platform == 'win32', "需要 SIGTERM")
+class SigtermTest(unittest.TestCase):
+    """服务收到 SIGTERM 后先写完后台线程中的修改再退出。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_sigterm_flushes_pending_writes(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT_DIR, 'server.py'), '--port', str(port), '--data-dir', self.data_dir],
+            stderr=subprocess.PIPE, stdout=subprocess.DEVNULL)
+        try:
+            process.stderr.readline()  # 启动信息
+
+            def post(command, payload):
+                request = urllib.request.Request(f"http://127.0.0.1:{port}/users/alice/{command}",
+                                                 data=json.dumps(payload).encode('utf-8'), method='POST')
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    return json.load(response)
+
+            self.assertTrue(post('plan', {'plan': "写报告-校对"})['success'])
+            self.assertTrue(post('done', {})['success'])
+            process.send_signal(signal.SIGTERM)
+            self.assertEqual(process.wait(timeout=20), 0)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stderr.close()
+
+        user_dir = os.path.join(self.data_dir, 'users', 'alice')
+        with open(os.path.join(user_dir, 'history', time.strftime('%Y-%m') + '.csv'), encoding='utf-8') as f:
+            self.assertIn('写报告', f.read())
+        import core
+        task_manager = core.TaskManager(data_dir=user_dir)
+        try:
+            self.assertEqual({task.name: task.status for task in task_manager.tasks}, {'写报告': 'done', '校对': 'pending'})
+        finally:
+            task_manager.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
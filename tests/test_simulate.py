@@ -0,0 +1,68 @@
+# atomize/tests/test_simulate.py
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import parser
+import simulate
+
+PLAN = "调研(读文献-做笔记, 访谈), 写作*2[提纲-初稿]-校对, 英语(单词, 听力), -整理桌面"
+
+
+class SimulateTest(unittest.TestCase):
+    """结果只取决于参数（包括种子），与进程数无关；模拟遵守依赖和末尾任务。"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tasks = parser.parse_task_string(PLAN)
+
+    def test_fixed_seed_is_reproducible(self):
+        first = simulate.simulate(self.tasks, runs=200, seed=3, postpone_rate=0.2, workers=1)
+        self.assertEqual(simulate.simulate(self.tasks, runs=200, seed=3, postpone_rate=0.2, workers=1), first)
+        self.assertNotEqual(simulate.simulate(self.tasks, runs=200, seed=4, postpone_rate=0.2, workers=1), first)
+
+    def test_worker_count_does_not_change_results(self):
+        for weighting in (None, 'dsl'):
+            with self.subTest(weighting=weighting):
+                options = dict(runs=120, seed=11, postpone_rate=0.1, horizon=8, weighting=weighting)
+                self.assertEqual(simulate.simulate(self.tasks, workers=3, **options),
+                                 simulate.simulate(self.tasks, workers=1, **options))
+
+    def test_order_constraints(self):
+        result = simulate.simulate(self.tasks, runs=300, seed=0, workers=1)
+        positions = {stats['name']: stats['mean_position'] for stats in result['tasks'].values()}
+        self.assertLess(positions['读文献'], positions['做笔记'])
+        self.assertLess(positions['初稿'], positions['校对'])
+        # 末尾任务总是最后一个
+        self.assertEqual(positions['整理桌面'], len(self.tasks))
+        late = next(stats for stats in result['tasks'].values() if stats['late'])
+        self.assertEqual((late['std_position'], late['completion_rate']), (0.0, 1.0))
+        self.assertEqual((result['runs'], result['picks_per_run'], result['postpones_per_run']),
+                         (300, len(self.tasks), 0))
+        self.assertEqual(result['groups']['写作']['tasks'], 2)
+
+    def test_horizon_starves_late_tasks(self):
+        result = simulate.simulate(parser.parse_task_string("a, b, -z"), runs=50, horizon=2, workers=1)
+        self.assertEqual((result['late']['tasks'], result['late']['starved_rate'], result['late']['mean_unfinished']),
+                         (1, 1.0, 1))
+        z = next(stats for stats in result['tasks'].values() if stats['name'] == 'z')
+        self.assertEqual((z['mean_position'], z['completion_rate']), (None, 0.0))
+
+    def test_only_pending_tasks_are_simulated(self):
+        tasks = parser.parse_task_string("a-b, c")
+        tasks[0].status = 'done'
+        result = simulate.simulate(tasks, runs=20, workers=1)
+        self.assertEqual(sorted(stats['name'] for stats in result['tasks'].values()), ['b', 'c'])
+
+    def test_postpone_sensitivity(self):
+        results = simulate.postpone_sensitivity(self.tasks, [0.0, 0.5], runs=100, seed=1, workers=1)
+        self.assertEqual(sorted(results), [0.0, 0.5])
+        self.assertEqual(results[0.0]['postpones_per_run'], 0)
+        self.assertGreater(results[0.5]['postpones_per_run'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
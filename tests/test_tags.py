@@ -0,0 +1,65 @@
+# atomize/tests/test_tags.py
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import core
+import parser
+
+
+def annotated(text: str) -> list:
+    return [(task.path(), task.name, task.weight, sorted(task.tags)) for task in parser.parse_task_string(text)]
+
+
+class TagSyntaxTest(unittest.TestCase):
+    """#标签前须有空白；紧跟在其他字符之后的 # 属于名称。"""
+
+    def test_hash_inside_names(self):
+        self.assertEqual([name for _, name, _, _ in annotated("学C#, C#编程, F#-C++")],
+                         ['学C#', 'C#编程', 'F#', 'C++'])
+        self.assertEqual(annotated("学C# #编程"), [('', '学C#', 1, ['编程'])])
+
+    def test_tags_and_weights(self):
+        self.assertEqual(annotated("写论文 #deep #上午*3, 读书*2 #deep#阅读"),
+                         [('', '写论文', 3, ['deep', '上午']), ('', '读书', 2, ['deep', '阅读'])])
+
+    def test_group_tags_are_inherited(self):
+        self.assertEqual(annotated("英语 #学习(单词, 听力 #耳)"),
+                         [('英语', '单词', 1, ['学习']), ('英语', '听力', 1, ['学习', '耳'])])
+
+
+class TagSchedulingTest(unittest.TestCase):
+    """按标签筛选推送，以及按标签的统计。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.task_manager = core.TaskManager(data_dir=self.data_dir)
+
+    def tearDown(self):
+        self.task_manager.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_filtered_picks(self):
+        self.task_manager.start_new_day("调研 #deep(读文献-做笔记), 回复邮件 #shallow, 学C#")
+        self.assertEqual(self.task_manager.get_tags(), {'deep': 2, 'shallow': 1})
+        for _ in range(2):
+            info = self.task_manager.get_next_task_info('#deep')
+            self.assertIn('deep', info['task'].tags)
+            self.task_manager.complete_task(info['task'].id)
+        # 没有可推送的 deep 任务时返回 None，会话仍然保留
+        self.assertIsNone(self.task_manager.get_next_task_info('deep'))
+        self.assertTrue(self.task_manager.has_active_session())
+        self.assertEqual(self.task_manager.get_tags(), {'shallow': 1})
+
+        summary = self.task_manager.get_summary('#deep')
+        self.assertEqual((summary['tag'], summary['completed_count']), ('deep', 2))
+        self.assertEqual(self.task_manager.get_summary('shallow')['completed_count'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
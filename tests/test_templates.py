@@ -0,0 +1,166 @@
+# atomize/tests/test_templates.py
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import core
+import templates
+from templates import CompiledPlan, PlanCache, TemplateStore
+
+
+def describe(tasks) -> list:
+    """任务的可比较描述：名称、分组路径、前置任务的下标、是否末尾任务、权重和标签。"""
+    index = {task.id: i for i, task in enumerate(tasks)}
+    return [(task.name, task.parent_chain, sorted(index[dep] for dep in task.depends_on), task.is_late_task,
+             task.weight, sorted(task.tags)) for task in tasks]
+
+
+class CompiledPlanTest(unittest.TestCase):
+    """编译结果的实例化与 {参数} 替换。"""
+
+    def test_instantiate_matches_parser(self):
+        text = "调研 #deep(a*2, b)-写作[c-d], -整理"
+        compiled = CompiledPlan.compile(text)
+        first, second = compiled.instantiate(), compiled.instantiate()
+        self.assertEqual(describe(first), describe(templates.parser.parse_task_string(text)))
+        self.assertEqual(describe(first), describe(second))
+        # 每次实例化都分配新的 id
+        self.assertFalse({task.id for task in first} & {task.id for task in second})
+
+    def test_round_trip_through_dict(self):
+        compiled = CompiledPlan.compile("a-b(c, d)")
+        restored = CompiledPlan.from_dict(json.loads(json.dumps(compiled.to_dict())))
+        self.assertEqual(describe(restored.instantiate()), describe(compiled.instantiate()))
+        with self.assertRaises(ValueError):
+            CompiledPlan.from_dict(dict(compiled.to_dict(), version=templates.COMPILED_VERSION + 1))
+
+    def test_params_and_defaults(self):
+        compiled = CompiledPlan.compile("{课程}(读第{章=1}章 #{tag=deep}, 复习{课程})")
+        self.assertEqual(compiled.params, {'课程': None, '章': '1', 'tag': 'deep'})
+        tasks = compiled.instantiate({'课程': '英语'})
+        self.assertEqual([(task.name, task.parent_chain, sorted(task.tags)) for task in tasks],
+                         [('读第1章', ('英语',), ['deep']), ('复习英语', ('英语',), [])])
+        tasks = compiled.instantiate({'课程': '数学', '章': 3, 'tag': 'shallow'})
+        self.assertEqual([task.name for task in tasks], ['读第3章', '复习数学'])
+        self.assertEqual(sorted(tasks[0].tags), ['shallow'])
+
+    def test_missing_param(self):
+        with self.assertRaises(ValueError) as context:
+            CompiledPlan.compile("读{书}").instantiate({})
+        self.assertIn('书', str(context.exception))
+
+    def test_plain_plan_keeps_braces(self):
+        tasks = CompiledPlan.compile("读{书}").instantiate()
+        self.assertEqual(tasks[0].name, '读{书}')
+
+    def test_parse_invocation(self):
+        self.assertEqual(templates.parse_invocation('周计划 课程="西方 社会学" 章=3'),
+                         ('周计划', {'课程': '西方 社会学', '章': '3'}))
+        for text in ('', '周计划 章', '周计划 "未闭合'):
+            with self.assertRaises(ValueError):
+                templates.parse_invocation(text)
+
+
+class PlanCacheTest(unittest.TestCase):
+    """编译缓存的命中、LRU 淘汰和损坏文件的处理。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.data_dir, 'plan_cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def cached_files(self) -> set:
+        return set(os.listdir(self.cache_dir)) if os.path.isdir(self.cache_dir) else set()
+
+    def test_hit_skips_parser(self):
+        cache = PlanCache(self.cache_dir)
+        compiled = cache.compile("a-b, c")
+        self.assertEqual(self.cached_files(), {PlanCache.key("a-b, c") + '.json'})
+        with mock.patch.object(templates.parser, 'parse_task_string', side_effect=AssertionError("不应重新解析")):
+            hit = cache.compile("a-b, c")
+        self.assertEqual(describe(hit.instantiate()), describe(compiled.instantiate()))
+
+    def test_lru_eviction(self):
+        cache = PlanCache(self.cache_dir, max_entries=2)
+        cache.compile("a")
+        cache.compile("b")
+        # 用 mtime 表示最近使用时间：让 a 比 b 更近
+        os.utime(cache._path(PlanCache.key("b")), ns=(1, 1))
+        os.utime(cache._path(PlanCache.key("a")), ns=(2, 2))
+        cache.compile("c")
+        self.assertEqual(self.cached_files(), {PlanCache.key(text) + '.json' for text in ("a", "c")})
+
+    def test_corrupt_entry_is_recompiled(self):
+        cache = PlanCache(self.cache_dir)
+        cache.compile("a-b")
+        with open(cache._path(PlanCache.key("a-b")), 'w', encoding='utf-8') as f:
+            f.write('{"version"')
+        self.assertEqual([task.name for task in cache.compile("a-b").instantiate()], ['a', 'b'])
+        with open(cache._path(PlanCache.key("a-b")), 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['version'], templates.COMPILED_VERSION)
+
+    def test_parse_error_is_not_cached(self):
+        cache = PlanCache(self.cache_dir)
+        with self.assertRaises(ValueError):
+            cache.compile("a(b")
+        self.assertEqual(self.cached_files(), set())
+
+    def test_short_plans_bypass_cache(self):
+        cache = PlanCache(self.cache_dir, min_chars=20)
+        self.assertEqual([task.name for task in cache.parse("a-b")], ['a', 'b'])
+        self.assertEqual(self.cached_files(), set())
+        long_plan = ",".join(f"任务{i}" for i in range(10))
+        self.assertEqual(len(cache.parse(long_plan)), 10)
+        self.assertEqual(self.cached_files(), {PlanCache.key(long_plan) + '.json'})
+
+    def test_templates_are_always_cached(self):
+        store = TemplateStore(os.path.join(self.data_dir, 'templates'), PlanCache(self.cache_dir))
+        store.save('周计划', "{课程}(读书\n复习)\n")
+        self.assertEqual(store.get('周计划'), "{课程}(读书,复习)")
+        self.assertEqual(store.names(), ['周计划'])
+        self.assertEqual(store.params('周计划'), {'课程': None})
+        self.assertEqual(len(self.cached_files()), 1)
+        self.assertEqual([task.path() for task in store.instantiate('周计划', {'课程': '英语'})], ['英语', '英语'])
+        with self.assertRaises(ValueError):
+            store.save('坏模板', "a(b")
+        with self.assertRaises(ValueError):
+            store.save('../x', "a")
+        store.delete('周计划')
+        with self.assertRaises(ValueError):
+            store.get('周计划')
+
+
+class ManagerCacheTest(unittest.TestCase):
+    """直接输入的短规划不写入缓存，模板实例化经过缓存。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.task_manager = core.TaskManager(data_dir=self.data_dir)
+
+    def tearDown(self):
+        self.task_manager.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_interactive_plans_do_not_fill_cache(self):
+        cache_dir = os.path.join(self.data_dir, 'plan_cache')
+        self.assertTrue(self.task_manager.save_template('晨间', "{事项=阅读}-运动")['success'])
+        before = set(os.listdir(cache_dir))
+        for i in range(5):
+            self.task_manager.start_new_day(f"临时{i}-收尾")
+        self.assertEqual(set(os.listdir(cache_dir)), before)
+        self.task_manager.start_from_template('晨间')
+        self.assertEqual([task.name for task in self.task_manager.tasks], ['阅读', '运动'])
+        self.assertEqual(set(os.listdir(cache_dir)), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
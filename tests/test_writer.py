@@ -0,0 +1,133 @@
+# atomize/tests/test_writer.py
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import core
+from writer import BackgroundWriter
+
+
+class Target:
+    """记录后台线程调用的写入方法。"""
+
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.threads = set()
+        self.fail = fail
+        self.written = threading.Event()
+
+    def _record(self, call):
+        if self.fail:
+            raise IOError("磁盘已满")
+        self.calls.append(call)
+        self.threads.add(threading.current_thread().name)
+        self.written.set()
+
+    def _store_lines(self, lines):
+        self._record(('lines', list(lines)))
+
+    def _store_snapshot(self, data):
+        self._record(('snapshot', data))
+
+    def _store_rows(self, rows):
+        self._record(('rows', list(rows)))
+
+
+class BackgroundWriterTest(unittest.TestCase):
+    """按批合并写入、快照覆盖之前的日志、flush 和 close 等待写完。"""
+
+    def setUp(self):
+        self.writer = BackgroundWriter(debounce=0.5)
+
+    def tearDown(self):
+        self.writer.close()
+
+    def test_requests_are_merged_per_target(self):
+        journal, history = Target(), Target()
+        for i in range(5):
+            self.writer.submit('journal', journal, f"{i}\n")
+            self.writer.submit('history', history, {'task_name': str(i)})
+        self.writer.flush()
+        self.assertEqual(journal.calls, [('lines', ["0\n", "1\n", "2\n", "3\n", "4\n"])])
+        self.assertEqual(history.calls, [('rows', [{'task_name': str(i)} for i in range(5)])])
+        self.assertEqual(journal.threads, {'atomize-writer'})
+
+    def test_requests_within_debounce_share_one_write(self):
+        journal = Target()
+        self.writer.submit('journal', journal, "a\n")
+        time.sleep(0.1)
+        self.writer.submit('journal', journal, "b\n")
+        self.assertFalse(journal.written.is_set())
+        # 不调用 flush，等待防抖时间到期
+        self.assertTrue(journal.written.wait(5))
+        self.assertEqual(journal.calls, [('lines', ["a\n", "b\n"])])
+
+    def test_snapshot_supersedes_earlier_lines(self):
+        journal, other = Target(), Target()
+        self.writer.submit('journal', journal, "a\n")
+        self.writer.submit('journal', other, "x\n")
+        self.writer.submit('snapshot', journal, {'seq': 1})
+        self.writer.submit('journal', journal, "b\n")
+        self.writer.submit('snapshot', journal, {'seq': 2})
+        self.writer.submit('journal', journal, "c\n")
+        self.writer.flush()
+        self.assertEqual(journal.calls, [('snapshot', {'seq': 2}), ('lines', ["c\n"])])
+        self.assertEqual(other.calls, [('lines', ["x\n"])])
+
+    def test_close_flushes_pending_writes(self):
+        journal = Target()
+        writer = BackgroundWriter(debounce=10)
+        writer.submit('journal', journal, "a\n")
+        writer.close()
+        self.assertEqual(journal.calls, [('lines', ["a\n"])])
+        with self.assertRaises(RuntimeError):
+            writer.submit('journal', journal, "b\n")
+        writer.flush()
+
+    def test_error_is_raised_on_flush_once(self):
+        self.writer.submit('journal', Target(fail=True), "a\n")
+        with self.assertRaises(IOError):
+            self.writer.flush()
+        journal = Target()
+        self.writer.submit('journal', journal, "b\n")
+        self.writer.flush()
+        self.assertEqual(journal.calls, [('lines', ["b\n"])])
+
+
+class WriteBehindManagerTest(unittest.TestCase):
+    """启用后台写入时，会话和历史在 flush 之后与同步写入的结果相同。"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_state_survives_reload(self):
+        task_manager = core.TaskManager(data_dir=self.data_dir, write_behind=True)
+        try:
+            task_manager.start_new_day("a-b, c")
+            for _ in range(2):
+                task_manager.complete_task(task_manager.get_next_task_info()['task'].id)
+            expected = [task.to_record() for task in task_manager.tasks], task_manager.total_points
+            task_manager.flush()
+        finally:
+            task_manager.close()
+        task_manager = core.TaskManager(data_dir=self.data_dir)
+        try:
+            self.assertEqual(([task.to_record() for task in task_manager.tasks], task_manager.total_points),
+                             expected)
+            self.assertEqual(task_manager.get_summary()['completed_count'], 2)
+        finally:
+            task_manager.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+# atomize/writer.py
+
+import sys
+import time
+import queue
+import atexit
+import signal
+import threading
+
+# 收到第一条写入请求后再等待这么久，把随后的请求合并成一批
+DEBOUNCE_SECONDS = 0.2
+# 队列上限：写盘跟不上时让调用方等待，而不是无限占用内存
+MAX_PENDING = 4096
+
+
+class BackgroundWriter:
+    """
+    后台写盘线程（write-behind）。调用方只负责把要写的内容放进有界队列，立即返回。
+    后台线程按批处理：
+    - 会话日志：同一批中如果有多个快照请求，只写最后一个（它已包含之前的所有修改），
+      排在它之前的日志记录也随之丢弃，之后的记录一次性追加。
+    - 历史记录：同一文件的多行合并为一次写入。
+    flush() 会等待此前提交的所有内容落盘；进程正常退出或收到 SIGTERM 时也会自动 flush。
+    """
+    def __init__(self, debounce: float = DEBOUNCE_SECONDS, max_pending: int = MAX_PENDING):
+        self.debounce = debounce
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='atomize-writer', daemon=True)
+        self._thread.start()
+
+    # --- 提交 ---
+    def submit(self, kind: str, target, payload):
+        """kind 为 'journal'、'snapshot' 或 'history'，target 为对应的 SessionJournal / EventLog / HistoryStore。"""
+        if self._closed:
+            raise RuntimeError("后台写入线程已关闭")
+        self._queue.put((kind, target, payload))
+
+    def flush(self, timeout: float = None):
+        """等待此前提交的所有写入完成。后台写入出错时在这里重新抛出。"""
+        if self._closed or not self._thread.is_alive():
+            self._raise_pending_error()
+            return
+        done = threading.Event()
+        self._queue.put(('flush', None, done))
+        done.wait(timeout)
+        self._raise_pending_error()
+
+    def close(self):
+        """写完所有内容并停止后台线程。"""
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(('stop', None, None))
+        self._thread.join()
+
+    def _raise_pending_error(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    # --- 后台线程 ---
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.debounce
+            while batch[-1][0] not in ('flush', 'stop'):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # flush 请求之后不再等待，把队列里已有的内容一起处理
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                self._error = e
+                print(f"[atomize] 后台写入失败: {e}", file=sys.stderr)
+
+            for kind, _, payload in batch:
+                if kind == 'flush':
+                    payload.set()
+            if any(kind == 'stop' for kind, _, _ in batch):
+                return
+
+    @staticmethod
+    def _write_batch(batch):
+        snapshots = {}
+        journal_lines = {}
+        history_rows = {}
+        for kind, target, payload in batch:
+            if kind == 'snapshot':
+                # 新快照覆盖了之前的快照和日志记录
+                snapshots[target] = payload
+                journal_lines[target] = []
+            elif kind == 'journal':
+                journal_lines.setdefault(target, []).append(payload)
+            elif kind == 'history':
+                history_rows.setdefault(target, []).append(payload)
+
+        for journal, data in snapshots.items():
+            journal._store_snapshot(data)
+        for journal, lines in journal_lines.items():
+            if lines:
+                journal._store_lines(lines)
+        for history, rows in history_rows.items():
+            history._store_rows(rows)
+
+
+_default_writer = None
+
+
+def get_writer() -> BackgroundWriter:
+    """返回进程内共享的后台写入线程，首次调用时创建并注册退出时的 flush。"""
+    global _default_writer
+    if _default_writer is None:
+        _default_writer = BackgroundWriter()
+        atexit.register(_default_writer.close)
+        _install_sigterm_handler()
+    return _default_writer
+
+
+def shutdown():
+    """写完并停止进程内共享的后台写入线程（没有创建过时什么也不做）。"""
+    if _default_writer is not None:
+        _default_writer.close()
+
+
+def _install_sigterm_handler():
+    """SIGTERM 时转为正常退出，从而触发 atexit 中的 flush。只能在主线程中安装。"""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if signal.getsignal(signal.SIGTERM) not in (signal.SIG_DFL, None):
+        return
+
+    def handle_sigterm(signum, frame):
+        sys.exit(128 + signum)
+
+    signal.signal(signal.SIGTERM, handle_sigterm)